@@ -0,0 +1,158 @@
+"""
+Cache condivisa dell'anagrafica articoli per ogni worker (gunicorn o istanza serverless).
+L'anagrafica viene caricata al primo utilizzo da qualsiasi route; al massimo ogni
+ANAGRAFICA_POLL_SECONDS secondi si controlla un numero di versione (MongoDB) o l'mtime
+del file locale e, se è cambiato, il dizionario viene ricaricato e sostituito in blocco:
+le richieste in corso continuano a usare il riferimento che avevano, mai uno a metà.
+Con compact_file l'anagrafica è tenuta come CompactMapping aperto in mmap: i worker sulla
+stessa macchina con la stessa versione riusano il file invece di ricaricare da MongoDB.
+"""
+import os
+import json
+import time
+import threading
+from typing import Optional, Dict, Mapping, Tuple, Any
+
+from anagrafica_index import AnagraficaIndex
+from compact_mapping import CompactMapping
+import app_logging
+
+log = app_logging.get_logger('anagrafica')
+
+# Intervallo minimo (secondi) tra due verifiche della versione dell'anagrafica
+ANAGRAFICA_POLL_SECONDS = float(os.environ.get('ANAGRAFICA_POLL_SECONDS', '15'))
+
+
+class AnagraficaCache:
+    """Anagrafica in memoria con caricamento lazy, verifica periodica della versione e indice di ricerca"""
+
+    def __init__(self, local_file: str, storage_module=None, poll_interval: float = ANAGRAFICA_POLL_SECONDS,
+                 compact_file: Optional[str] = None):
+        self.local_file = local_file
+        self.storage = storage_module
+        self.compact_file = compact_file
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._data: Optional[Mapping[str, str]] = None
+        self._version: Optional[Tuple[str, Any]] = None
+        self._index: Optional[AnagraficaIndex] = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    def get(self) -> Optional[Mapping[str, str]]:
+        """Anagrafica corrente (da non modificare: gli aggiornamenti passano da publish)"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._reload(self._read_version())
+            return self._data
+
+        if time.monotonic() - self._checked_at >= self.poll_interval:
+            # Una sola richiesta per worker verifica la versione: le altre usano i dati attuali
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._refresh()
+                finally:
+                    self._lock.release()
+        return self._data
+
+    def publish(self, data: Dict[str, str], changed: Optional[Dict[str, str]] = None) -> None:
+        """Sostituisce l'anagrafica dopo un caricamento su questo worker (già salvata nello storage)"""
+        with self._lock:
+            previous = self._data
+            self._version = self._read_version()
+            self._data = self._compact(data, self._version)
+            self._loaded = True
+            self._checked_at = time.monotonic()
+            # Merge: l'indice esistente viene aggiornato solo con le righe cambiate
+            with self._index_lock:
+                if changed is not None and self._index is not None and self._index.mapping is previous:
+                    self._index.update(changed, mapping=self._data)
+                else:
+                    self._index = None
+
+    def index(self) -> Optional[AnagraficaIndex]:
+        """Indice di ricerca dell'anagrafica corrente (ricostruito se l'anagrafica è stata sostituita)"""
+        data = self.get()
+        if data is None:
+            return None
+        with self._index_lock:
+            if self._index is None or self._index.mapping is not data:
+                self._index = AnagraficaIndex(data)
+            return self._index
+
+    def invalidate(self) -> None:
+        """Forza la verifica della versione alla prossima richiesta"""
+        self._checked_at = 0.0
+
+    def _read_version(self) -> Optional[Tuple[str, Any]]:
+        """Versione in MongoDB se configurato, altrimenti mtime del file locale (None = non disponibile)"""
+        if self.storage is not None and self.storage.USE_MONGODB:
+            version = self.storage.get_anagrafica_version()
+            return None if version is None else ('mongo', version)
+        if self.storage is not None:
+            version = self.storage.get_anagrafica_file_version(self.local_file)
+            return None if version is None else ('file', version)
+        try:
+            return ('file', os.stat(self.local_file).st_mtime_ns)
+        except OSError:
+            return None
+
+    def _refresh(self) -> None:
+        version = self._read_version()
+        # None = storage non raggiungibile: si mantiene l'ultima anagrafica nota
+        if version is not None and version != self._version:
+            self._reload(version)
+        self._checked_at = time.monotonic()
+
+    def _reload(self, version: Optional[Tuple[str, Any]]) -> None:
+        data = self._load_compact(version)
+        if data is None:
+            data = self._compact(self._load(), version)
+        if data or not self._loaded:
+            self._data = data or None
+            self._version = version
+            self.reloads += 1
+        self._loaded = True
+        self._checked_at = time.monotonic()
+
+    def _load_compact(self, version: Optional[Tuple[str, Any]]) -> Optional[CompactMapping]:
+        """File compatto già scritto da un altro worker per la stessa versione (None se assente)"""
+        if self.compact_file is None or version is None:
+            return None
+        if CompactMapping.read_tag(self.compact_file) != repr(version):
+            return None
+        try:
+            return CompactMapping.load(self.compact_file)
+        except (OSError, ValueError) as e:
+            log.warning("Errore apertura anagrafica compatta: %s", e)
+            return None
+
+    def _compact(self, data: Optional[Mapping[str, str]], version: Optional[Tuple[str, Any]]):
+        """Converte in CompactMapping e lo salva su file (mmap condiviso); senza compact_file resta un dict"""
+        if not data or self.compact_file is None:
+            return data
+        compact = CompactMapping.from_dict(data, repr(version) if version is not None else '')
+        try:
+            directory = os.path.dirname(self.compact_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            compact.save(self.compact_file)
+            return CompactMapping.load(self.compact_file)
+        except (OSError, ValueError) as e:
+            log.warning("Anagrafica compatta solo in memoria: %s", e)
+            return compact
+
+    def _load(self) -> Optional[Dict[str, str]]:
+        if self.storage is not None:
+            return self.storage.load_anagrafica(self.local_file)
+        # Fallback: file system locale
+        if os.path.exists(self.local_file):
+            try:
+                with open(self.local_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                log.error("Errore nel caricamento dell'anagrafica da JSON: %s", e)
+        return None
@@ -0,0 +1,175 @@
+"""
+Change set dell'anagrafica articoli: righe aggiunte, rimosse e modificate (ITM_0 -> COD_0)
+tra l'anagrafica corrente e quella caricata, calcolate in un solo passaggio (hash join)
+e salvate in forma compatta (colonne parallele, JSON compresso con zlib).
+Le statistiche sono calcolate una volta sola: /api/anagrafica/diff restituisce solo pagine.
+"""
+import json
+import uuid
+import zlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Any
+
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+_KIND_CODES = {ADDED: 'A', REMOVED: 'R', MODIFIED: 'M'}
+_KIND_NAMES = {code: kind for kind, code in _KIND_CODES.items()}
+
+# Change set decompressi tenuti in memoria (paginazione dello stesso diff)
+_RECENT_SIZE = 4
+_recent: 'OrderedDict[str, ChangeSet]' = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+class ChangeSet:
+    """Differenze ordinate per codice ITM, in colonne parallele (codici, tipo, vecchio e nuovo valore)"""
+
+    def __init__(self, codes: List[str], kinds: str, old: List[Optional[str]], new: List[Optional[str]],
+                 stats: Dict[str, int], change_id: Optional[str] = None, created_at: Optional[str] = None,
+                 preview: bool = False):
+        self.codes = codes
+        self.kinds = kinds
+        self.old = old
+        self.new = new
+        self.stats = stats
+        self.id = change_id or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.created_at = created_at or datetime.now().isoformat()
+        self.preview = preview
+        self._positions: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'created_at': self.created_at,
+            'preview': self.preview,
+            'stats': dict(self.stats)
+        }
+
+    def page(self, page: int = 1, per_page: int = 100, kind: Optional[str] = None) -> Dict[str, Any]:
+        """Una pagina di righe, eventualmente filtrate per tipo (added/removed/modified)"""
+        if kind:
+            positions = self._positions.get(kind)
+            if positions is None:
+                code = _KIND_CODES[kind]
+                positions = self._positions[kind] = [i for i, k in enumerate(self.kinds) if k == code]
+            total = len(positions)
+        else:
+            positions = None
+            total = len(self.codes)
+
+        total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+        page = max(1, min(page, total_pages))
+        start = (page - 1) * per_page
+        selected = positions[start:start + per_page] if positions is not None else range(start, min(start + per_page, total))
+
+        items = [{
+            'itm': self.codes[i],
+            'kind': _KIND_NAMES[self.kinds[i]],
+            'old': self.old[i],
+            'new': self.new[i]
+        } for i in selected]
+
+        result = self.summary()
+        result.update({
+            'kind': kind,
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'total_pages': total_pages,
+            'items': items
+        })
+        return result
+
+    def to_bytes(self) -> bytes:
+        payload = {
+            'id': self.id,
+            'created_at': self.created_at,
+            'preview': self.preview,
+            'stats': self.stats,
+            'codes': self.codes,
+            'kinds': self.kinds,
+            'old': self.old,
+            'new': self.new
+        }
+        return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 6)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'ChangeSet':
+        payload = json.loads(zlib.decompress(blob).decode('utf-8'))
+        return cls(payload['codes'], payload['kinds'], payload['old'], payload['new'], payload['stats'],
+                   change_id=payload['id'], created_at=payload['created_at'], preview=payload.get('preview', False))
+
+
+def compute_changes(current: Optional[Mapping[str, str]], incoming: Mapping[str, str],
+                    replace: bool, preview: bool = False) -> ChangeSet:
+    """Confronta l'anagrafica corrente con le righe caricate
+
+    Args:
+        current: anagrafica corrente (None se non ancora caricata)
+        incoming: righe del nuovo CSV (ITM_0 -> COD_0)
+        replace: True se il caricamento sostituisce l'anagrafica (i codici assenti risultano rimossi)
+        preview: True se il change set è un'anteprima (nessuna modifica applicata)
+    """
+    current = current if current is not None else {}
+    rows = []
+    unchanged = 0
+
+    # Hash join: una ricerca nell'anagrafica corrente per ogni riga caricata
+    for code, value in incoming.items():
+        old_value = current.get(code)
+        if old_value is None:
+            rows.append((code, 'A', None, value))
+        elif old_value != value:
+            rows.append((code, 'M', old_value, value))
+        else:
+            unchanged += 1
+
+    removed = 0
+    if replace:
+        for code in current:
+            if code not in incoming:
+                rows.append((code, 'R', current[code], None))
+                removed += 1
+
+    rows.sort()
+    added = sum(1 for row in rows if row[1] == 'A')
+    stats = {
+        ADDED: added,
+        REMOVED: removed,
+        MODIFIED: len(rows) - added - removed,
+        'unchanged': unchanged,
+        'total_before': len(current),
+        'total_after': len(incoming) if replace else len(current) + added
+    }
+    return ChangeSet(
+        [row[0] for row in rows],
+        ''.join(row[1] for row in rows),
+        [row[2] for row in rows],
+        [row[3] for row in rows],
+        stats,
+        preview=preview
+    )
+
+
+def remember(change_set: ChangeSet) -> None:
+    """Tiene in memoria un change set appena calcolato o caricato dallo storage"""
+    with _recent_lock:
+        _recent[change_set.id] = change_set
+        _recent.move_to_end(change_set.id)
+        while len(_recent) > _RECENT_SIZE:
+            _recent.popitem(last=False)
+
+
+def recall(change_id: str) -> Optional[ChangeSet]:
+    with _recent_lock:
+        change_set = _recent.get(change_id)
+        if change_set is not None:
+            _recent.move_to_end(change_id)
+        return change_set
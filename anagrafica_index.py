@@ -0,0 +1,133 @@
+"""
+Indice di ricerca per l'anagrafica articoli (pagina /view_anagrafica).
+Mantiene l'elenco dei codici ITM già ordinato (paginazione senza riordinare ad ogni pagina)
+e un indice a trigrammi sui valori normalizzati di ITM e COD, così le ricerche per
+sottostringa esaminano solo i candidati del trigramma più raro invece di tutta l'anagrafica.
+"""
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Iterable
+
+# Oltre questo numero di nuovi codici conviene riordinare tutto invece di inserirli uno a uno
+_BULK_INSERT_THRESHOLD = 2000
+# Risultati di ricerca recenti tenuti in memoria (paginazione della stessa ricerca)
+_SEARCH_CACHE_SIZE = 16
+
+
+def _trigrams(text: str) -> Iterable[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class AnagraficaIndex:
+    """Indice ordinato + trigrammi su ITM_0 e COD_0, aggiornabile in modo incrementale"""
+
+    def __init__(self, mapping: Dict[str, str]):
+        self._lock = threading.Lock()
+        self._mapping = mapping
+        self._build()
+
+    def _build(self) -> None:
+        self._sorted_keys: List[str] = sorted(self._mapping)
+        self._ids: Dict[str, int] = {}
+        self._keys_by_id: List[str] = []
+        self._entries: List[Tuple[str, str]] = []
+        self._postings: Dict[str, array] = {}
+        self._search_cache: 'OrderedDict[str, List[str]]' = OrderedDict()
+        for key in self._sorted_keys:
+            self._add_entry(key, self._mapping[key])
+
+    def _add_entry(self, key: str, value) -> None:
+        """Registra (o aggiorna) un codice: le voci dei vecchi valori vengono scartate in verifica"""
+        normalized_key = key.upper()
+        normalized_value = str(value).upper()
+        entry_id = self._ids.get(key)
+        if entry_id is None:
+            entry_id = len(self._entries)
+            self._ids[key] = entry_id
+            self._keys_by_id.append(key)
+            self._entries.append((normalized_key, normalized_value))
+        else:
+            self._entries[entry_id] = (normalized_key, normalized_value)
+        for gram in _trigrams(normalized_key) | _trigrams(normalized_value):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('I')
+            postings.append(entry_id)
+
+    @property
+    def mapping(self) -> Dict[str, str]:
+        """Dizionario indicizzato (per verificare che l'indice sia quello dell'anagrafica corrente)"""
+        return self._mapping
+
+    def __len__(self) -> int:
+        return len(self._sorted_keys)
+
+    def update(self, changed: Dict[str, str], mapping: Optional[Dict[str, str]] = None) -> None:
+        """Aggiorna l'indice con le righe nuove o modificate (merge di load_anagrafica)
+        
+        Args:
+            changed: righe nuove o modificate
+            mapping: nuovo dizionario completo, se il merge ne ha creato una copia
+        """
+        with self._lock:
+            if mapping is not None:
+                self._mapping = mapping
+            if not changed:
+                return
+            new_keys = [key for key in changed if key not in self._ids]
+            for key, value in changed.items():
+                self._add_entry(key, value)
+            if len(new_keys) > _BULK_INSERT_THRESHOLD:
+                self._sorted_keys = sorted(self._mapping)
+            else:
+                for key in new_keys:
+                    bisect.insort(self._sorted_keys, key)
+            self._search_cache.clear()
+
+    def search(self, query: str) -> List[str]:
+        """Codici ITM (ordinati) il cui codice o valore COD contiene la query (maiuscola)"""
+        query = query.strip().upper()
+        if not query:
+            return self._sorted_keys
+
+        with self._lock:
+            cached = self._search_cache.get(query)
+            if cached is not None:
+                self._search_cache.move_to_end(query)
+                return cached
+
+            if len(query) < 3:
+                # Query troppo corta per i trigrammi: scansione dei valori già normalizzati
+                matches = [self._keys_by_id[entry_id] for entry_id, (key, value) in enumerate(self._entries)
+                           if query in key or query in value]
+            else:
+                postings = []
+                for gram in _trigrams(query):
+                    gram_postings = self._postings.get(gram)
+                    if gram_postings is None:
+                        postings = None
+                        break
+                    postings.append(gram_postings)
+                if not postings:
+                    matches = []
+                else:
+                    candidates = min(postings, key=len)
+                    matches = set()
+                    for entry_id in candidates:
+                        key, value = self._entries[entry_id]
+                        if query in key or query in value:
+                            matches.add(self._keys_by_id[entry_id])
+            result = sorted(matches)
+
+            self._search_cache[query] = result
+            if len(self._search_cache) > _SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+            return result
+
+    def page(self, keys: List[str], page: int, per_page: int) -> List[Tuple[str, str]]:
+        """Righe (codice, valore) di una pagina di un elenco di codici già ordinato"""
+        start = (page - 1) * per_page
+        return [(key, self._mapping[key]) for key in keys[start:start + per_page]]
+
@@ -1,6 +1,10 @@
 """
 Handler per Vercel serverless functions.
 Vercel rileva automaticamente Flask da questo file.
+
+Il modulo viene importato una sola volta per container: i client MongoDB e S3
+(singleton in storage.py e s3_storage.py) restano aperti tra le invocazioni "calde",
+mentre pandas, requests, pymongo e boto3 vengono importati solo dalle route che li usano.
 """
 import sys
 import os
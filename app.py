@@ -1,14 +1,29 @@
-from flask import Flask, render_template, request, send_file, flash, redirect, url_for, jsonify
+from flask import Flask, render_template, request, send_file, flash, redirect, url_for, jsonify, Response, make_response, g
 import csv
 import os
+import hashlib
 import io
 import json
+import itertools
+import time
+import uuid
 from datetime import datetime, date, timedelta
 from urllib.parse import quote
 from werkzeug.utils import secure_filename
 from werkzeug import exceptions as werkzeug_exceptions
-import requests
-import pandas as pd
+
+# pandas e requests sono importati al primo utilizzo: riduce il cold start su Vercel
+from lazy_imports import LazyModule
+requests = LazyModule('requests')
+pd = LazyModule('pandas')
+
+import app_logging
+
+# Logger per sottosistema (livelli configurabili con LOG_LEVEL / LOG_LEVELS)
+log = app_logging.get_logger('app')
+odata_log = app_logging.get_logger('odata')
+upload_log = app_logging.get_logger('upload')
+extraction_log = app_logging.get_logger('extractions')
 
 # Import modulo storage per persistenza dati
 try:
@@ -16,7 +31,17 @@ try:
     STORAGE_AVAILABLE = True
 except ImportError:
     STORAGE_AVAILABLE = False
-    print("⚠️ Modulo storage non disponibile, uso solo file system locale")
+    log.warning("Modulo storage non disponibile, uso solo file system locale")
+
+from config_provider import ODataConfigProvider, DEFAULT_ODATA_CONFIG
+from anagrafica_cache import AnagraficaCache
+import anagrafica_diff
+import transform_compression
+import product_index
+import json_provider
+import response_compression
+import metrics
+from static_assets import StaticAssets
 
 # Import modulo S3 per file grandi
 try:
@@ -24,16 +49,16 @@ try:
     S3_AVAILABLE = s3_storage.USE_S3
 except ImportError:
     S3_AVAILABLE = False
-    print("⚠️ Modulo s3_storage non disponibile, upload S3 disabilitato")
+    log.warning("Modulo s3_storage non disponibile, upload S3 disabilitato")
 
 try:
     app = Flask(__name__, static_folder='static', static_url_path='/static')
     # Usa la secret key da variabile d'ambiente o una di default per sviluppo
     app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here-change-in-production')
+    # jsonify e tojson con orjson (se installato) e supporto nativo degli scalari numpy/pandas
+    app.json = json_provider.FastJSONProvider(app)
 except Exception as e:
-    print(f"❌ Errore inizializzazione Flask: {e}")
-    import traceback
-    traceback.print_exc()
+    log.exception("Errore inizializzazione Flask: %s", e)
     raise
 
 # Configurazione cartella uploads
@@ -47,6 +72,47 @@ else:
 # Limite file size: 20MB
 app.config['MAX_CONTENT_LENGTH'] = 20 * 1024 * 1024  # 20MB max file size
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response):
+    """Durata della richiesta per route (istogramma su /metrics) e riga di riepilogo nel log.
+    Gli after_request girano in ordine inverso: qui la risposta è già compressa."""
+    started = g.get('request_started')
+    if started is not None:
+        duration = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else 'other'
+        metrics.observe(metrics.REQUEST_DURATION, duration,
+                        route=route, method=request.method, status=response.status_code)
+        app_logging.log_request(request.method, route, request.path, response.status_code, duration * 1000,
+                                response.content_length, response.headers.get('Content-Encoding'))
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Comprime HTML, JSON e CSV secondo Accept-Encoding (gzip o brotli)"""
+    if request.method == 'HEAD':
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'other'
+    return response_compression.compress_response(response, request.accept_encodings, route)
+
+# Bytes prima/dopo la compressione per route su /metrics (letti solo durante lo scrape)
+metrics.register_collector(response_compression.metrics_families)
+
+# File statici con hash del contenuto nel nome (cache immutable solo sugli URL versionati)
+static_assets = StaticAssets(app.static_folder)
+
+
+@app.url_defaults
+def versioned_static_url(endpoint, values):
+    """url_for('static', filename=...) produce l'URL con hash del file"""
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = static_assets.url_name(values['filename'])
+
 # Crea la cartella uploads se non esiste (solo se non siamo su Vercel)
 if not (os.environ.get('VERCEL') or os.environ.get('VERCEL_ENV')):
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -57,6 +123,9 @@ ANAGRAFICA_JSON = 'anagrafica.json'
 # File JSON per configurazione OData
 ODATA_CONFIG_JSON = 'odata_config.json'
 
+# Configurazione OData in memoria (default + file + MongoDB), riconvalidata ogni ODATA_CONFIG_TTL secondi
+odata_config_provider = ODataConfigProvider(ODATA_CONFIG_JSON, storage if STORAGE_AVAILABLE else None)
+
 # Cache rimossa - usiamo solo file JSON nella cartella uploads
 
 # Inizializza i file JSON se non esistono
@@ -69,137 +138,140 @@ def init_json_files():
     if is_vercel:
         # Su Vercel, non caricare la configurazione all'avvio per evitare connessioni MongoDB ad ogni richiesta
         # La configurazione verrà caricata lazy quando necessario
-        app.logger.info("Su Vercel: configurazione OData verrà caricata quando necessario")
+        log.info("Su Vercel: configurazione OData verrà caricata quando necessario")
         return
     
     # Su altri hosting, usa il filesystem
     try:
         if not os.path.exists(ODATA_CONFIG_JSON):
-            app.logger.info(f"File {ODATA_CONFIG_JSON} non trovato, creazione con valori di default")
-            default_config = {
-                'odata_url': 'https://voiapp.fr',
-                'odata_endpoint': 'michelinpal/odata/DMX',
-                'requires_auth': True,
-                'auth_type': 'basic',
-                'auth_username': 'API',
-                'auth_password': 'IPA',
-                'auth_token': '',
-                'date_field': 'LaunchDate',
-                'site_field': 'SiteName'
-            }
+            log.info("File %s non trovato, creazione con valori di default", ODATA_CONFIG_JSON)
             try:
                 with open(ODATA_CONFIG_JSON, 'w', encoding='utf-8') as f:
-                    json.dump(default_config, f, ensure_ascii=False, indent=2)
-                app.logger.info(f"File {ODATA_CONFIG_JSON} creato con successo")
+                    json.dump(DEFAULT_ODATA_CONFIG, f, ensure_ascii=False, indent=2)
+                log.info("File %s creato con successo", ODATA_CONFIG_JSON)
             except Exception as e:
-                app.logger.error(f"Impossibile creare {ODATA_CONFIG_JSON}: {e}")
+                log.error("Impossibile creare %s: %s", ODATA_CONFIG_JSON, e)
         else:
-            app.logger.info(f"File {ODATA_CONFIG_JSON} trovato, caricamento configurazione")
-            try:
-                with open(ODATA_CONFIG_JSON, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                app.logger.info(f"Configurazione OData caricata: URL={config.get('odata_url')}, Endpoint={config.get('odata_endpoint')}, Username={config.get('auth_username')}")
-            except Exception as e:
-                app.logger.error(f"Errore nel caricamento {ODATA_CONFIG_JSON}: {e}")
+            log.info("File %s trovato, configurazione caricata al primo utilizzo", ODATA_CONFIG_JSON)
     except Exception as e:
-        app.logger.error(f"Errore generale in init_json_files: {e}")
-        import traceback
-        app.logger.error(traceback.format_exc())
+        log.exception("Errore generale in init_json_files: %s", e)
 
 # Inizializza i file JSON all'avvio (solo se l'app è stata creata)
 try:
     if 'app' in globals():
         init_json_files()
 except Exception as e:
-    print(f"⚠️ Errore durante init_json_files: {e}")
-    import traceback
-    traceback.print_exc()
-
-# Variabile globale per memorizzare l'anagrafica
-anagrafica_data = None
+    log.warning("Errore durante init_json_files: %s", e, exc_info=True)
+
+# Anagrafica condivisa dal worker: caricata al primo utilizzo e ricaricata se cambia in storage.
+# In formato compatto (mmap) le pagine sono condivise tra i worker della stessa macchina.
+ANAGRAFICA_COMPACT = os.environ.get('ANAGRAFICA_COMPACT', '1') != '0'
+anagrafica_cache = AnagraficaCache(
+    ANAGRAFICA_JSON,
+    storage if STORAGE_AVAILABLE else None,
+    compact_file=os.path.join(app.config['UPLOAD_FOLDER'], 'anagrafica.bin') if ANAGRAFICA_COMPACT else None
+)
 anagrafica_filename = None
 
 
-def load_anagrafica(filepath, update_mode=False):
-    """Carica l'anagrafica articoli dal file CSV e salva in JSON
+def get_anagrafica():
+    """Anagrafica corrente (None se non è mai stata caricata)"""
+    return anagrafica_cache.get()
+
+
+def read_anagrafica_csv(source):
+    """Legge le colonne C (ITM_0) e D (COD_0) del CSV anagrafica e le normalizza in blocco
     
     Args:
-        filepath: percorso del file CSV
+        source: percorso del file CSV o stream binario (es. file caricato, senza salvarlo su disco)
+    
+    Returns:
+        Dizionario ITM_0 -> COD_0 (a parità di codice vale l'ultima riga)
+    """
+    stream = open(source, 'rb') if isinstance(source, str) else source
+    try:
+        # Rileva il delimitatore
+        first_line = stream.readline()
+        delimiter = ';' if b';' in first_line else ','
+        stream.seek(0)
+        
+        # Colonne per posizione (header=None, intestazione saltata): con usecols le righe con campi
+        # in più (delimitatori finali, colonne aggiunte) vengono lette come nel vecchio csv.reader,
+        # quelle con meno campi hanno C/D vuote e vengono scartate sotto
+        frame = pd.read_csv(stream, sep=delimiter, header=None, skiprows=1, usecols=[2, 3], dtype=str,
+                            keep_default_na=False, encoding='utf-8-sig')
+    finally:
+        if isinstance(source, str):
+            stream.close()
+    
+    # Normalizzazione vettoriale (strip, virgolette, maiuscolo sul codice ITM)
+    itm_codes = frame.iloc[:, 0].fillna('').str.strip().str.strip('"').str.upper()
+    cod_codes = frame.iloc[:, 1].fillna('').str.strip().str.strip('"')
+    # Salva solo se abbiamo sia il codice che il valore di sostituzione (non vuoto)
+    valid = (itm_codes != '') & (cod_codes.str.strip() != '')
+    return dict(zip(itm_codes[valid].tolist(), cod_codes[valid].tolist()))
+
+
+def load_anagrafica(source, update_mode=False):
+    """Carica l'anagrafica articoli dal file CSV e la salva nello storage
+    
+    Args:
+        source: percorso del file CSV o stream del file caricato
         update_mode: se True, aggiorna/merge con l'anagrafica esistente invece di sostituirla
     """
-    global anagrafica_data
+    current = get_anagrafica()
+    changed_items = read_anagrafica_csv(source)
     
-    # Se non è in modalità update, inizializza il dizionario
-    if not update_mode:
-        anagrafica_data = {}
-    elif anagrafica_data is None:
-        anagrafica_data = {}
+    # Conteggi con operazioni sugli insiemi di codici invece che riga per riga
+    existing = current if update_mode and current is not None else {}
+    updated_items = len(changed_items.keys() & existing.keys())
+    new_items = len(changed_items) - updated_items
     
-    new_items = 0
-    updated_items = 0
+    # Change set rispetto all'anagrafica corrente (consultabile da /api/anagrafica/diff)
+    change_set = anagrafica_diff.compute_changes(current, changed_items, replace=not update_mode)
+    store_change_set(change_set)
     
-    with open(filepath, 'r', encoding='utf-8-sig') as f:
-        # Rileva il delimitatore
-        first_line = f.readline()
-        delimiter = ';' if ';' in first_line else ','
-        f.seek(0)
-        
-        reader = csv.reader(f, delimiter=delimiter)
-        next(reader)  # Salta l'header
-        
-        for row in reader:
-            if len(row) >= 4:
-                # Colonna C (ITM_0) è l'indice 2, Colonna D (COD_0) è l'indice 3
-                itm_code = row[2].strip().strip('"').upper()
-                cod_code = row[3].strip().strip('"')
-                # Salva solo se abbiamo sia il codice che il valore di sostituzione (non vuoto)
-                if itm_code and cod_code and cod_code.strip():
-                    if itm_code in anagrafica_data:
-                        updated_items += 1
-                    else:
-                        new_items += 1
-                    anagrafica_data[itm_code] = cod_code
+    # Si lavora su un nuovo dizionario: le richieste in corso continuano a vedere quello precedente
+    anagrafica_data = dict(existing)
+    anagrafica_data.update(changed_items)
     
-    # Salva l'anagrafica in JSON
-    save_anagrafica_json()
+    # In modalità update si scrivono solo le righe nuove o con un valore diverso (non tutto il CSV)
+    changed_rows = {itm: cod for itm, cod in changed_items.items() if existing.get(itm) != cod} if update_mode else None
     
-    return len(anagrafica_data), new_items, updated_items
+    # Salva l'anagrafica (in modalità update solo le righe cambiate vengono scritte su MongoDB)
+    save_anagrafica_json(anagrafica_data, changed_rows)
+    
+    # Sostituzione atomica del riferimento (l'indice di ricerca riceve solo le righe cambiate)
+    anagrafica_cache.publish(anagrafica_data, changed_rows)
+    
+    return len(anagrafica_data), new_items, updated_items, change_set
 
 
-def save_anagrafica_json():
-    """Salva l'anagrafica in un file JSON o MongoDB"""
-    global anagrafica_data
+def store_change_set(change_set):
+    """Tiene il change set in memoria e lo salva nello storage (per gli altri worker)"""
+    anagrafica_diff.remember(change_set)
+    if STORAGE_AVAILABLE:
+        storage.save_anagrafica_changes(change_set.id, change_set.to_bytes(), change_set.summary(),
+                                        app.config['UPLOAD_FOLDER'])
+
+
+def save_anagrafica_json(anagrafica_data, changed=None):
+    """Salva l'anagrafica in un file JSON o MongoDB
+    
+    Args:
+        anagrafica_data: anagrafica completa
+        changed: righe nuove o modificate (merge incrementale); None per sostituire tutto
+    """
     if anagrafica_data:
         if STORAGE_AVAILABLE:
-            storage.save_anagrafica(anagrafica_data, ANAGRAFICA_JSON)
+            storage.save_anagrafica(anagrafica_data, ANAGRAFICA_JSON, changed=changed)
         else:
             # Fallback: file system locale
             try:
                 with open(ANAGRAFICA_JSON, 'w', encoding='utf-8') as f:
                     json.dump(anagrafica_data, f, ensure_ascii=False, indent=2)
             except Exception as e:
-                print(f"Errore salvataggio anagrafica: {e}")
-
-
-def load_anagrafica_json():
-    """Carica l'anagrafica dal file JSON o MongoDB se esiste"""
-    global anagrafica_data
-    if STORAGE_AVAILABLE:
-        data = storage.load_anagrafica(ANAGRAFICA_JSON)
-        if data:
-            anagrafica_data = data
-            return len(anagrafica_data)
-    else:
-        # Fallback: file system locale
-        if os.path.exists(ANAGRAFICA_JSON):
-            try:
-                with open(ANAGRAFICA_JSON, 'r', encoding='utf-8') as f:
-                    anagrafica_data = json.load(f)
-                return len(anagrafica_data)
-            except Exception as e:
-                print(f"Errore nel caricamento dell'anagrafica da JSON: {e}")
-                anagrafica_data = None
-    return 0
+                log.error("Errore salvataggio anagrafica: %s", e)
 
 
 def transform_article_code(code):
@@ -233,36 +305,41 @@ def transform_article_code(code):
     return code
 
 
-def process_csv_file(input_filepath=None, output_filepath=None, file_bytes=None):
+def process_csv_file(input_filepath=None, output_filepath=None, file_bytes=None,
+                     input_stream=None, output_stream=None):
     """Processa il file CSV applicando le trasformazioni
-    Può lavorare con filepath (filesystem) o file_bytes (memoria)"""
-    global anagrafica_data
-    
+    Può lavorare con filepath (filesystem), file_bytes (memoria) o con stream di testo già aperti
+    (input_stream/output_stream, es. S3 -> S3: letti e scritti una riga alla volta, non vengono chiusi)"""
+    # Riferimento locale: l'intero file usa la stessa versione dell'anagrafica
+    anagrafica_data = get_anagrafica()
     if anagrafica_data is None:
         raise ValueError("Anagrafica non caricata. Carica prima l'anagrafica articoli.")
     
-    # Se file_bytes è fornito, usa quello (memoria), altrimenti usa filepath (filesystem)
-    if file_bytes:
-        # Lavora in memoria
-        input_data = file_bytes.decode('utf-8-sig')
-        input_stream = io.StringIO(input_data)
-        output_stream = io.StringIO()
-    else:
-        # Lavora con filesystem
-        input_stream = open(input_filepath, 'r', encoding='utf-8-sig')
-        output_stream = open(output_filepath, 'w', encoding='utf-8', newline='')
+    # Stream forniti dal chiamante: usati così come sono
+    external_streams = input_stream is not None
+    if not external_streams:
+        # Se file_bytes è fornito, usa quello (memoria), altrimenti usa filepath (filesystem)
+        if file_bytes:
+            # Lavora in memoria
+            input_data = file_bytes.decode('utf-8-sig')
+            input_stream = io.StringIO(input_data)
+            output_stream = io.StringIO()
+        else:
+            # Lavora con filesystem
+            input_stream = open(input_filepath, 'r', encoding='utf-8-sig')
+            output_stream = open(output_filepath, 'w', encoding='utf-8', newline='')
     
     try:
         # Rileva il delimitatore
         first_line = input_stream.readline()
         delimiter = ';' if ';' in first_line else ','
-        input_stream.seek(0)  # Reset per rileggere dall'inizio
         
         rows_processed = 0
         rows_transformed = 0
         missing_codes = set()
         
-        reader = csv.reader(input_stream, delimiter=delimiter)
+        # La prima riga viene riletta dal reader senza seek (gli stream S3 non sono riposizionabili)
+        reader = csv.reader(itertools.chain([first_line], input_stream), delimiter=delimiter)
         writer = csv.writer(output_stream, delimiter=delimiter, quoting=csv.QUOTE_MINIMAL)
         
         # Leggi e scrivi l'header
@@ -287,8 +364,9 @@ def process_csv_file(input_filepath=None, output_filepath=None, file_bytes=None)
                     
                     if transformed_code and transformed_code.lower().startswith('cso_'):
                         search_code = transformed_code.upper()
-                        if search_code in anagrafica_data:
-                            replacement = anagrafica_data[search_code]
+                        # Una sola ricerca per codice (get invece di "in" + [])
+                        replacement = anagrafica_data.get(search_code)
+                        if replacement is not None:
                             if replacement and replacement.strip():
                                 transformed_code = replacement.strip()
                                 rows_transformed += 1
@@ -304,14 +382,14 @@ def process_csv_file(input_filepath=None, output_filepath=None, file_bytes=None)
             writer.writerow(row)
         
         # Se lavoriamo in memoria, restituisci i bytes del risultato
-        if file_bytes:
+        if file_bytes and not external_streams:
             output_stream.seek(0)
             result_bytes = output_stream.getvalue().encode('utf-8')
             return rows_processed, rows_transformed, list(missing_codes), result_bytes
         else:
             return rows_processed, rows_transformed, list(missing_codes)
     finally:
-        if not file_bytes:
+        if not file_bytes and not external_streams:
             input_stream.close()
             output_stream.close()
 
@@ -319,13 +397,12 @@ def process_csv_file(input_filepath=None, output_filepath=None, file_bytes=None)
 @app.route('/')
 def index():
     """Pagina principale"""
-    global anagrafica_data, anagrafica_filename
+    global anagrafica_filename
     
-    # Carica l'anagrafica da JSON se esiste e non è già caricata
-    if anagrafica_data is None:
-        count = load_anagrafica_json()
-        if count > 0:
-            anagrafica_filename = "anagrafica.json (caricata automaticamente)"
+    # L'anagrafica viene caricata al primo utilizzo (da storage) se non è già in memoria
+    anagrafica_data = get_anagrafica()
+    if anagrafica_data and anagrafica_filename is None:
+        anagrafica_filename = "anagrafica.json (caricata automaticamente)"
     
     return render_template('index.html', anagrafica_loaded=anagrafica_data is not None, 
                          anagrafica_filename=anagrafica_filename)
@@ -334,9 +411,7 @@ def index():
 @app.route('/view_anagrafica')
 def view_anagrafica():
     """Pagina per visualizzare l'anagrafica con paginazione e ricerca"""
-    global anagrafica_data
-    
-    if anagrafica_data is None:
+    if get_anagrafica() is None:
         flash('Anagrafica non caricata', 'error')
         return redirect(url_for('index'))
     
@@ -345,25 +420,17 @@ def view_anagrafica():
     per_page = request.args.get('per_page', 50, type=int)
     search_query = request.args.get('search', '').strip().upper()
     
-    # Filtra per ricerca se presente
-    if search_query:
-        filtered_items = [(k, v) for k, v in anagrafica_data.items() 
-                         if search_query in k.upper() or search_query in str(v).upper()]
-    else:
-        filtered_items = list(anagrafica_data.items())
+    # Ricerca e paginazione sull'indice (codici già ordinati, trigrammi per le sottostringhe)
+    index = anagrafica_cache.index()
+    matching_keys = index.search(search_query)
     
-    # Ordina
-    filtered_items = sorted(filtered_items)
-    
-    total_count = len(filtered_items)
+    total_count = len(matching_keys)
     
     # Calcola paginazione
     total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
     page = max(1, min(page, total_pages))
     
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    items_list = filtered_items[start_idx:end_idx]
+    items_list = index.page(matching_keys, page, per_page)
     
     return render_template('view_anagrafica.html', 
                          items=items_list, 
@@ -378,7 +445,7 @@ def view_anagrafica():
 @app.route('/upload_anagrafica', methods=['POST'])
 def upload_anagrafica():
     """Endpoint per caricare l'anagrafica articoli"""
-    global anagrafica_data, anagrafica_filename
+    global anagrafica_filename
     
     if 'file' not in request.files:
         flash('Nessun file selezionato', 'error')
@@ -392,17 +459,17 @@ def upload_anagrafica():
     
     if file and file.filename.endswith('.csv'):
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
         
         try:
             # Controlla se è un update o un nuovo caricamento
-            update_mode = request.form.get('update_mode') == 'true' or anagrafica_data is not None
-            total_count, new_items, updated_items = load_anagrafica(filepath, update_mode=update_mode)
+            update_mode = request.form.get('update_mode') == 'true' or get_anagrafica() is not None
+            # Lettura diretta dallo stream caricato (nessun file temporaneo)
+            total_count, new_items, updated_items, change_set = load_anagrafica(file.stream, update_mode=update_mode)
             anagrafica_filename = filename
             
             if update_mode:
-                flash(f'Anagrafica aggiornata! Totale: {total_count} articoli ({new_items} nuovi, {updated_items} aggiornati).', 'success')
+                flash(f'Anagrafica aggiornata! Totale: {total_count} articoli ({new_items} nuovi, {updated_items} aggiornati, '
+                      f'{change_set.stats["modified"]} con valore modificato).', 'success')
             else:
                 flash(f'Anagrafica caricata con successo! {total_count} articoli memorizzati.', 'success')
         except Exception as e:
@@ -413,12 +480,51 @@ def upload_anagrafica():
     return redirect(request.referrer or url_for('index'))
 
 
+@app.route('/api/anagrafica/diff', methods=['GET', 'POST'])
+def anagrafica_diff_api():
+    """Change set dell'anagrafica, paginato
+    
+    GET: ultimo change set (o ?id=...), con page, per_page e kind (added/removed/modified)
+    POST: anteprima di un CSV (campo file, update_mode) senza applicare le modifiche
+    """
+    page = request.args.get('page', 1, type=int)
+    per_page = max(1, min(request.args.get('per_page', 100, type=int), 1000))
+    kind = request.args.get('kind') or None
+    if kind not in (None, anagrafica_diff.ADDED, anagrafica_diff.REMOVED, anagrafica_diff.MODIFIED):
+        return jsonify({'error': f'Tipo non valido: {kind}'}), 400
+    
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if file is None or not file.filename.endswith('.csv'):
+            return jsonify({'error': 'File non valido. Carica un file CSV.'}), 400
+        current = get_anagrafica()
+        update_mode = request.form.get('update_mode') == 'true' or current is not None
+        try:
+            incoming = read_anagrafica_csv(file.stream)
+        except Exception as e:
+            return jsonify({'error': f'Errore nella lettura del CSV: {str(e)}'}), 400
+        change_set = anagrafica_diff.compute_changes(current, incoming, replace=not update_mode, preview=True)
+        # Anteprima non applicata: solo in memoria (pagine successive con ?id=), mai nello storage,
+        # così non diventa l'"ultimo change set" e non fa uscire quelli reali da ANAGRAFICA_CHANGES_KEEP
+        anagrafica_diff.remember(change_set)
+        return jsonify(change_set.page(page, per_page, kind))
+    
+    change_id = request.args.get('id') or None
+    change_set = anagrafica_diff.recall(change_id) if change_id else None
+    if change_set is None:
+        blob = storage.load_anagrafica_changes(change_id, app.config['UPLOAD_FOLDER']) if STORAGE_AVAILABLE else None
+        if blob is None:
+            return jsonify({'error': 'Nessuna modifica dell\'anagrafica registrata' if not change_id
+                            else f'Change set non trovato: {change_id}'}), 404
+        change_set = anagrafica_diff.ChangeSet.from_bytes(blob)
+        anagrafica_diff.remember(change_set)
+    return jsonify(change_set.page(page, per_page, kind))
+
+
 @app.route('/upload_transform', methods=['POST'])
 def upload_transform():
     """Endpoint per caricare e trasformare il file CSV - DEPRECATO: usa /api/upload_direct o /api/upload_chunk"""
-    global anagrafica_data
-    
-    if anagrafica_data is None:
+    if get_anagrafica() is None:
         flash('Carica prima l\'anagrafica articoli!', 'error')
         return redirect(url_for('index'))
     
@@ -474,9 +580,7 @@ def upload_transform():
                 mimetype='text/csv'
             )
         except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            print(f"Errore nella trasformazione: {error_details}")  # Debug
+            upload_log.exception("Errore nella trasformazione: %s", e)
             flash(f'Errore nella trasformazione: {str(e)}', 'error')
             return redirect(url_for('index'))
     else:
@@ -497,8 +601,7 @@ def upload_direct():
 def process_uploaded_file(file_id, file_bytes, filename):
     """Processa un file caricato in MongoDB"""
     try:
-        global anagrafica_data
-        if anagrafica_data is None:
+        if get_anagrafica() is None:
             return jsonify({'error': 'Anagrafica non caricata'}), 400
         
         # Salva temporaneamente per processarlo
@@ -517,6 +620,7 @@ def process_uploaded_file(file_id, file_bytes, filename):
         # Leggi il file trasformato
         with open(output_filepath, 'rb') as f:
             transformed_content = f.read()
+        stored_content, content_encoding = transform_compression.compress(transformed_content)
         
         # Salva il risultato in MongoDB
         if STORAGE_AVAILABLE:
@@ -528,7 +632,11 @@ def process_uploaded_file(file_id, file_bytes, filename):
                     {
                         '$set': {
                             'output_filename': output_filename,
-                            'file_data': transformed_content.hex(),
+                            'file_data': stored_content,  # BSON binary (gzip sopra la soglia)
+                            'file_encoding': 'binary',
+                            'content_encoding': content_encoding,
+                            'file_size': len(transformed_content),
+                            'stored_size': len(stored_content),
                             'rows_processed': rows_processed,
                             'rows_transformed': rows_transformed,
                             'missing_codes': missing_codes,
@@ -537,7 +645,7 @@ def process_uploaded_file(file_id, file_bytes, filename):
                         }
                     }
                 )
-                app.logger.info(f"File trasformato salvato in MongoDB: {file_id}")
+                upload_log.info("File trasformato salvato in MongoDB: %s", file_id)
         
         # Cancella i file temporanei
         try:
@@ -556,8 +664,7 @@ def process_uploaded_file(file_id, file_bytes, filename):
             'hasMissingCodes': len(missing_codes) > 0
         })
     except Exception as e:
-        import traceback
-        app.logger.error(f"Errore processamento file: {traceback.format_exc()}")
+        upload_log.exception("Errore processamento file: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -583,33 +690,33 @@ def upload_chunk():
         try:
             import base64
             chunk_bytes = base64.b64decode(chunk_data_hex)
-            app.logger.info(f"Chunk {chunk_index + 1}/{total_chunks} decodificato: {len(chunk_bytes)} bytes")
+            upload_log.debug("Chunk %s/%s decodificato: %s bytes", chunk_index + 1, total_chunks, len(chunk_bytes))
         except Exception as e:
-            app.logger.error(f"Errore decodifica Base64: {e}")
+            upload_log.error("Errore decodifica Base64: %s", e)
             return jsonify({'error': f'Formato chunk non valido: {str(e)}'}), 400
         
         # Per file grandi (> 4.5MB), usa S3 invece di MongoDB
         # I chunk vengono salvati temporaneamente in MongoDB, poi il file completo va su S3
         if not STORAGE_AVAILABLE:
-            app.logger.error("STORAGE_AVAILABLE è False")
+            upload_log.error("STORAGE_AVAILABLE è False")
             return jsonify({'error': 'MongoDB non disponibile. Configura MONGODB_URI su Vercel.'}), 500
         
-        app.logger.info(f"Tentativo salvataggio chunk {chunk_index + 1}/{total_chunks} per file {file_id}")
+        upload_log.debug("Tentativo salvataggio chunk %s/%s per file %s", chunk_index + 1, total_chunks, file_id)
         success = storage.save_chunk(file_id, chunk_index, chunk_bytes)
         if success:
-            app.logger.info(f"Chunk {chunk_index + 1}/{total_chunks} salvato temporaneamente per file {file_id}")
+            # Un upload grande ha centinaia di chunk: in INFO ne viene registrato uno ogni LOG_SAMPLE_EVERY
+            if app_logging.sampled('upload_chunk'):
+                upload_log.info("Chunk %s/%s salvato temporaneamente per file %s", chunk_index + 1, total_chunks, file_id)
             return jsonify({
                 'success': True,
                 'chunkIndex': chunk_index,
                 'message': f'Chunk {chunk_index + 1}/{total_chunks} caricato'
             })
         else:
-            app.logger.error(f"save_chunk ha restituito False per chunk {chunk_index + 1}/{total_chunks}")
+            upload_log.error("save_chunk ha restituito False per chunk %s/%s", chunk_index + 1, total_chunks)
             return jsonify({'error': 'Errore nel salvataggio del chunk. Verifica la connessione MongoDB.'}), 500
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        app.logger.error(f"Errore upload chunk: {error_trace}")
+        upload_log.exception("Errore upload chunk: %s", e)
         return jsonify({'error': f'Errore server: {str(e)}'}), 500
 
 
@@ -624,8 +731,7 @@ def merge_chunks():
         if not file_id:
             return jsonify({'error': 'Parametri mancanti'}), 400
         
-        global anagrafica_data
-        if anagrafica_data is None:
+        if get_anagrafica() is None:
             return jsonify({'error': 'Anagrafica non caricata'}), 400
         
         # Verifica MongoDB disponibile
@@ -674,13 +780,16 @@ def merge_chunks():
             except:
                 pass
         
-        # Se il file è > 4.5MB, salvalo su S3 invece di MongoDB
+        # Compressione (gzip sopra la soglia): la scelta MongoDB/S3 si basa sulla dimensione salvata
         file_size = len(transformed_content)
+        stored_content, content_encoding = transform_compression.compress(transformed_content)
+        stored_size = len(stored_content)
         max_mongodb_size = 4.5 * 1024 * 1024  # 4.5MB
         
-        if file_size > max_mongodb_size and S3_AVAILABLE:
+        # Se il file (compresso) è > 4.5MB, salvalo su S3 invece di MongoDB
+        if stored_size > max_mongodb_size and S3_AVAILABLE:
             # Salva su S3 per file grandi
-            if s3_storage.upload_file_to_s3(transformed_content, file_id, output_filename):
+            if s3_storage.upload_file_to_s3(stored_content, file_id, output_filename, content_encoding=content_encoding):
                 # Salva solo metadata in MongoDB
                 client, db = storage.get_mongo_client()
                 if client is not None and db is not None:
@@ -691,17 +800,21 @@ def merge_chunks():
                             '$set': {
                                 'output_filename': output_filename,
                                 'file_size': file_size,
+                                'stored_size': stored_size,
+                                'content_encoding': content_encoding,
                                 'storage_type': 's3',
                                 'rows_processed': rows_processed,
                                 'rows_transformed': rows_transformed,
                                 'missing_codes': missing_codes,
                                 'status': 'processed',
                                 'updated_at': datetime.now().isoformat()
-                            }
+                            },
+                            # Il file ricomposto non serve più: i dati stanno su S3
+                            '$unset': {'file_data': '', 'file_encoding': ''}
                         },
                         upsert=True
                     )
-                    app.logger.info(f"File grande salvato su S3: {file_id} ({file_size / 1024 / 1024:.2f}MB)")
+                    upload_log.info("File grande salvato su S3: %s (%.2fMB)", file_id, stored_size / 1024 / 1024)
                 else:
                     return jsonify({'error': 'MongoDB non disponibile per salvare metadata'}), 500
             else:
@@ -716,8 +829,11 @@ def merge_chunks():
                     {
                         '$set': {
                             'output_filename': output_filename,
-                            'file_data': transformed_content.hex(),  # Salva come hex
+                            'file_data': stored_content,  # BSON binary (niente hex: metà dello spazio)
+                            'file_encoding': 'binary',
+                            'content_encoding': content_encoding,
                             'file_size': file_size,
+                            'stored_size': stored_size,
                             'storage_type': 'mongodb',
                             'rows_processed': rows_processed,
                             'rows_transformed': rows_transformed,
@@ -728,7 +844,7 @@ def merge_chunks():
                     },
                     upsert=True
                 )
-                app.logger.info(f"File piccolo salvato in MongoDB: {file_id} ({file_size / 1024 / 1024:.2f}MB)")
+                upload_log.info("File piccolo salvato in MongoDB: %s (%.2fMB)", file_id, stored_size / 1024 / 1024)
             else:
                 return jsonify({'error': 'MongoDB non disponibile per salvare il risultato'}), 500
         
@@ -742,89 +858,317 @@ def merge_chunks():
             'hasMissingCodes': len(missing_codes) > 0
         })
     except Exception as e:
-        import traceback
-        app.logger.error(f"Errore merge chunks: {traceback.format_exc()}")
+        upload_log.exception("Errore merge chunks: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
+# ==================== UPLOAD DIRETTO SU S3 (multipart presigned) ====================
+
+# Download dei file su S3 tramite redirect a un URL presigned (la funzione non inoltra i bytes)
+S3_PRESIGNED_DOWNLOADS = os.environ.get('S3_PRESIGNED_DOWNLOADS', '1') != '0'
+# Validità degli URL presigned di download (secondi)
+S3_PRESIGNED_DOWNLOAD_EXPIRATION = int(os.environ.get('S3_PRESIGNED_DOWNLOAD_EXPIRATION', '300'))
+
+
+def _s3_input_name(filename):
+    """Nome dell'oggetto S3 del file caricato (distinto dal file trasformato YDMXEL_*)"""
+    return f"input_{secure_filename(filename) or 'upload.csv'}"
+
+
+def transform_s3_file(file_id, input_name):
+    """Trasforma un CSV già su S3 scrivendo il risultato su S3 (streaming, memoria O(parte))"""
+    now = datetime.now()
+    output_filename = f"YDMXEL_{now.strftime('%Y%m%d_%H%M')}.csv"
+    
+    # Il risultato viene compresso in streaming (i file caricati direttamente su S3 sono grandi)
+    content_encoding = transform_compression.GZIP if transform_compression.enabled() else None
+    
+    reader = s3_storage.open_s3_reader(file_id, input_name)
+    if reader is None:
+        raise ValueError('File caricato non trovato su S3')
+    writer = s3_storage.open_s3_writer(file_id, output_filename, content_encoding=content_encoding)
+    if writer is None:
+        reader.close()
+        raise ValueError('Impossibile scrivere il file trasformato su S3')
+    
+    input_text = io.TextIOWrapper(reader, encoding='utf-8-sig', newline='')
+    buffered = io.BufferedWriter(writer, buffer_size=1024 * 1024)
+    binary_output = transform_compression.open_writer(buffered) if content_encoding else buffered
+    output_text = io.TextIOWrapper(binary_output, encoding='utf-8', newline='')
+    try:
+        rows_processed, rows_transformed, missing_codes = process_csv_file(
+            input_stream=input_text, output_stream=output_text
+        )
+        file_size = None
+        if content_encoding:
+            output_text.flush()
+            file_size = binary_output.tell()  # bytes del CSV non compresso
+        # La chiusura conclude l'upload multipart del risultato
+        output_text.close()
+        buffered.close()
+    except Exception:
+        writer.abort()
+        raise
+    finally:
+        input_text.close()
+    
+    # Il file originale non serve più
+    s3_storage.delete_file_from_s3(file_id, input_name)
+    
+    stored_size = writer.bytes_written
+    if file_size is None:
+        file_size = stored_size
+    if STORAGE_AVAILABLE:
+        storage.save_transformed_metadata(file_id, {
+            'output_filename': output_filename,
+            'file_size': file_size,
+            'stored_size': stored_size,
+            'content_encoding': content_encoding,
+            'storage_type': 's3',
+            'rows_processed': rows_processed,
+            'rows_transformed': rows_transformed,
+            'missing_codes': missing_codes,
+            'status': 'processed'
+        })
+        storage.run_in_background(_sweep_downloaded_transforms)
+    upload_log.info("File trasformato S3 -> S3: %s (%.2fMB, %.2fMB salvati)", file_id,
+                    file_size / 1024 / 1024, stored_size / 1024 / 1024)
+    
+    return {
+        'success': True,
+        'download_id': file_id,
+        'outputFilename': output_filename,
+        'downloadUrl': s3_storage.generate_presigned_url(
+            file_id, output_filename, S3_PRESIGNED_DOWNLOAD_EXPIRATION, download_name=output_filename
+        ),
+        'rowsProcessed': rows_processed,
+        'rowsTransformed': rows_transformed,
+        'missingCodes': missing_codes,
+        'hasMissingCodes': len(missing_codes) > 0
+    }
+
+
+@app.route('/api/s3/multipart/start', methods=['POST'])
+def s3_multipart_start():
+    """Avvia un upload multipart diretto dal browser a S3: restituisce un URL presigned per ogni parte"""
+    if not S3_AVAILABLE:
+        # Il frontend ripiega sull'upload a chunk via MongoDB
+        return jsonify({'error': 'S3 non configurato', 'fallback': True}), 400
+    if get_anagrafica() is None:
+        return jsonify({'error': 'Anagrafica non caricata'}), 400
+    
+    data = request.get_json() or {}
+    filename = data.get('filename', 'upload.csv')
+    file_size = int(data.get('size') or 0)
+    file_id = f"file_{int(time.time() * 1000)}_{uuid.uuid4().hex[:9]}"
+    
+    upload = s3_storage.create_presigned_multipart_upload(file_id, _s3_input_name(filename), file_size)
+    if upload is None:
+        return jsonify({'error': 'Errore avvio upload su S3', 'fallback': True}), 500
+    
+    return jsonify({
+        'success': True,
+        'fileId': file_id,
+        'uploadId': upload['upload_id'],
+        'partSize': upload['part_size'],
+        'urls': upload['urls']
+    })
+
+
+@app.route('/api/s3/multipart/complete', methods=['POST'])
+def s3_multipart_complete():
+    """Conclude l'upload multipart e trasforma il file da S3 a S3"""
+    try:
+        data = request.get_json() or {}
+        file_id = data.get('fileId')
+        upload_id = data.get('uploadId')
+        parts = data.get('parts') or []
+        filename = data.get('filename', 'upload.csv')
+        
+        if not file_id or file_id != secure_filename(file_id) or not upload_id or not parts:
+            return jsonify({'error': 'Parametri mancanti'}), 400
+        if not S3_AVAILABLE:
+            return jsonify({'error': 'S3 non configurato'}), 500
+        
+        input_name = _s3_input_name(filename)
+        if not s3_storage.complete_multipart_upload(file_id, input_name, upload_id, parts):
+            return jsonify({'error': 'Errore nel completamento dell\'upload su S3'}), 500
+        
+        return jsonify(transform_s3_file(file_id, input_name))
+    except Exception as e:
+        upload_log.exception("Errore trasformazione S3: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/s3/multipart/abort', methods=['POST'])
+def s3_multipart_abort():
+    """Annulla un upload multipart interrotto (le parti caricate vengono eliminate)"""
+    data = request.get_json() or {}
+    file_id = data.get('fileId')
+    upload_id = data.get('uploadId')
+    if not file_id or file_id != secure_filename(file_id) or not upload_id or not S3_AVAILABLE:
+        return jsonify({'error': 'Parametri mancanti'}), 400
+    aborted = s3_storage.abort_multipart_upload(file_id, _s3_input_name(data.get('filename', 'upload.csv')), upload_id)
+    return jsonify({'success': aborted})
+
+
+# Dimensione dei blocchi inviati al client nei download in streaming
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+
+def _download_response(chunks, total_size, filename, byte_range=None, content_encoding=None):
+    """Risposta in streaming per un download (Content-Length, Accept-Ranges, 206 per le richieste Range)
+    
+    total_size None: dimensione non nota in anticipo (file decompresso al volo, niente Range);
+    content_encoding: es. 'gzip' se i bytes sono inviati compressi.
+    """
+    response = Response(chunks, mimetype='text/csv', direct_passthrough=True)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # La rappresentazione inviata dipende da Accept-Encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    if total_size is None:
+        response.headers['Accept-Ranges'] = 'none'
+        return response
+    response.headers['Accept-Ranges'] = 'bytes'
+    if byte_range is not None:
+        start, stop = byte_range
+        response.status_code = 206
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{total_size}'
+        response.headers['Content-Length'] = str(stop - start)
+    else:
+        response.headers['Content-Length'] = str(total_size)
+    return response
+
+
+def _accepts_encoding(content_encoding):
+    """True se il client accetta il file nella codifica in cui è salvato (o se non è compresso)"""
+    return content_encoding is None or request.accept_encodings.quality(content_encoding) > 0
+
+
+def _requested_range(total_size):
+    """(start, stop) della richiesta Range, None se assente; False se non soddisfacibile"""
+    # Più intervalli nella stessa richiesta: si invia l'intero file (consentito dall'RFC 7233)
+    if request.range is None or len(request.range.ranges) != 1:
+        return None
+    byte_range = request.range.range_for_length(total_size)
+    return byte_range if byte_range is not None else False
+
+
+def _range_not_satisfiable(total_size):
+    response = jsonify({'error': 'Range non valido'})
+    response.status_code = 416
+    response.headers['Content-Range'] = f'bytes */{total_size}'
+    return response
+
+
+def _sweep_downloaded_transforms():
+    """Elimina da S3 e da MongoDB i file scaricati con un URL presigned ormai scaduto"""
+    for doc in storage.list_expired_transformed_files():
+        if doc.get('storage_type') == 's3' and S3_AVAILABLE:
+            s3_storage.delete_file_from_s3(doc['file_id'], doc.get('output_filename') or 'YDMXEL_trasformato.csv')
+        storage.delete_transformed_file(doc['file_id'])
+
+
 @app.route('/api/download_transformed/<file_id>')
 def download_transformed(file_id):
-    """Scarica il file trasformato da S3 (per file grandi) o MongoDB (per file piccoli)"""
+    """Scarica il file trasformato da S3 (per file grandi) o MongoDB (per file piccoli), in streaming
+    
+    I file su S3 vengono serviti con un redirect a un URL presigned (S3_PRESIGNED_DOWNLOADS) e
+    vengono eliminati (oggetto e metadata) al primo accesso successivo alla scadenza dell'URL;
+    negli altri casi sono supportate le richieste
+    Range e il file viene eliminato dallo storage solo dopo un download completo.
+    I file compressi vengono inviati con Content-Encoding: gzip se il client lo accetta (i Range
+    si riferiscono allora ai bytes compressi), altrimenti vengono decompressi al volo.
+    """
     try:
         # Recupera metadata da MongoDB
         if not STORAGE_AVAILABLE:
             return jsonify({'error': 'Storage non disponibile'}), 500
         
-        file_doc = storage.get_transformed_file(file_id)
+        # Pulizia dei download presigned scaduti, fuori dalla richiesta
+        storage.run_in_background(_sweep_downloaded_transforms)
+        
+        file_doc = storage.get_transformed_file(file_id, include_data=False)
         if not file_doc:
             return jsonify({'error': 'File non trovato'}), 404
+        if file_doc.get('delete_after') and file_doc['delete_after'] < datetime.now():
+            # Già scaricato e in attesa di eliminazione
+            return jsonify({'error': 'File non trovato'}), 404
         
-        output_filename = file_doc.get('output_filename', 'YDMXEL_trasformato.csv')
+        output_filename = file_doc.get('output_filename') or 'YDMXEL_trasformato.csv'
         storage_type = file_doc.get('storage_type', 'mongodb')
+        content_encoding = file_doc.get('content_encoding')
+        send_encoded = _accepts_encoding(content_encoding)
+        
+        # Se è su S3, il browser scarica direttamente dal bucket (redirect a un URL presigned;
+        # S3 risponde con il Content-Encoding salvato con l'oggetto)
+        if storage_type == 's3' and S3_AVAILABLE and S3_PRESIGNED_DOWNLOADS and send_encoded:
+            url = s3_storage.generate_presigned_url(
+                file_id, output_filename, S3_PRESIGNED_DOWNLOAD_EXPIRATION, download_name=output_filename
+            )
+            if url:
+                # L'oggetto deve restare finché l'URL è valido: eliminato dopo la scadenza
+                storage.mark_transformed_downloaded(file_id, S3_PRESIGNED_DOWNLOAD_EXPIRATION)
+                return redirect(url)
         
-        # Se è su S3, scarica da S3
+        # Altrimenti il body S3 viene inoltrato a blocchi senza passare da disco
         if storage_type == 's3' and S3_AVAILABLE:
-            file_content = s3_storage.download_file_from_s3(file_id, output_filename)
-            if file_content:
-                # Elimina da S3 dopo il download
-                s3_storage.delete_file_from_s3(file_id, output_filename)
-                # Elimina metadata da MongoDB
-                storage.delete_transformed_file(file_id)
-                
-                # Crea file temporaneo per il download
-                uploads_dir = app.config['UPLOAD_FOLDER']
-                temp_path = os.path.join(uploads_dir, output_filename)
-                with open(temp_path, 'wb') as f:
-                    f.write(file_content)
-                
-                return send_file(
-                    temp_path,
-                    as_attachment=True,
-                    download_name=output_filename,
-                    mimetype='text/csv'
-                )
-            else:
+            stored_size = file_doc.get('stored_size') or s3_storage.get_file_size_from_s3(file_id, output_filename)
+            if stored_size is None:
                 return jsonify({'error': 'Errore nel download da S3'}), 500
-        else:
-            # File piccolo, scarica da MongoDB
-            file_content = file_doc['file_data']
-            if isinstance(file_content, str):
-                # Decodifica da hex
-                file_content = bytes.fromhex(file_content)
             
-            # Crea file temporaneo per il download
-            uploads_dir = app.config['UPLOAD_FOLDER']
-            temp_path = os.path.join(uploads_dir, output_filename)
-            with open(temp_path, 'wb') as f:
-                f.write(file_content)
+            if send_encoded:
+                total_size = stored_size
+                byte_range = _requested_range(total_size)
+                if byte_range is False:
+                    return _range_not_satisfiable(total_size)
+            else:
+                # Decompressione al volo: dimensione non nota, niente Range
+                total_size = None
+                byte_range = None
+            start, stop = byte_range if byte_range else (None, None)
+            body = s3_storage.iter_file_from_s3(file_id, output_filename, start, None if stop is None else stop - 1)
+            if body is None:
+                return jsonify({'error': 'Errore nel download da S3'}), 500
+            if not send_encoded:
+                body = transform_compression.iter_decompress(body, content_encoding)
             
-            # Cancella da MongoDB dopo il download
-            storage.delete_transformed_file(file_id)
+            def generate():
+                yield from body
+                if byte_range is None:
+                    # Elimina da S3 e i metadata da MongoDB dopo il download completo
+                    s3_storage.delete_file_from_s3(file_id, output_filename)
+                    storage.delete_transformed_file(file_id)
             
-            return send_file(
-                    temp_path,
-                    as_attachment=True,
-                    download_name=output_filename,
-                    mimetype='text/csv'
-                )
+            return _download_response(generate(), total_size, output_filename, byte_range,
+                                      content_encoding if send_encoded else None)
         
-        # Fallback: cerca nel file system
-        uploads_dir = app.config['UPLOAD_FOLDER']
-        # Cerca file che iniziano con YDMXEL_
-        for filename in os.listdir(uploads_dir):
-            if filename.startswith('YDMXEL_') and filename.endswith('.csv'):
-                filepath = os.path.join(uploads_dir, filename)
-                return send_file(
-                    filepath,
-                    as_attachment=True,
-                    download_name=filename,
-                    mimetype='text/csv'
-                )
+        # File piccolo (<= 4.5MB salvati per costruzione), un solo documento MongoDB inviato a blocchi
+        file_doc = storage.get_transformed_file(file_id, decompress=not send_encoded)
+        if not file_doc or 'file_data' not in file_doc:
+            return jsonify({'error': 'File non trovato'}), 404
+        file_content = memoryview(file_doc['file_data'])
+        total_size = len(file_content)
+        
+        byte_range = _requested_range(total_size)
+        if byte_range is False:
+            return _range_not_satisfiable(total_size)
+        start, stop = byte_range if byte_range else (0, total_size)
+        
+        def generate():
+            for offset in range(start, stop, DOWNLOAD_CHUNK_SIZE):
+                yield bytes(file_content[offset:min(offset + DOWNLOAD_CHUNK_SIZE, stop)])
+            if byte_range is None:
+                # Cancella da MongoDB dopo il download completo
+                storage.delete_transformed_file(file_id)
         
-        return jsonify({'error': 'File non trovato'}), 404
+        return _download_response(generate(), total_size, output_filename, byte_range,
+                                  content_encoding if send_encoded else None)
         
     except Exception as e:
-        app.logger.error(f"Errore download trasformato: {str(e)}")
+        upload_log.error("Errore download trasformato: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 
@@ -840,47 +1184,27 @@ def download_file(filename):
 
 
 def load_odata_config():
-    """Carica la configurazione OData da JSON"""
-    default_config = {
-        'odata_url': 'https://voiapp.fr',
-        'odata_endpoint': 'michelinpal/odata/DMX',  # Endpoint trovato nel VBA
-        'requires_auth': True,  # Abilitato di default
-        'auth_type': 'basic',  # Basic Auth di default
-        'auth_username': 'API',  # Nome utente API (impostato di default)
-        'auth_password': 'IPA',  # Password API (impostato di default)
-        'auth_token': '',  # Per altri tipi di auth
-        'date_field': 'LaunchDate',
-        'site_field': 'SiteName'  # Cambiato da 'Site' a 'SiteName' come nel VBA
-    }
-    
-    if os.path.exists(ODATA_CONFIG_JSON):
-        try:
-            with open(ODATA_CONFIG_JSON, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                # Merge con default per valori mancanti
-                for key in default_config:
-                    if key not in config:
-                        config[key] = default_config[key]
-                return config
-        except Exception as e:
-            print(f"Errore nel caricamento config OData: {e}")
-    
-    return default_config
+    """Configurazione OData corrente (dalla memoria, riconvalidata periodicamente)"""
+    return odata_config_provider.get()
 
 
 def save_odata_config(config):
-    """Salva la configurazione OData in JSON o MongoDB"""
+    """Salva la configurazione OData in JSON o MongoDB e la pubblica subito in memoria"""
     if STORAGE_AVAILABLE:
-        return storage.save_odata_config(config, ODATA_CONFIG_JSON)
+        saved = storage.save_odata_config(config, ODATA_CONFIG_JSON)
     else:
         # Fallback: file system locale
         try:
             with open(ODATA_CONFIG_JSON, 'w', encoding='utf-8') as f:
                 json.dump(config, f, ensure_ascii=False, indent=2)
-            return True
+            saved = True
         except Exception as e:
-            print(f"Errore nel salvataggio config OData: {e}")
-            return False
+            log.error("Errore nel salvataggio config OData: %s", e)
+            saved = False
+    
+    if saved:
+        odata_config_provider.publish(config)
+    return saved
 
 
 def get_json_extraction(date_str, site='TST - EDC Torino'):
@@ -917,14 +1241,13 @@ def get_json_extraction(date_str, site='TST - EDC Torino'):
         # Carica il file più recente
         filepath, _, filename = matching_files[0]
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-                # Verifica che contenga i dati analizzati
-                if 'data' in json_data or 'statistics' in json_data:
-                    app.logger.info(f"Trovato JSON in cache per {date_str}: {filename}")
-                    return json_data
+            json_data = json_provider.load_file(filepath)
+            # Verifica che contenga i dati analizzati
+            if 'data' in json_data or 'statistics' in json_data:
+                extraction_log.debug("Trovato JSON in cache per %s: %s", date_str, filename)
+                return json_data
         except Exception as e:
-            app.logger.warning(f"Errore nel caricamento JSON {filename}: {e}")
+            extraction_log.warning("Errore nel caricamento JSON %s: %s", filename, e)
     
     return None
 
@@ -958,24 +1281,24 @@ def save_json_extraction(date_str, site, analysis_result):
     if STORAGE_AVAILABLE:
         filename = storage.save_extraction(date_str, site, analysis_result, uploads_dir)
         if filename:
-            app.logger.info(f"Estrazione {date_str} salvata in storage persistente: {filename}")
+            extraction_log.info("Estrazione %s salvata in storage persistente: %s", date_str, filename)
             return filename
     
     # Fallback: file system locale
     try:
-        app.logger.info(f"Tentativo di salvataggio JSON in: {uploads_dir} (path assoluto: {os.path.abspath(uploads_dir)})")
+        extraction_log.debug("Tentativo di salvataggio JSON in: %s (path assoluto: %s)", uploads_dir, os.path.abspath(uploads_dir))
         
         # Crea la directory se non esiste
         try:
             os.makedirs(uploads_dir, exist_ok=True)
-            app.logger.info(f"Directory uploads creata/verificata: {uploads_dir}")
+            extraction_log.debug("Directory uploads creata/verificata: %s", uploads_dir)
         except Exception as e:
-            app.logger.error(f"Errore nella creazione directory {uploads_dir}: {e}")
+            extraction_log.error("Errore nella creazione directory %s: %s", uploads_dir, e)
             return None
         
         # Verifica permessi di scrittura
         if not os.access(uploads_dir, os.W_OK):
-            app.logger.error(f"Directory {uploads_dir} non ha permessi di scrittura")
+            extraction_log.error("Directory %s non ha permessi di scrittura", uploads_dir)
             return None
         
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -983,7 +1306,7 @@ def save_json_extraction(date_str, site, analysis_result):
         filename = f"estrazione_{date_pattern}_{timestamp}.json"
         filepath = os.path.join(uploads_dir, filename)
         
-        app.logger.info(f"Salvataggio file JSON: {filepath}")
+        extraction_log.debug("Salvataggio file JSON: %s", filepath)
         
         # Salva i dati analizzati
         json_data = {
@@ -995,24 +1318,22 @@ def save_json_extraction(date_str, site, analysis_result):
         }
         
         # Prova a salvare
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(json_data, f, ensure_ascii=False, indent=2)
+        json_provider.dump_file(json_data, filepath)
         
         # Verifica che il file sia stato creato
         if os.path.exists(filepath):
             file_size = os.path.getsize(filepath)
-            app.logger.info(f"Estrazione salvata in JSON: {filename} (dimensione: {file_size} bytes)")
+            extraction_log.info("Estrazione salvata in JSON: %s (dimensione: %s bytes)", filename, file_size)
             return filename
         else:
-            app.logger.error(f"File {filename} non creato dopo il salvataggio")
+            extraction_log.error("File %s non creato dopo il salvataggio", filename)
             return None
             
     except PermissionError as e:
-        app.logger.error(f"Errore di permessi nel salvataggio JSON: {e}")
+        extraction_log.error("Errore di permessi nel salvataggio JSON: %s", e)
         return None
     except Exception as e:
-        import traceback
-        app.logger.error(f"Errore nel salvataggio JSON: {e}\n{traceback.format_exc()}")
+        extraction_log.exception("Errore nel salvataggio JSON: %s", e)
         return None
 
 
@@ -1152,13 +1473,10 @@ def estrai_dati():
         # URL completo come nel VBA (con %24 invece di $ per encoding)
         full_url = f"{odata_url}?$filter={filter_encoded}&$orderby={date_field}&$select={select_encoded}"
         
-        print(f"URL OData costruito (come VBA): {full_url}")
+        odata_log.debug("URL OData costruito (come VBA): %s", full_url)
         
         # Fai la richiesta
         try:
-            # Aggiungi logging per debug
-            print(f"Tentativo di connessione a: {full_url}")
-            
             # Headers per OData (come Power Query)
             headers = {
                 'Accept': 'application/json',
@@ -1187,7 +1505,7 @@ def estrai_dati():
                     # Usa Basic Auth con requests.auth
                     from requests.auth import HTTPBasicAuth
                     auth = HTTPBasicAuth(auth_username, auth_password)
-                    print(f"Usando Basic Auth con username: {auth_username}")
+                    odata_log.debug("Usando Basic Auth con username: %s", auth_username)
                 elif auth_type == 'bearer':
                     if not auth_token:
                         return jsonify({
@@ -1208,18 +1526,13 @@ def estrai_dati():
                     headers['X-API-Key'] = auth_token
             else:
                 # Se requires_auth è False ma il server richiede autenticazione
-                print("ATTENZIONE: Autenticazione disabilitata ma il server potrebbe richiederla")
-            
-            print(f"Richiesta a: {full_url}")
-            print(f"Headers: {headers}")
-            if auth:
-                print("Autenticazione: Basic Auth abilitata")
+                odata_log.warning("ATTENZIONE: Autenticazione disabilitata ma il server potrebbe richiederla")
             
             # Timeout ridotto a 15 secondi per evitare timeout del worker
             response = requests.get(full_url, headers=headers, auth=auth, timeout=15, allow_redirects=True)
             
-            print(f"Status code: {response.status_code}")
-            print(f"Content-Type: {response.headers.get('Content-Type', 'N/A')}")
+            odata_log.debug("Status code: %s, Content-Type: %s", response.status_code,
+                            response.headers.get('Content-Type', 'N/A'))
             
             # Se la risposta non è OK
             if response.status_code != 200:
@@ -1270,14 +1583,11 @@ def estrai_dati():
                     'hint': 'Verifica la configurazione OData. URL corretto: https://voiapp.fr/michelinpal/odata/DMX'
                 }), response.status_code
             
-            print(f"Response preview (first 500 chars): {response.text[:500]}")
-            
             # Prova a parsare come JSON
             try:
                 data_json = response.json()
-                print(f"Dati ricevuti (tipo): {type(data_json)}")
-                if isinstance(data_json, dict):
-                    print(f"Chiavi nel JSON: {list(data_json.keys())[:10]}")
+                if isinstance(data_json, dict) and odata_log.isEnabledFor(app_logging.DEBUG):
+                    odata_log.debug("Chiavi nel JSON: %s", list(data_json.keys())[:10])
                 
                 # Se è un feed OData, estrai i valori
                 if 'value' in data_json:
@@ -1325,9 +1635,9 @@ def estrai_dati():
                 
             except ValueError as ve:
                 # Se non è JSON, potrebbe essere XML o altro formato
-                print(f"Errore parsing JSON: {ve}")
-                print(f"Content-Type: {response.headers.get('Content-Type')}")
-                print(f"Response (first 1000 chars): {response.text[:1000]}")
+                odata_log.error("Errore parsing JSON: %s (Content-Type: %s)", ve, response.headers.get('Content-Type'))
+                if odata_log.isEnabledFor(app_logging.DEBUG):
+                    odata_log.debug("Response (first 1000 chars): %s", response.text[:1000])
                 
                 # Salva come file raw per analisi
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -1347,7 +1657,7 @@ def estrai_dati():
                 
         except requests.exceptions.RequestException as e:
             error_detail = str(e)
-            print(f"Errore richiesta: {error_detail}")
+            odata_log.error("Errore richiesta: %s", error_detail)
             return jsonify({
                 'error': f'Errore nella connessione a OData: {error_detail}',
                 'url_tried': full_url,
@@ -1434,7 +1744,7 @@ def estrai_dati_json():
         select_encoded = quote(detail_col)
         full_url = f"{odata_url}?$filter={filter_encoded}&$orderby={date_field}&$select={select_encoded}"
         
-        print(f"URL OData per JSON: {full_url}")
+        odata_log.debug("URL OData per JSON: %s", full_url)
         
         # Headers per OData
         headers = {
@@ -1480,14 +1790,13 @@ def estrai_dati_json():
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             
             # Salva i dati in JSON
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'date': date_str,
-                    'site': site,
-                    'extraction_date': datetime.now().isoformat(),
-                    'count': len(records),
-                    'data': records
-                }, f, ensure_ascii=False, indent=2)
+            json_provider.dump_file({
+                'date': date_str,
+                'site': site,
+                'extraction_date': datetime.now().isoformat(),
+                'count': len(records),
+                'data': records
+            }, filepath)
             
             return jsonify({
                 'success': True,
@@ -1501,18 +1810,23 @@ def estrai_dati_json():
             return jsonify({'error': f'Errore nel parsing della risposta: {str(e)}'}), 500
         
     except Exception as e:
-        import traceback
-        print(f"Errore estrazione JSON: {traceback.format_exc()}")
+        odata_log.exception("Errore estrazione JSON: %s", e)
         return jsonify({'error': f'Errore durante l\'estrazione: {str(e)}'}), 500
 
 
 @app.route('/api/list_extractions')
 def list_extractions():
-    """Lista tutte le estrazioni JSON salvate (MongoDB o cartella uploads)"""
+    """Lista tutte le estrazioni JSON salvate (MongoDB o cartella uploads)
+    Con ETag: se l'elenco non è cambiato (If-None-Match) risponde 304 senza leggere le estrazioni."""
     try:
         uploads_dir = app.config['UPLOAD_FOLDER']
         
+        etag = None
         if STORAGE_AVAILABLE:
+            etag = _etag(storage.get_extractions_list_version(uploads_dir), 'list_extractions')
+            not_modified = _not_modified(etag)
+            if not_modified is not None:
+                return not_modified
             extractions = storage.list_extractions(uploads_dir)
         else:
             # Fallback: file system locale
@@ -1525,15 +1839,14 @@ def list_extractions():
                         filepath = os.path.join(uploads_dir, filename)
                         try:
                             mtime = os.path.getmtime(filepath)
-                            with open(filepath, 'r', encoding='utf-8') as f:
-                                data = json.load(f)
-                                date_str = data.get('date', 'N/A')
-                                if date_str != 'N/A':
-                                    # Se abbiamo già un file per questa data, prendi il più recente
-                                    if date_str not in date_files or mtime > date_files[date_str][1]:
-                                        date_files[date_str] = (filename, mtime, data)
+                            data = json_provider.load_file(filepath)
+                            date_str = data.get('date', 'N/A')
+                            if date_str != 'N/A':
+                                # Se abbiamo già un file per questa data, prendi il più recente
+                                if date_str not in date_files or mtime > date_files[date_str][1]:
+                                    date_files[date_str] = (filename, mtime, data)
                         except Exception as e:
-                            app.logger.warning(f"Errore nel leggere {filename}: {e}")
+                            extraction_log.warning("Errore nel leggere %s: %s", filename, e)
                 
                 # Crea la lista delle estrazioni
                 for date_str, (filename, mtime, data) in date_files.items():
@@ -1548,15 +1861,44 @@ def list_extractions():
             # Ordina per data di estrazione (più recente prima)
             extractions.sort(key=lambda x: x.get('extraction_date', ''), reverse=True)
         
-        return jsonify({
+        return _with_etag(jsonify({
             'success': True,
             'extractions': extractions,
             'total': len(extractions)
-        })
+        }), etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/extraction_cache_stats')
+def extraction_cache_stats():
+    """Statistiche della cache in memoria degli snapshot delle estrazioni"""
+    if not STORAGE_AVAILABLE:
+        return jsonify({'error': 'Storage non disponibile'}), 500
+    return jsonify({'success': True, 'cache': storage.get_extraction_cache_stats()})
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metriche in formato testo Prometheus (latenze, fasi, cache, circuit breaker, compressione)"""
+    token = request.args.get('token')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    if not metrics.check_token(token):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    response = Response(metrics.render(), mimetype='text/plain')
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@app.route('/api/compression_stats')
+def compression_stats():
+    """Bytes prima e dopo la compressione delle risposte, per route"""
+    return jsonify({'success': True, 'compression': response_compression.get_stats()})
+
+
 @app.route('/estrazioni')
 def estrazioni():
     """Pagina per visualizzare tutte le estrazioni salvate"""
@@ -1579,9 +1921,7 @@ def view_json(filename):
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
     if os.path.exists(filepath):
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return jsonify(data)
+            return jsonify(json_provider.load_file(filepath))
         except Exception as e:
             return jsonify({'error': f'Errore nel leggere il file: {str(e)}'}), 500
     else:
@@ -1601,8 +1941,7 @@ def analyze_odata_data(records):
                 'accessori_details': {},
                 'crossdock_details': {},
                 'clienti_per_giro': {},
-                'product_search': {},
-                'product_descriptions': {},
+                'product_index': product_index.build_snapshot_index({}, {}),
                 'dates': [],
                 'statistics': {
                     'totali': {
@@ -1625,9 +1964,9 @@ def analyze_odata_data(records):
         # Converti i record in DataFrame per facilitare l'analisi
         df = pd.DataFrame(records)
         
-        # DEBUG: Stampa i campi disponibili per trovare la destinazione
-        if len(df) > 0:
-            app.logger.info(f"Campi disponibili nel DataFrame: {list(df.columns)}")
+        # DEBUG: campi disponibili per trovare la destinazione (solo con LOG_LEVELS=extractions=DEBUG)
+        if len(df) > 0 and extraction_log.isEnabledFor(app_logging.DEBUG):
+            extraction_log.debug("Campi disponibili nel DataFrame: %s", list(df.columns))
             # Cerca un esempio di record con dati
             sample_row = df.iloc[0]
             for col in df.columns:
@@ -1635,7 +1974,7 @@ def analyze_odata_data(records):
                 if pd.notna(val) and str(val).strip() != '':
                     val_str = str(val).upper()
                     if 'SICILIA' in val_str or 'DEST' in col.upper() or 'LOAD' in col.upper() or 'SHIP' in col.upper() or 'CARRIER' in col.upper() or 'GROUPE' in col.upper():
-                        app.logger.info(f"Campo potenzialmente rilevante per destinazione: {col} = {val}")
+                        extraction_log.debug("Campo potenzialmente rilevante per destinazione: %s = %s", col, val)
         
         # Mappa i campi OData alle colonne Excel
         # Route -> Route (colonna B)
@@ -1698,10 +2037,10 @@ def analyze_odata_data(records):
                 mask = (df['Route'] == route) & (df['destinazione'] == '')
                 df.loc[mask, 'destinazione'] = dest
         
-        # DEBUG: Stampa un esempio di destinazione trovata
-        if len(df) > 0 and df['destinazione'].notna().any():
+        # DEBUG: esempio di destinazione trovata
+        if len(df) > 0 and extraction_log.isEnabledFor(app_logging.DEBUG) and df['destinazione'].notna().any():
             sample_dest = df[df['destinazione'].notna() & (df['destinazione'] != '')]['destinazione'].iloc[0]
-            app.logger.info(f"Esempio di destinazione trovata: {sample_dest}")
+            extraction_log.debug("Esempio di destinazione trovata: %s", sample_dest)
         df['ubicazione'] = df['ADD'].fillna('') if 'ADD' in df.columns else pd.Series([''] * len(df))
         df['data'] = pd.to_datetime(df['LaunchDate'], errors='coerce') if 'LaunchDate' in df.columns else pd.Series([None] * len(df))
         
@@ -1852,11 +2191,11 @@ def analyze_odata_data(records):
                         break
             
             analysis[route] = {
-                'totale_pezzi': int(totale_pezzi),
-                'pezzi_checkati': int(pezzi_checkati),
-                'pezzi_da_checkare': int(pezzi_da_checkare),
-                'pezzi_accessori': int(pezzi_accessori),
-                'pezzi_crossdock': int(pezzi_crossdock),
+                'totale_pezzi': totale_pezzi,
+                'pezzi_checkati': pezzi_checkati,
+                'pezzi_da_checkare': pezzi_da_checkare,
+                'pezzi_accessori': pezzi_accessori,
+                'pezzi_crossdock': pezzi_crossdock,
                 'destinazione': destinazione
             }
             
@@ -1870,7 +2209,7 @@ def analyze_odata_data(records):
             clienti_unici_list = [str(c).strip() for c in clienti_unici_list if str(c).strip()]
             clienti_per_giro[route] = sorted(clienti_unici_list)
         
-        # Crea un indice per la ricerca per codice prodotto
+        # Crea un indice per la ricerca per codice prodotto (salvato nello snapshot, usato da /api/product_search)
         product_search = {}
         product_descriptions = {}
         for idx, row in df.iterrows():
@@ -1937,11 +2276,11 @@ def analyze_odata_data(records):
             # La percentuale è calcolata su tutti i pezzi totali, non escludendo accessori e crossdock
             stats_cc_list.append({
                 'cc': cc,
-                'totale_pezzi': int(stats['totale_pezzi']),
-                'pezzi_checkati': int(stats['pezzi_checkati']),
-                'pezzi_da_checkare': int(stats['pezzi_da_checkare']),
-                'pezzi_accessori': int(stats['pezzi_accessori']),
-                'pezzi_crossdock': int(stats['pezzi_crossdock']),
+                'totale_pezzi': stats['totale_pezzi'],
+                'pezzi_checkati': stats['pezzi_checkati'],
+                'pezzi_da_checkare': stats['pezzi_da_checkare'],
+                'pezzi_accessori': stats['pezzi_accessori'],
+                'pezzi_crossdock': stats['pezzi_crossdock'],
                 'percentuale': round((stats['pezzi_checkati'] / stats['totale_pezzi'] * 100) if stats['totale_pezzi'] > 0 else 0, 2)
             })
         
@@ -1978,14 +2317,6 @@ def analyze_odata_data(records):
             else:
                 percentuale = 0.0
             
-            # DEBUG: Log per verificare il calcolo per route HI e KH
-            if route == 'HI' or route == 'KH':
-                app.logger.info(f"Route {route} - totale={totale}, checkati={checkati}, percentuale_calcolata={percentuale}, tipo={type(percentuale)}")
-                # Verifica se la percentuale è sospetta (es. 16% invece di 6.16%)
-                expected_percent = (checkati / totale * 100) if totale > 0 else 0
-                if abs(percentuale - expected_percent) > 1:
-                    app.logger.warning(f"Route {route} - Percentuale sospetta! Calcolata: {percentuale}%, Attesa: {expected_percent}%")
-            
             stats_per_giro.append({
                 'route': route,
                 'destinazione': data['destinazione'],
@@ -1995,7 +2326,7 @@ def analyze_odata_data(records):
                 'da_checkare': data['pezzi_da_checkare'],
                 'pezzi_accessori': data.get('pezzi_accessori', 0),
                 'pezzi_crossdock': data.get('pezzi_crossdock', 0),
-                'clienti': int(clienti_unici),
+                'clienti': clienti_unici,
                 'percentuale': percentuale
             })
         
@@ -2009,19 +2340,18 @@ def analyze_odata_data(records):
             'accessori_details': accessori_details,
             'crossdock_details': crossdock_details,
             'clienti_per_giro': clienti_per_giro,
-            'product_search': product_search,
-            'product_descriptions': product_descriptions,
+            'product_index': product_index.build_snapshot_index(product_search, product_descriptions),
             'dates': dates,
             'statistics': {
                 'totali': {
-                    'totale_pezzi': int(totale_pezzi_globali),
-                    'pezzi_checkati': int(totale_pezzi_checkati),
-                    'pezzi_da_checkare': int(totale_pezzi_da_checkare),
-                    'pezzi_accessori': int(totale_pezzi_accessori),
-                    'pezzi_crossdock': int(totale_pezzi_crossdock),
-                    'totale_giri': int(totale_giri),
-                    'giri_completati': int(giri_completati),
-                    'giri_non_completati': int(giri_non_completati),
+                    'totale_pezzi': totale_pezzi_globali,
+                    'pezzi_checkati': totale_pezzi_checkati,
+                    'pezzi_da_checkare': totale_pezzi_da_checkare,
+                    'pezzi_accessori': totale_pezzi_accessori,
+                    'pezzi_crossdock': totale_pezzi_crossdock,
+                    'totale_giri': totale_giri,
+                    'giri_completati': giri_completati,
+                    'giri_non_completati': giri_non_completati,
                     'percentuale_completamento': round((totale_pezzi_checkati / totale_pezzi_globali * 100) if totale_pezzi_globali > 0 else 0, 2),
                     'percentuale_completamento_giri': percentuale_completamento_giri
                 },
@@ -2031,14 +2361,45 @@ def analyze_odata_data(records):
         }
     
     except Exception as e:
-        import traceback
-        print(f"Errore analisi OData: {traceback.format_exc()}")
+        extraction_log.exception("Errore analisi OData: %s", e)
         return {
             'success': False,
             'error': str(e)
         }
 
 
+def _snapshot_response(date_str, site, summary_only, message):
+    """Risposta con lo snapshot salvato (senza chiamare l'API), None se non esiste
+    
+    L'ETag deriva dalla versione dello snapshot: se il client ha già questa versione
+    (If-None-Match) si risponde 304 prima di caricare e deserializzare lo snapshot.
+    """
+    etag = None
+    if STORAGE_AVAILABLE:
+        version = storage.get_current_extraction_version(date_str, site, app.config['UPLOAD_FOLDER'])
+        if version is None:
+            return None
+        etag = _etag(version, 'estrai_e_analizza', summary_only, message)
+        not_modified = _not_modified(etag, date_str)
+        if not_modified is not None:
+            metrics.inc('extraction_source_total', 'Risposte di /api/estrai_e_analizza per sorgente dei dati',
+                        source='not_modified')
+            return not_modified
+    
+    with metrics.span('snapshot_load'):
+        json_data = get_json_extraction(date_str, site)
+    if not json_data:
+        return None
+    metrics.inc('extraction_source_total', 'Risposte di /api/estrai_e_analizza per sorgente dei dati', source='snapshot')
+    result = json_data.copy()
+    result['from_json'] = True
+    result['api_available'] = False
+    result['message'] = message
+    with metrics.span('serialize'):
+        response = jsonify(_summary_payload(result) if summary_only else result)
+    return _with_etag(response, etag, date_str)
+
+
 @app.route('/api/estrai_e_analizza', methods=['POST'])
 def estrai_e_analizza():
     """API endpoint per estrarre dati OData, analizzarli e restituirli
@@ -2047,11 +2408,14 @@ def estrai_e_analizza():
     - Oggi/Ieri: sempre chiamata API diretta e salva JSON
     - 2-7 giorni fa: chiamata API, se restituisce dati salva JSON
     - Oltre 7 giorni: solo JSON (non chiama API)
+    Con "summary": true nel body la risposta contiene solo statistiche e metadati.
     """
     try:
         data = request.get_json()
         date_str = data.get('date')
         site = data.get('site', 'TST - EDC Torino')
+        # summary: solo statistiche (la pagina risultati legge i dettagli dalle API paginate)
+        summary_only = bool(data.get('summary'))
         
         if not date_str:
             return jsonify({'error': 'Data non specificata'}), 400
@@ -2066,18 +2430,13 @@ def estrai_e_analizza():
         today = date.today()
         days_diff = (today - date_start).days
         
-        # Controlla se esiste un JSON salvato (cache)
-        json_data = get_json_extraction(date_str, site)
-        
         # LOGICA: Oltre 7 giorni → solo JSON (cache), non chiamare API
         if days_diff > 7:
-            app.logger.info(f"Data {date_str} è oltre 7 giorni (diff: {days_diff} giorni) → uso solo JSON cache")
-            if json_data:
-                result = json_data.copy()
-                result['from_json'] = True
-                result['api_available'] = False
-                result['message'] = 'Dati dal JSON salvato (data oltre 7 giorni, API non disponibile)'
-                return jsonify(result)
+            extraction_log.info("Data %s è oltre 7 giorni (diff: %s giorni) → uso solo JSON cache", date_str, days_diff)
+            response = _snapshot_response(date_str, site, summary_only,
+                                          'Dati dal JSON salvato (data oltre 7 giorni, API non disponibile)')
+            if response is not None:
+                return response
             else:
                 return jsonify({
                     'success': False,
@@ -2150,7 +2509,8 @@ def estrai_e_analizza():
                 auth = HTTPBasicAuth(auth_username, auth_password)
         
         # Fai la richiesta all'API
-        response = requests.get(full_url, headers=headers, auth=auth, timeout=30, allow_redirects=True)
+        with metrics.span('odata_dmx_fetch'):
+            response = requests.get(full_url, headers=headers, auth=auth, timeout=30, allow_redirects=True)
         
         api_has_data = False
         records = []
@@ -2158,7 +2518,8 @@ def estrai_e_analizza():
         if response.status_code == 200:
             # Parsa JSON solo se la risposta è OK
             try:
-                data_json = response.json()
+                with metrics.span('odata_dmx_parse'):
+                    data_json = response.json()
                 
                 # Estrai i valori
                 if 'value' in data_json:
@@ -2179,15 +2540,13 @@ def estrai_e_analizza():
         if not api_has_data:
             # Se è oggi o ieri, dobbiamo sempre avere dati dall'API
             if is_today_or_yesterday(date_str):
-                app.logger.warning(f"API non ha restituito dati per {date_str} (oggi/ieri) - questo non dovrebbe accadere")
+                extraction_log.warning("API non ha restituito dati per %s (oggi/ieri) - questo non dovrebbe accadere", date_str)
                 # Usa JSON se disponibile, altrimenti errore
-                if json_data:
-                    app.logger.info(f"Usando JSON salvato per {date_str} (oggi/ieri) come fallback")
-                    result = json_data.copy()
-                    result['from_json'] = True
-                    result['api_available'] = False
-                    result['message'] = 'Nessun dato dall\'API per oggi/ieri, uso JSON salvato'
-                    return jsonify(result)
+                response = _snapshot_response(date_str, site, summary_only,
+                                              'Nessun dato dall\'API per oggi/ieri, uso JSON salvato')
+                if response is not None:
+                    extraction_log.info("Usando JSON salvato per %s (oggi/ieri) come fallback", date_str)
+                    return response
                 else:
                     return jsonify({
                         'success': False,
@@ -2196,20 +2555,17 @@ def estrai_e_analizza():
                     }), 404
             else:
                 # Per 2-7 giorni fa, usa JSON se disponibile
-                if json_data:
-                    app.logger.info(f"API non ha restituito dati per {date_str}, uso JSON salvato")
-                    result = json_data.copy()
-                    result['from_json'] = True
-                    result['api_available'] = False
-                    result['message'] = 'Nessun dato dall\'API, uso JSON salvato'
-                    return jsonify(result)
+                response = _snapshot_response(date_str, site, summary_only, 'Nessun dato dall\'API, uso JSON salvato')
+                if response is not None:
+                    extraction_log.info("API non ha restituito dati per %s, uso JSON salvato", date_str)
+                    return response
                 else:
                     # Nessun dato dall'API e nessun JSON disponibile
                     if response.status_code != 200:
                         error_msg = f"Errore HTTP {response.status_code}"
                         if response.text:
                             error_msg += f": {response.text[:500]}"
-                        app.logger.warning(f"Errore API e nessun JSON disponibile per {date_str}: {error_msg}")
+                        extraction_log.warning("Errore API e nessun JSON disponibile per %s: %s", date_str, error_msg)
                         return jsonify({
                             'success': False,
                             'error': error_msg,
@@ -2217,7 +2573,7 @@ def estrai_e_analizza():
                             'message': 'Nessun dato disponibile dall\'API e nessuna estrazione precedente salvata per questa data.'
                         }), response.status_code
                     else:
-                        app.logger.info(f"API restituita vuota per {date_str}, nessun JSON disponibile")
+                        extraction_log.info("API restituita vuota per %s, nessun JSON disponibile", date_str)
                         return jsonify({
                             'success': False,
                             'error': 'Nessun dato disponibile per questa data',
@@ -2230,10 +2586,11 @@ def estrai_e_analizza():
         # Carica anche i dati dalla tabella Loadings per ottenere LoadingName
         loadings_dict = {}
         try:
+            with metrics.span('odata_loadings'):
                 loadings_url = f"{odata_base_url.rstrip('/')}/michelinpal/odata/Loadings"
-                app.logger.info(f"Caricamento Loadings da: {loadings_url}")
+                odata_log.debug("Caricamento Loadings da: %s", loadings_url)
                 loadings_response = requests.get(loadings_url, headers=headers, auth=auth, timeout=30, allow_redirects=True)
-                app.logger.info(f"Risposta Loadings: status={loadings_response.status_code}")
+                odata_log.debug("Risposta Loadings: status=%s", loadings_response.status_code)
                 if loadings_response.status_code == 200:
                     loadings_json = loadings_response.json()
                     loadings_records = loadings_json.get('value', []) if 'value' in loadings_json else (loadings_json if isinstance(loadings_json, list) else [])
@@ -2301,7 +2658,7 @@ def estrai_e_analizza():
                             if loading_id is not None and loading_name:
                                 loadings_dict[str(loading_id)] = str(loading_name).strip()
         except Exception as e:
-            app.logger.warning(f"Errore nel caricamento dei Loadings (continuerò senza): {str(e)}")
+            extraction_log.warning("Errore nel caricamento dei Loadings (continuerò senza): %s", str(e))
         
         # Aggiungi LoadingName ai record DMX usando LoadingId
         matched_count = 0
@@ -2321,7 +2678,8 @@ def estrai_e_analizza():
                     unmatched_count += 1
         
         # Analizza i dati (come analyze_excel)
-        analysis_result = analyze_odata_data(records)
+        with metrics.span('analyze'):
+            analysis_result = analyze_odata_data(records)
         
         if not analysis_result.get('success'):
             return jsonify(analysis_result), 500
@@ -2335,18 +2693,113 @@ def estrai_e_analizza():
         analysis_result['api_available'] = True
         
         # Salva SEMPRE in JSON per mantenere lo storico
-        saved_filename = save_json_extraction(date_str, site, analysis_result)
+        with metrics.span('snapshot_save'):
+            saved_filename = save_json_extraction(date_str, site, analysis_result)
         if saved_filename:
             analysis_result['saved_filename'] = saved_filename
         
-        return jsonify(analysis_result)
+        metrics.inc('extraction_source_total', 'Risposte di /api/estrai_e_analizza per sorgente dei dati', source='api')
+        with metrics.span('serialize'):
+            response = jsonify(_summary_payload(analysis_result) if summary_only else analysis_result)
+        return response
         
     except Exception as e:
-        import traceback
-        print(f"Errore estrazione e analisi: {traceback.format_exc()}")
+        extraction_log.exception("Errore estrazione e analisi: %s", e)
         return jsonify({'error': f'Errore durante l\'estrazione: {str(e)}'}), 500
 
 
+# Sezioni dello snapshot non incluse nella pagina risultati: arrivano dalle API paginate
+RISULTATI_DETAIL_KEYS = ('details', 'accessori_details', 'crossdock_details', 'clienti_per_giro',
+                         'product_index', 'product_search', 'product_descriptions')
+# Sezioni per giro esposte da /api/risultati/<data>/<sezione>
+RISULTATI_SECTIONS = {
+    'details': 'details',
+    'accessori': 'accessori_details',
+    'crossdock': 'crossdock_details',
+    'clienti': 'clienti_per_giro'
+}
+RISULTATI_MAX_PER_PAGE = 500
+
+
+def _summary_payload(data):
+    """Snapshot senza le sezioni di dettaglio (solo statistiche e metadati)"""
+    return {key: value for key, value in data.items() if key not in RISULTATI_DETAIL_KEYS}
+
+
+def _template_fingerprint(*names):
+    """Hash dei template di una pagina: l'ETag della pagina cambia anche ad ogni modifica dei template"""
+    digest = hashlib.sha1()
+    for name in names:
+        try:
+            with open(os.path.join(app.root_path, app.template_folder, name), 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+    return digest.hexdigest()[:12]
+
+
+RISULTATI_TEMPLATE_FINGERPRINT = _template_fingerprint('base.html', 'risultati.html')
+
+
+def _render_risultati(data, embed_sections=False):
+    """Pagina risultati con le sole statistiche (totali, per_giro, per_cc).
+    Con embed_sections le sezioni per giro e l'indice prodotti sono inclusi nella pagina: servono
+    quando lo snapshot non è stato salvato e /api/risultati/<data>/<sezione> e /api/product_search
+    non avrebbero dati da restituire."""
+    payload = _summary_payload(data)
+    if embed_sections:
+        payload.update({field: data.get(field) or {} for field in RISULTATI_SECTIONS.values()})
+        payload['product_index'] = data.get('product_index') or product_index.build_snapshot_index(
+            data.get('product_search') or {}, data.get('product_descriptions') or {})
+    return render_template('risultati.html', data=payload)
+
+
+def _etag(*parts):
+    """ETag forte derivato dalla versione dello snapshot e dai parametri della richiesta"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _cache_control(date_str=None):
+    """Cache-Control delle risposte con ETag: le estrazioni oltre 7 giorni non cambiano più"""
+    if date_str and not is_within_days(date_str, 7):
+        return 'private, max-age=3600'
+    # Il client conserva la risposta ma la rivalida ad ogni uso (If-None-Match)
+    return 'private, no-cache'
+
+
+def _not_modified(etag, date_str=None):
+    """Risposta 304 se il client ha già questa versione (If-None-Match), altrimenti None"""
+    # Confronto debole: le risposte compresse hanno l'ETag debole (W/"...")
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = _cache_control(date_str)
+        return response
+    return None
+
+
+def _with_etag(response, etag, date_str=None):
+    """Aggiunge ETag e Cache-Control"""
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = _cache_control(date_str)
+    return response
+
+
+def _paginate(items, page, per_page):
+    total = len(items)
+    total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+    page = max(1, min(page, total_pages))
+    start = (page - 1) * per_page
+    return {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'total_pages': total_pages,
+        'items': items[start:start + per_page]
+    }
+
+
 @app.route('/risultati/<date_str>')
 def risultati(date_str):
     """Pagina a tutto schermo per visualizzare i risultati analizzati per una data specifica
@@ -2362,30 +2815,41 @@ def risultati(date_str):
         
         if from_db:
             # Carica SOLO da MongoDB (più veloce, per pagina Salvataggio)
-            app.logger.info(f"=== Caricamento da MongoDB per data: {date_str} ===")
+            extraction_log.debug("=== Caricamento da MongoDB per data: %s ===", date_str)
             site = 'TST - EDC Torino'
             
+            # ETag dalla versione dello snapshot: 304 prima di caricarlo se la pagina non è cambiata
+            etag = None
+            if STORAGE_AVAILABLE:
+                version = storage.get_current_extraction_version(date_str, site, app.config['UPLOAD_FOLDER'])
+                if version is not None:
+                    # Anche il manifest dei file statici: l'HTML contiene gli URL con hash
+                    etag = _etag(version, 'risultati', RISULTATI_TEMPLATE_FINGERPRINT, static_assets.fingerprint())
+                    not_modified = _not_modified(etag, date_str)
+                    if not_modified is not None:
+                        return not_modified
+            
             if STORAGE_AVAILABLE:
                 json_data = storage.load_extraction(date_str, site, app.config['UPLOAD_FOLDER'])
                 if json_data:
-                    app.logger.info(f"✅ Dati caricati da MongoDB per {date_str}")
+                    extraction_log.info("Dati caricati da MongoDB per %s", date_str)
                     result = json_data.copy()
                     result['from_json'] = True
                     result['api_available'] = False
                     result['from_mongodb'] = True
                     result['message'] = 'Dati caricati da MongoDB (veloce)'
-                    return render_template('risultati.html', data=result)
+                    return _with_etag(make_response(_render_risultati(result)), etag, date_str)
             
             # Fallback: prova file system locale
             json_data = get_json_extraction(date_str, site)
             if json_data:
-                app.logger.info(f"✅ Dati caricati da file system locale per {date_str}")
+                extraction_log.info("Dati caricati da file system locale per %s", date_str)
                 result = json_data.copy()
                 result['from_json'] = True
                 result['api_available'] = False
                 result['from_mongodb'] = False
                 result['message'] = 'Dati caricati da file system locale'
-                return render_template('risultati.html', data=result)
+                return _with_etag(make_response(_render_risultati(result)), etag, date_str)
             
             # Nessun dato trovato
             error_data = {
@@ -2404,10 +2868,10 @@ def risultati(date_str):
                 'details': {}, 'accessori_details': {}, 'crossdock_details': {},
                 'clienti_per_giro': {}, 'product_search': {}, 'product_descriptions': {}
             }
-            return render_template('risultati.html', data=error_data)
+            return _render_risultati(error_data)
         
         # Comportamento normale: chiamata API diretta (dal calendario)
-        app.logger.info(f"=== INIZIO estrazione risultati per data: {date_str} (chiamata API diretta) ===")
+        extraction_log.debug("=== INIZIO estrazione risultati per data: %s (chiamata API diretta) ===", date_str)
         
         # Estrai e analizza i dati per la data specificata
         site = 'TST - EDC Torino'
@@ -2429,18 +2893,18 @@ def risultati(date_str):
         
         # LOGICA: Oggi o Ieri → sempre chiamata API diretta
         if is_today_or_yesterday(date_str):
-            app.logger.info(f"Data {date_str} è oggi o ieri (diff: {days_diff} giorni) → SEMPRE chiamata API diretta")
+            extraction_log.debug("Data %s è oggi o ieri (diff: %s giorni) → SEMPRE chiamata API diretta", date_str, days_diff)
             # Non usare cache, sempre API
         
         # LOGICA: Oltre 7 giorni → solo JSON (cache), non chiamare API
         elif days_diff > 7:
-            app.logger.info(f"Data {date_str} è oltre 7 giorni (diff: {days_diff} giorni) → uso solo JSON cache")
+            extraction_log.info("Data %s è oltre 7 giorni (diff: %s giorni) → uso solo JSON cache", date_str, days_diff)
             if json_data:
                 result = json_data.copy()
                 result['from_json'] = True
                 result['api_available'] = False
                 result['message'] = f'Dati dal JSON salvato (data oltre 7 giorni, API non disponibile)'
-                return render_template('risultati.html', data=result)
+                return _render_risultati(result)
             else:
                 error_data = {
                     'success': False,
@@ -2458,11 +2922,11 @@ def risultati(date_str):
                     'details': {}, 'accessori_details': {}, 'crossdock_details': {},
                     'clienti_per_giro': {}, 'product_search': {}, 'product_descriptions': {}
                 }
-                return render_template('risultati.html', data=error_data)
+                return _render_risultati(error_data)
         
         # LOGICA: 2-7 giorni fa → chiamata API con fallback a JSON
         else:
-            app.logger.info(f"Data {date_str} è tra 2-7 giorni fa (diff: {days_diff} giorni) → chiamata API con fallback a JSON")
+            extraction_log.debug("Data %s è tra 2-7 giorni fa (diff: %s giorni) → chiamata API con fallback a JSON", date_str, days_diff)
             # Continua con chiamata API, useremo JSON come fallback se API fallisce
         
         # Carica configurazione OData
@@ -2508,7 +2972,7 @@ def risultati(date_str):
         select_encoded = quote(detail_col)
         full_url = f"{odata_url}?$filter={filter_encoded}&$orderby={date_field}&$select={select_encoded}"
         
-        app.logger.info(f"URL OData: {full_url}")
+        odata_log.debug("URL OData: %s", full_url)
         
         # Headers per OData
         headers = {
@@ -2526,17 +2990,15 @@ def risultati(date_str):
             if auth_type == 'basic' and auth_username and auth_password:
                 from requests.auth import HTTPBasicAuth
                 auth = HTTPBasicAuth(auth_username, auth_password)
-                app.logger.info(f"Autenticazione configurata: username={auth_username}")
+                odata_log.debug("Autenticazione configurata: username=%s", auth_username)
         
         # Fai la richiesta DMX con timeout breve (5 secondi) per evitare timeout
         records = []
         try:
-            app.logger.info(f"Inizio richiesta OData per {date_str} (timeout 5s)")
-            app.logger.info(f"URL completo: {full_url}")
-            app.logger.info(f"Auth configurata: {auth is not None}")
+            odata_log.debug("Inizio richiesta OData per %s (timeout 5s, auth: %s)", date_str, auth is not None)
             
             response = requests.get(full_url, headers=headers, auth=auth, timeout=5, allow_redirects=True)
-            app.logger.info(f"Risposta OData ricevuta: status={response.status_code}, size={len(response.content) if response.content else 0} bytes")
+            odata_log.debug("Risposta OData ricevuta: status=%s, size=%s bytes", response.status_code, len(response.content) if response.content else 0)
             
             if response.status_code == 200:
                 data_json = response.json()
@@ -2546,15 +3008,15 @@ def risultati(date_str):
                     records = data_json
                 else:
                     records = [data_json]
-                app.logger.info(f"API ha restituito {len(records)} record per {date_str}")
+                odata_log.debug("API ha restituito %s record per %s", len(records), date_str)
         except requests.exceptions.Timeout:
-            app.logger.warning(f"Timeout OData per {date_str}, uso JSON salvato se disponibile")
+            extraction_log.warning("Timeout OData per %s, uso JSON salvato se disponibile", date_str)
             if json_data:
                 result = json_data.copy()
                 result['from_json'] = True
                 result['api_available'] = False
                 result['error'] = 'Timeout nella richiesta OData, dati dal JSON salvato'
-                return render_template('risultati.html', data=result)
+                return _render_risultati(result)
             else:
                 error_data = {
                     'success': False,
@@ -2583,15 +3045,15 @@ def risultati(date_str):
                     'product_search': {},
                     'product_descriptions': {}
                 }
-                return render_template('risultati.html', data=error_data)
+                return _render_risultati(error_data)
         except requests.exceptions.RequestException as e:
-            app.logger.error(f"Errore OData per {date_str}: {e}")
+            extraction_log.error("Errore OData per %s: %s", date_str, e)
             if json_data:
                 result = json_data.copy()
                 result['from_json'] = True
                 result['api_available'] = False
                 result['error'] = f'Errore OData: {str(e)}, dati dal JSON salvato'
-                return render_template('risultati.html', data=result)
+                return _render_risultati(result)
             else:
                 error_data = {
                     'success': False,
@@ -2620,17 +3082,17 @@ def risultati(date_str):
                     'product_search': {},
                     'product_descriptions': {}
                 }
-                return render_template('risultati.html', data=error_data)
+                return _render_risultati(error_data)
         
         # Se non ci sono record, usa JSON salvato se disponibile
         if not records or len(records) == 0:
-            app.logger.warning(f"Nessun record dall'API per {date_str}")
+            extraction_log.warning("Nessun record dall'API per %s", date_str)
             if json_data:
                 result = json_data.copy()
                 result['from_json'] = True
                 result['api_available'] = False
                 result['error'] = 'Nessun dato dall\'API per questa data, dati dal JSON salvato'
-                return render_template('risultati.html', data=result)
+                return _render_risultati(result)
             else:
                 error_data = {
                     'success': False,
@@ -2659,13 +3121,13 @@ def risultati(date_str):
                     'product_search': {},
                     'product_descriptions': {}
                 }
-                return render_template('risultati.html', data=error_data)
+                return _render_risultati(error_data)
         
         # Carica Loadings per LoadingName (con timeout breve)
         loadings_dict = {}
         try:
             loadings_url = f"{odata_base_url.rstrip('/')}/michelinpal/odata/Loadings"
-            app.logger.info(f"Caricamento Loadings (timeout 3s)")
+            extraction_log.debug("Caricamento Loadings (timeout 3s)")
             loadings_response = requests.get(loadings_url, headers=headers, auth=auth, timeout=3, allow_redirects=True)
             if loadings_response.status_code == 200:
                 loadings_json = loadings_response.json()
@@ -2699,7 +3161,7 @@ def risultati(date_str):
                         if loading_id is not None and loading_name:
                             loadings_dict[str(loading_id)] = str(loading_name).strip()
         except Exception as e:
-            app.logger.warning(f"Errore caricamento Loadings (continuerò senza): {str(e)}")
+            extraction_log.warning("Errore caricamento Loadings (continuerò senza): %s", str(e))
         
         # Aggiungi LoadingName ai record
         for record in records:
@@ -2708,17 +3170,17 @@ def risultati(date_str):
                 record['LoadingName'] = loadings_dict.get(loading_id, '')
         
         # Analizza i dati
-        app.logger.info(f"Analisi di {len(records)} record per {date_str}")
+        extraction_log.debug("Analisi di %s record per %s", len(records), date_str)
         analysis_result = analyze_odata_data(records)
         
         if not analysis_result.get('success'):
-            app.logger.error(f"Errore nell'analisi per {date_str}: {analysis_result.get('error')}")
+            extraction_log.error("Errore nell'analisi per %s: %s", date_str, analysis_result.get('error'))
             if json_data:
                 result = json_data.copy()
                 result['from_json'] = True
                 result['api_available'] = False
                 result['error'] = f"Errore nell'analisi, dati dal JSON salvato"
-                return render_template('risultati.html', data=result)
+                return _render_risultati(result)
             else:
                 error_data = {
                     'success': False,
@@ -2747,7 +3209,7 @@ def risultati(date_str):
                     'product_search': {},
                     'product_descriptions': {}
                 }
-                return render_template('risultati.html', data=error_data)
+                return _render_risultati(error_data)
         
         # Aggiungi informazioni e salva SEMPRE in JSON
         analysis_result['date'] = date_str
@@ -2760,23 +3222,21 @@ def risultati(date_str):
         
         # Salva SEMPRE in JSON per mantenere lo storico
         # Per oggi e ieri, questo aggiorna sempre il JSON con i dati più recenti
-        app.logger.info(f"Salvataggio JSON per {date_str} (diff giorni: {days_diff})")
+        extraction_log.debug("Salvataggio JSON per %s (diff giorni: %s)", date_str, days_diff)
         saved_filename = save_json_extraction(date_str, site, analysis_result)
         if saved_filename:
             analysis_result['saved_filename'] = saved_filename
             analysis_result['message'] = f'Dati aggiornati dall\'API e salvati in JSON (file: {saved_filename})'
-            app.logger.info(f"JSON salvato con successo: {saved_filename}")
+            extraction_log.debug("JSON salvato con successo: %s", saved_filename)
         else:
-            app.logger.error(f"ERRORE: Impossibile salvare JSON per {date_str}")
+            extraction_log.error("ERRORE: Impossibile salvare JSON per %s", date_str)
             analysis_result['message'] = 'Dati aggiornati dall\'API ma ERRORE nel salvataggio JSON'
         
-        app.logger.info(f"Rendering template risultati per {date_str}")
-        return render_template('risultati.html', data=analysis_result)
+        extraction_log.debug("Rendering template risultati per %s", date_str)
+        return _render_risultati(analysis_result, embed_sections=not saved_filename)
         
     except requests.exceptions.Timeout as e:
-        import traceback
-        app.logger.error(f"TIMEOUT OData per {date_str}: {e}")
-        app.logger.error(f"Traceback: {traceback.format_exc()}")
+        extraction_log.error("TIMEOUT OData per %s: %s", date_str, e)
         
         # Timeout nella richiesta OData - mostra messaggio chiaro
         error_data = {
@@ -2796,22 +3256,20 @@ def risultati(date_str):
             'details': {}, 'accessori_details': {}, 'crossdock_details': {},
             'clienti_per_giro': {}, 'product_search': {}, 'product_descriptions': {}
         }
-        return render_template('risultati.html', data=error_data)
+        return _render_risultati(error_data)
         
     except requests.exceptions.RequestException as e:
-        import traceback
-        app.logger.error(f"ERRORE richiesta OData per {date_str}: {e}")
-        app.logger.error(f"Traceback: {traceback.format_exc()}")
+        extraction_log.exception("ERRORE richiesta OData per %s: %s", date_str, e)
         
         # Prova a usare JSON salvato (cache) come fallback
         json_data = get_json_extraction(date_str, site)
         if json_data:
-            app.logger.info(f"Errore OData per {date_str}, uso JSON cache salvato")
+            extraction_log.info("Errore OData per %s, uso JSON cache salvato", date_str)
             result = json_data.copy()
             result['from_json'] = True
             result['api_available'] = False
             result['error'] = f'Errore di connessione OData: {str(e)}, dati dal JSON cache salvato'
-            return render_template('risultati.html', data=result)
+            return _render_risultati(result)
         
         # Nessun JSON disponibile
         error_data = {
@@ -2830,23 +3288,21 @@ def risultati(date_str):
             'details': {}, 'accessori_details': {}, 'crossdock_details': {},
             'clienti_per_giro': {}, 'product_search': {}, 'product_descriptions': {}
         }
-        return render_template('risultati.html', data=error_data)
+        return _render_risultati(error_data)
         
     except Exception as e:
-        import traceback
-        app.logger.error(f"ERRORE GENERALE estrazione risultati per {date_str}: {e}")
-        app.logger.error(f"Traceback completo: {traceback.format_exc()}")
+        extraction_log.exception("ERRORE GENERALE estrazione risultati per %s: %s", date_str, e)
         
         # Prova a usare JSON salvato come ultimo tentativo
         try:
             json_data = get_json_extraction(date_str, 'TST - EDC Torino')
             if json_data:
-                app.logger.info(f"Usando JSON salvato dopo errore generale per {date_str}")
+                extraction_log.info("Usando JSON salvato dopo errore generale per %s", date_str)
                 result = json_data.copy()
                 result['from_json'] = True
                 result['api_available'] = False
                 result['error'] = f'Errore durante l\'estrazione: {str(e)}, dati dal JSON salvato'
-                return render_template('risultati.html', data=result)
+                return _render_risultati(result)
         except:
             pass
         
@@ -2867,7 +3323,114 @@ def risultati(date_str):
             'details': {}, 'accessori_details': {}, 'crossdock_details': {},
             'clienti_per_giro': {}, 'product_search': {}, 'product_descriptions': {}
         }
-        return render_template('risultati.html', data=error_data)
+        return _render_risultati(error_data)
+
+
+@app.route('/api/risultati/<date_str>/<section>')
+def risultati_section(date_str, section):
+    """Righe di un giro per la pagina risultati (details, accessori, crossdock, clienti), a pagine
+    
+    Parametri: route (obbligatorio), site, page, per_page. Legge solo la sezione del giro
+    dallo snapshot salvato; risponde 304 se lo snapshot non è cambiato (If-None-Match).
+    """
+    field = RISULTATI_SECTIONS.get(section)
+    if field is None:
+        return jsonify({'error': f'Sezione non valida: {section}'}), 404
+    route = request.args.get('route', '')
+    if not route:
+        return jsonify({'error': 'Giro non specificato'}), 400
+    site = request.args.get('site', 'TST - EDC Torino')
+    page = request.args.get('page', 1, type=int)
+    per_page = max(1, min(request.args.get('per_page', 100, type=int), RISULTATI_MAX_PER_PAGE))
+    uploads_dir = app.config['UPLOAD_FOLDER']
+    
+    etag = None
+    if STORAGE_AVAILABLE:
+        version = storage.get_current_extraction_version(date_str, site, uploads_dir)
+        if version is None:
+            return jsonify({'error': f'Nessun dato salvato per la data {date_str}'}), 404
+        etag = _etag(version, section, route, page, per_page)
+        not_modified = _not_modified(etag, date_str)
+        if not_modified is not None:
+            return not_modified
+        items = storage.load_extraction_route(date_str, site, route, field, uploads_dir, version)
+    else:
+        json_data = get_json_extraction(date_str, site)
+        items = (json_data.get(field) or {}).get(route, []) if json_data else None
+    
+    if items is None:
+        return jsonify({'error': f'Nessun dato salvato per la data {date_str}'}), 404
+    
+    result = _paginate(items, page, per_page)
+    result.update({'date': date_str, 'route': route, 'section': section})
+    return _with_etag(jsonify(result), etag, date_str)
+
+
+# Campi dello snapshot con l'indice prodotti (product_search/product_descriptions: snapshot precedenti)
+PRODUCT_INDEX_FIELDS = ['product_index', 'product_search', 'product_descriptions']
+
+
+def _load_product_index(date_str, site, version):
+    """Indice prodotti dello snapshot (in memoria per versione; dallo storage solo i campi dell'indice)"""
+    key = (date_str, site, version)
+    index = product_index.recall(key) if version is not None else None
+    if index is not None:
+        return index
+    
+    if STORAGE_AVAILABLE:
+        fields = storage.load_extraction_fields(date_str, site, PRODUCT_INDEX_FIELDS, app.config['UPLOAD_FOLDER'], version)
+    else:
+        fields = get_json_extraction(date_str, site)
+    if fields is None:
+        return None
+    
+    index = product_index.ProductIndex.from_snapshot(fields)
+    if version is not None:
+        product_index.remember(key, index)
+    return index
+
+
+@app.route('/api/product_search')
+def product_search_api():
+    """Ricerca dei pezzi da checkare per codice prodotto trasformato o descrizione in una data
+    
+    Parametri: date, q, site, match (substring/prefix), limit. Restituisce solo i giri trovati:
+    prima i codici che iniziano con q, poi quelli che la contengono, poi le descrizioni.
+    """
+    date_str = request.args.get('date', '')
+    query = request.args.get('q', '').strip().upper()
+    site = request.args.get('site', 'TST - EDC Torino')
+    mode = request.args.get('match', product_index.SUBSTRING)
+    limit = max(1, min(request.args.get('limit', 100, type=int), RISULTATI_MAX_PER_PAGE))
+    if not date_str:
+        return jsonify({'error': 'Data non specificata'}), 400
+    if mode not in (product_index.SUBSTRING, product_index.PREFIX):
+        return jsonify({'error': f'Tipo di ricerca non valido: {mode}'}), 400
+    
+    version = None
+    etag = None
+    if STORAGE_AVAILABLE:
+        version = storage.get_current_extraction_version(date_str, site, app.config['UPLOAD_FOLDER'])
+        if version is None:
+            return jsonify({'error': f'Nessun dato salvato per la data {date_str}'}), 404
+        etag = _etag(version, 'product_search', query, mode, limit)
+        not_modified = _not_modified(etag, date_str)
+        if not_modified is not None:
+            return not_modified
+    
+    index = _load_product_index(date_str, site, version)
+    if index is None:
+        return jsonify({'error': f'Nessun dato salvato per la data {date_str}'}), 404
+    
+    items, total = index.hits(index.search(query, mode), limit)
+    return _with_etag(jsonify({
+        'date': date_str,
+        'q': query,
+        'match': mode,
+        'total': total,
+        'truncated': total > len(items),
+        'items': items
+    }), etag, date_str)
 
 
 @app.route('/api/test_mongodb')
@@ -2908,6 +3471,8 @@ def test_mongodb():
         # Prova a connettersi a MongoDB
         try:
             client, db = storage.get_mongo_client()
+            breaker_state = storage.get_mongo_breaker_state()
+            debug_info['circuit_breaker'] = breaker_state
             
             if client is not None and db is not None:
                 # Test di scrittura
@@ -2947,6 +3512,10 @@ def test_mongodb():
                     error_details.append('MONGODB_URI non configurato')
                 elif debug_info.get('use_mongodb_flag') is False:
                     error_details.append('USE_MONGODB è False (verifica pymongo e MONGODB_URI)')
+                if breaker_state.get('state') != 'closed':
+                    error_details.append(f"Circuit breaker {breaker_state.get('state')}: nuovo tentativo tra {breaker_state.get('retry_in_seconds')}s")
+                if breaker_state.get('last_error'):
+                    error_details.append(f"Ultimo errore: {breaker_state.get('last_error')}")
                 
                 return jsonify({
                     'success': False,
@@ -2959,10 +3528,9 @@ def test_mongodb():
         except Exception as conn_error:
             import traceback
             error_traceback = traceback.format_exc()
-            # Log anche su console per debug
-            app.logger.error(f"MongoDB connection error: {str(conn_error)}")
-            app.logger.error(f"Traceback: {error_traceback}")
+            log.exception("MongoDB connection error: %s", conn_error)
             
+            debug_info['circuit_breaker'] = storage.get_mongo_breaker_state()
             return jsonify({
                 'success': False,
                 'message': f'❌ Errore durante connessione MongoDB: {str(conn_error)}',
@@ -2986,106 +3554,62 @@ def test_mongodb():
         }), 500
 
 
-@app.route('/static/<path:filename>')
+def _send_asset(asset, versioned):
+    """Invia un file statico (variante precompressa se accettata) con richieste condizionali"""
+    encoding = response_compression.pick_encoding(asset.variants, request.accept_encodings)
+    path, size = asset.variants[encoding] if encoding is not None else (asset.path, asset.size)
+    # ETag dal contenuto: uguale su tutte le istanze, a differenza di mtime
+    response = send_file(path, mimetype=asset.mimetype, conditional=True,
+                         etag=f"{asset.digest}-{encoding}" if encoding is not None else asset.digest)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    if asset.variants:
+        response.vary.add('Accept-Encoding')
+    # immutable solo sugli URL con hash: gli altri vengono rivalidati (304 se invariati)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable' if versioned else 'public, no-cache'
+    if response.status_code == 200:
+        response_compression.record_static('/static', encoding, asset.size, size)
+    return response
+
+
 def serve_static(filename):
-    """Serve i file statici (logo, icone, manifest, ecc.)"""
-    try:
-        # Su Vercel, il percorso potrebbe essere diverso
-        import os
-        static_path = os.path.join(app.static_folder, filename)
-        app.logger.info(f"Richiesta file statico: {filename}")
-        app.logger.info(f"static_folder: {app.static_folder}")
-        app.logger.info(f"static_path completo: {static_path}")
-        app.logger.info(f"File esiste: {os.path.exists(static_path)}")
-        
-        # Determina il content-type in base all'estensione
-        content_type = 'application/octet-stream'
-        if filename.endswith('.png'):
-            content_type = 'image/png'
-        elif filename.endswith('.jpg') or filename.endswith('.jpeg'):
-            content_type = 'image/jpeg'
-        elif filename.endswith('.webp'):
-            content_type = 'image/webp'
-        elif filename.endswith('.json'):
-            content_type = 'application/json'
-        elif filename.endswith('.js'):
-            content_type = 'application/javascript'
-        elif filename.endswith('.css'):
-            content_type = 'text/css'
-        
-        # Prova prima con send_static_file (metodo standard Flask)
-        try:
-            response = app.send_static_file(filename)
-            response.headers['Content-Type'] = content_type
-            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
-            app.logger.info(f"File servito con send_static_file: {filename}")
-            return response
-        except Exception as e1:
-            app.logger.warning(f"send_static_file fallito: {e1}, provo con percorso diretto")
-            # Fallback: leggi il file direttamente
-            if os.path.exists(static_path):
-                with open(static_path, 'rb') as f:
-                    file_data = f.read()
-                from flask import Response
-                response = Response(file_data, mimetype=content_type)
-                response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
-                app.logger.info(f"File servito con percorso diretto: {filename}")
-                return response
-            else:
-                raise FileNotFoundError(f"File non trovato: {static_path}")
-    except Exception as e:
-        app.logger.error(f"Errore servizio file statico {filename}: {e}")
-        import traceback
-        app.logger.error(traceback.format_exc())
-        # Restituisci 404 con dettagli per debug
-        return jsonify({
-            'error': f'File non trovato: {filename}',
-            'static_folder': app.static_folder,
-            'filename': filename,
-            'traceback': traceback.format_exc()
-        }), 404
+    """Serve i file statici (logo, icone, manifest, service worker) dal manifest in memoria"""
+    resolved = static_assets.resolve(filename)
+    if resolved is None:
+        return jsonify({'error': f'File non trovato: {filename}'}), 404
+    return _send_asset(*resolved)
+
+
+# Sostituisce l'handler statico di Flask: /static/<path> e url_for('static', ...) passano da serve_static
+app.view_functions['static'] = serve_static
+
 
 @app.route('/favicon.ico')
 def favicon():
-    """Serve il favicon"""
-    try:
-        # Prova a servire icon-192.png
-        try:
-            response = app.send_static_file('icon-192.png')
-            response.headers['Content-Type'] = 'image/png'
-            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
-            return response
-        except:
-            # Se non trova icon-192.png, prova logo.png
-            try:
-                response = app.send_static_file('logo.png')
-                response.headers['Content-Type'] = 'image/png'
-                response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
-                return response
-            except:
-                # Se non trova nessun file, restituisci 204 No Content (standard per favicon mancante)
-                return '', 204
-    except Exception as e:
-        # In caso di errore imprevisto, restituisci sempre 204 invece di 500
-        app.logger.warning(f"Favicon non disponibile: {e}")
-        return '', 204  # No content se non trovato
+    """Serve il favicon (icon-192.png, altrimenti logo.png)"""
+    resolved = static_assets.resolve('icon-192.png') or static_assets.resolve('logo.png')
+    if resolved is None:
+        # Nessun file: 204 No Content (standard per favicon mancante)
+        return '', 204
+    return _send_asset(resolved[0], False)
+
 
 @app.route('/manifest.json')
 def manifest():
     """Serve il manifest.json"""
-    try:
-        response = app.send_static_file('manifest.json')
-        response.headers['Content-Type'] = 'application/json'
-        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
-        return response
-    except Exception as e:
-        app.logger.error(f"Errore servizio manifest: {e}")
+    resolved = static_assets.resolve('manifest.json')
+    if resolved is None:
         return '', 404
+    return _send_asset(resolved[0], False)
 
-@app.route('/static/sw.js')
+
+@app.route('/sw.js')
 def service_worker():
-    """Serve il service worker con il content-type corretto"""
-    return app.send_static_file('sw.js'), 200, {'Content-Type': 'application/javascript'}
+    """Serve il service worker dalla radice: il suo scope copre tutte le pagine e le API"""
+    resolved = static_assets.resolve('sw.js')
+    if resolved is None:
+        return '', 404
+    return _send_asset(resolved[0], False)
 
 
 # Handler per Vercel serverless
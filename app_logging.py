@@ -0,0 +1,130 @@
+"""
+Logging strutturato per sottosistema (easy.storage, easy.s3, easy.odata, easy.upload, ...).
+I messaggi usano la formattazione differita del modulo logging (log.info("... %s", valore)):
+sotto il livello configurato non costano nulla oltre al confronto del livello.
+In produzione (Vercel o FLASK_ENV=production) il default è WARNING, più una riga di riepilogo
+per richiesta (easy.request); in locale INFO. Su Vercel le righe sono in JSON, una per evento.
+"""
+import os
+import sys
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+ROOT_LOGGER = 'easy'
+# Per log.isEnabledFor(app_logging.DEBUG) prima di preparare argomenti costosi
+DEBUG = logging.DEBUG
+
+_PRODUCTION = bool(os.environ.get('VERCEL') or os.environ.get('VERCEL_ENV')) or os.environ.get('FLASK_ENV') == 'production'
+
+# Livello di default di tutti i sottosistemi
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING' if _PRODUCTION else 'INFO').upper()
+# Livelli per sottosistema, es. "odata=DEBUG,storage=INFO"
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+# Formato delle righe: 'json' oppure 'text'
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json' if _PRODUCTION else 'text').lower()
+# '0' disattiva la riga di riepilogo per richiesta
+LOG_REQUESTS = os.environ.get('LOG_REQUESTS', '1') != '0'
+# Eventi frequenti (chunk, file statici): uno ogni N viene registrato
+LOG_SAMPLE_EVERY = max(int(os.environ.get('LOG_SAMPLE_EVERY', '50')), 1)
+
+_configured = False
+_configure_lock = threading.Lock()
+_sample_counts: Dict[str, int] = {}
+_sample_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Una riga JSON per evento: ts, level, logger, msg e i campi passati con fields()"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        extra_fields = getattr(record, 'fields', None)
+        if extra_fields:
+            entry.update(extra_fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato leggibile per lo sviluppo locale, con i campi in coda (chiave=valore)"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra_fields = getattr(record, 'fields', None)
+        if extra_fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in extra_fields.items())
+        return line
+
+
+def configure() -> None:
+    """Configura una sola volta il logger radice 'easy' (handler, formato, livelli)"""
+    global _configured
+    if _configured:
+        return
+    with _configure_lock:
+        if _configured:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        # Le righe non passano anche dal logger root (niente duplicati con altri handler)
+        root.propagate = False
+
+        for item in LOG_LEVELS.split(','):
+            subsystem, _, level = item.partition('=')
+            if subsystem.strip() and level.strip():
+                logging.getLogger(f"{ROOT_LOGGER}.{subsystem.strip()}").setLevel(level.strip().upper())
+        if LOG_REQUESTS and not logging.getLogger(f"{ROOT_LOGGER}.request").level:
+            # Il riepilogo per richiesta resta attivo anche con il default WARNING
+            logging.getLogger(f"{ROOT_LOGGER}.request").setLevel(logging.INFO)
+        _configured = True
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    """Logger di un sottosistema (easy.<subsystem>)"""
+    configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+
+
+def fields(**values: Any) -> Dict[str, Dict[str, Any]]:
+    """Campi strutturati da passare come extra: log.info("...", extra=fields(route=..., ms=...))"""
+    return {'fields': values}
+
+
+def sampled(key: str, every: Optional[int] = None) -> bool:
+    """True per il primo evento di una chiave e poi uno ogni `every` (default LOG_SAMPLE_EVERY)"""
+    every = every or LOG_SAMPLE_EVERY
+    with _sample_lock:
+        count = _sample_counts.get(key, 0)
+        _sample_counts[key] = count + 1
+    return count % every == 0
+
+
+_request_log = get_logger('request')
+
+
+def log_request(method: str, route: str, path: str, status: int, duration_ms: float,
+                size: Optional[int] = None, encoding: Optional[str] = None) -> None:
+    """Riga di riepilogo di una richiesta (le richieste di file statici riuscite sono campionate)"""
+    if not LOG_REQUESTS or not _request_log.isEnabledFor(logging.INFO):
+        return
+    if status < 400 and route in ('/static/<path:filename>', '/favicon.ico') and not sampled('request_static'):
+        return
+    _request_log.info("%s %s %s %.1fms", method, path, status, duration_ms, extra=fields(
+        method=method, route=route, path=path, status=status, duration_ms=round(duration_ms, 1),
+        bytes=size, encoding=encoding
+    ))
@@ -0,0 +1,101 @@
+"""
+Benchmark del cold start: per ogni route avvia un interprete nuovo, importa l'handler
+Vercel (api/index.py) e misura import e time-to-first-byte della prima richiesta.
+Riporta anche quali moduli pesanti risultano caricati dopo la richiesta.
+
+Uso:
+    python benchmarks/cold_start.py [--runs 3] [--route /favicon.ico ...] [--output risultati.json]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ROUTES = [
+    '/static/logo.png',
+    '/favicon.ico',
+    '/manifest.json',
+    '/',
+    '/estrazioni',
+    '/api/list_extractions',
+]
+
+HEAVY_MODULES = ['pandas', 'numpy', 'requests', 'pymongo', 'boto3']
+
+# Eseguito in un processo nuovo per ogni misura (cold start reale)
+_PROBE = r'''
+import sys, time, json
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+import importlib.util
+spec = importlib.util.spec_from_file_location('vercel_index', {index!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+t_import = time.perf_counter()
+client = module.app.test_client()
+response = client.get({route!r}, buffered=False)
+first_chunk = next(iter(response.response), b'')
+t_first_byte = time.perf_counter()
+response.close()
+print(json.dumps({{
+    'import_ms': (t_import - t0) * 1000,
+    'ttfb_ms': (t_first_byte - t0) * 1000,
+    'request_ms': (t_first_byte - t_import) * 1000,
+    'status': response.status_code,
+    'loaded_modules': [m for m in {heavy!r} if m in sys.modules],
+}}))
+'''
+
+
+def measure(route, runs):
+    """Misura una route con `runs` cold start indipendenti"""
+    samples = []
+    for _ in range(runs):
+        code = _PROBE.format(
+            root=ROOT_DIR,
+            index=os.path.join(ROOT_DIR, 'api', 'index.py'),
+            route=route,
+            heavy=HEAVY_MODULES
+        )
+        proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT_DIR)
+        last_line = proc.stdout.strip().splitlines()[-1] if proc.stdout.strip() else ''
+        if proc.returncode != 0 or not last_line.startswith('{'):
+            return {'route': route, 'error': (proc.stderr or proc.stdout).strip()[-500:]}
+        samples.append(json.loads(last_line))
+
+    return {
+        'route': route,
+        'runs': runs,
+        'status': samples[-1]['status'],
+        'import_ms_median': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'ttfb_ms_median': round(statistics.median(s['ttfb_ms'] for s in samples), 1),
+        'ttfb_ms_max': round(max(s['ttfb_ms'] for s in samples), 1),
+        'request_ms_median': round(statistics.median(s['request_ms'] for s in samples), 1),
+        'loaded_modules': samples[-1]['loaded_modules'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cold start per route')
+    parser.add_argument('--runs', type=int, default=3, help='cold start per route')
+    parser.add_argument('--route', action='append', help='route da misurare (ripetibile)')
+    parser.add_argument('--output', help='file JSON dei risultati (default: stdout)')
+    args = parser.parse_args()
+
+    results = {
+        'python': sys.version.split()[0],
+        'routes': [measure(route, args.runs) for route in (args.route or DEFAULT_ROUTES)]
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+Benchmark riproducibile delle fasi di elaborazione dati, su dati sintetici con seme fisso
+(benchmarks/generators.py):
+- analyze_odata_data su record DMX uniti alla tabella Loadings
+- load_anagrafica (CSV -> storage -> cache del worker)
+- process_csv_file (trasformazione del CSV in YDMXEL con l'anagrafica caricata)
+- save_chunk + merge_chunks (upload a chunk, solo con MongoDB)
+- save_extraction / load_extraction (snapshot dell'analisi: lettura a freddo e dalla cache)
+
+Lo storage è scelto con --mongo:
+    mongomock   MongoDB in memoria (pip install mongomock, richiede anche pymongo per bson)
+    mongod      istanza locale o di test (--mongo-uri), su un database temporaneo eliminato alla fine
+    files       solo file system locale (merge_chunks non viene misurato)
+Con mongomock/mongod l'esecuzione fallisce se un'operazione ricade sul file system (storage_fallbacks > 0)
+o se lo snapshot non è salvato in MongoDB: le misure non sarebbero del backend richiesto.
+Tutto gira in una cartella temporanea: anagrafica.json, uploads/ e snapshot non toccano il progetto.
+
+Il risultato è JSON (con il commit corrente): con --baseline si confronta con un'esecuzione
+precedente e per ogni caso si riporta il rapporto delle mediane (> 1 = più lento).
+
+Uso:
+    python benchmarks/data_pipeline.py [--mongo mongomock] [--records 20000] [--routes 60] \\
+        [--anagrafica 50000] [--csv-rows 100000] [--seed 42] [--runs 5] [--baseline prima.json] [--output dopo.json]
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import generators  # noqa: E402
+import metrics  # noqa: E402
+
+MB = 1024 * 1024
+SITE = 'TST - EDC Torino'
+# Data storica: dopo la prima lettura lo snapshot è servito dalla cache senza verifiche di versione
+SNAPSHOT_DATE = '2024-01-15'
+
+
+def _timed(func, runs, setup=None):
+    """Statistiche (millisecondi) di `runs` esecuzioni e risultato dell'ultima.
+    `setup` viene eseguito prima di ogni misura, fuori dal tempo misurato."""
+    samples = []
+    result = None
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 2),
+        'min_ms': round(min(samples), 2),
+        'max_ms': round(max(samples), 2)
+    }, result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_storage(mode, uri):
+    """Prepara lo storage prima dell'import di app.py. Restituisce (modulo storage, nome database)"""
+    db_name = f"easy_bench_{uuid.uuid4().hex[:8]}"
+    if mode == 'mongod':
+        os.environ['MONGODB_URI'] = uri
+        os.environ['MONGODB_DB_NAME'] = db_name
+    else:
+        os.environ.pop('MONGODB_URI', None)
+
+    import storage
+
+    if mode == 'mongomock':
+        import mongomock
+        if not storage._import_pymongo():
+            raise SystemExit('mongomock richiede pymongo installato (bson, CodecOptions)')
+        storage.USE_MONGODB = True
+        storage.MONGODB_DB_NAME = db_name
+        storage._mongo_client = mongomock.MongoClient()
+        storage._mongo_db = storage._mongo_client[db_name]
+    elif mode == 'mongod' and storage.get_mongo_client()[1] is None:
+        raise SystemExit(f"MongoDB non raggiungibile su {uri}")
+    return storage, db_name
+
+
+def _fallbacks():
+    """Operazioni MongoDB ricadute sul file system durante le misure (counter di /metrics)"""
+    total = 0
+    for line in metrics.render().splitlines():
+        if line.startswith(metrics.PREFIX + 'storage_fallbacks_total{'):
+            total += float(line.rsplit(' ', 1)[1])
+    return int(total)
+
+
+def compare(results, baseline):
+    """Rapporto delle mediane rispetto a un'esecuzione precedente (casi presenti in entrambe)"""
+    ratios = {}
+    for name, case in results['cases'].items():
+        previous = baseline.get('cases', {}).get(name)
+        if previous and previous.get('median_ms') and case.get('median_ms') is not None:
+            ratios[name] = round(case['median_ms'] / previous['median_ms'], 3)
+    return {'commit': baseline.get('commit'), 'ratio': ratios}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fasi di elaborazione (analisi, anagrafica, CSV, chunk, snapshot)')
+    parser.add_argument('--mongo', choices=['mongomock', 'mongod', 'files'], default='mongomock',
+                        help='backend dello storage')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017', help='URI con --mongo mongod')
+    parser.add_argument('--records', type=int, default=20000, help='record DMX da analizzare')
+    parser.add_argument('--routes', type=int, default=60, help='giri')
+    parser.add_argument('--anagrafica', type=int, default=50000, help='articoli in anagrafica')
+    parser.add_argument('--csv-rows', type=int, default=100000, help='righe del CSV da trasformare')
+    parser.add_argument('--chunk-kb', type=int, default=1536, help='dimensione dei chunk di upload (come index.html)')
+    parser.add_argument('--seed', type=int, default=42, help='seme del generatore')
+    parser.add_argument('--runs', type=int, default=5, help='ripetizioni per misura')
+    parser.add_argument('--baseline', help='risultati JSON di un\'esecuzione precedente da confrontare')
+    parser.add_argument('--output', help='file JSON dei risultati (default: stdout)')
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    # app.py e storage usano percorsi relativi (anagrafica.json, uploads/): cartella temporanea
+    workdir = tempfile.mkdtemp(prefix='easy_bench_')
+    os.chdir(workdir)
+    # Solo errori durante le misure (con --mongo files ogni accesso allo storage avviserebbe)
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    os.environ.setdefault('LOG_REQUESTS', '0')
+    # Scritture di backup inline: il tempo misurato comprende tutto il lavoro
+    os.environ.setdefault('STORAGE_BACKGROUND_WORKERS', '0')
+
+    storage, db_name = configure_storage(args.mongo, args.mongo_uri)
+    import app as app_module
+
+    results = {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'storage': args.mongo,
+        'params': {
+            'records': args.records, 'routes': args.routes, 'anagrafica': args.anagrafica,
+            'csv_rows': args.csv_rows, 'chunk_kb': args.chunk_kb, 'seed': args.seed, 'runs': args.runs
+        },
+        'cases': {}
+    }
+
+    try:
+        # Dati generati una volta sola, fuori dalle misure
+        records = generators.attach_loading_names(
+            generators.generate_dmx_records(args.records, args.routes, args.seed, date_str=SNAPSHOT_DATE),
+            generators.generate_loadings(args.routes, args.seed)
+        )
+        anagrafica_csv = generators.generate_anagrafica_csv(args.anagrafica, args.seed)
+        ydmxel_csv = generators.generate_ydmxel_csv(args.csv_rows, args.anagrafica, args.seed)
+
+        stats, analysis = _timed(lambda: app_module.analyze_odata_data(records), args.runs)
+        if not analysis.get('success'):
+            raise SystemExit(f"analyze_odata_data non riuscita: {analysis.get('error')}")
+        results['cases']['analyze_odata_data'] = {**stats, 'routes': len(analysis['analysis'])}
+
+        stats, loaded = _timed(lambda: app_module.load_anagrafica(io.BytesIO(anagrafica_csv)), args.runs)
+        results['cases']['load_anagrafica'] = {
+            **stats, 'size_mb': round(len(anagrafica_csv) / MB, 2), 'items': loaded[0]
+        }
+
+        stats, processed = _timed(lambda: app_module.process_csv_file(file_bytes=ydmxel_csv), args.runs)
+        rows_processed, rows_transformed, missing_codes, _ = processed
+        results['cases']['process_csv_file'] = {
+            **stats, 'size_mb': round(len(ydmxel_csv) / MB, 2), 'rows': rows_processed,
+            'transformed': rows_transformed, 'missing_codes': len(missing_codes)
+        }
+
+        if args.mongo != 'files':
+            chunks = generators.split_chunks(ydmxel_csv, args.chunk_kb * 1024)
+            file_ids = []
+
+            def upload_and_merge():
+                file_id = f"bench_{uuid.uuid4().hex}"
+                for index, chunk in enumerate(chunks):
+                    if not storage.save_chunk(file_id, index, chunk):
+                        raise SystemExit('save_chunk non riuscito')
+                file_ids.append(file_id)
+                return storage.merge_chunks(file_id, 'ydmxel_input.csv')
+
+            stats, merged = _timed(upload_and_merge, args.runs)
+            if merged is None:
+                raise SystemExit('merge_chunks non riuscito')
+            results['cases']['chunk_upload_merge'] = {**stats, 'chunks': len(chunks)}
+            # I file ricomposti non servono oltre la misura
+            storage.get_mongo_client()[1]['csv_transforms'].delete_many({'file_id': {'$in': file_ids}})
+
+        uploads_dir = app_module.app.config['UPLOAD_FOLDER']
+        stats, filename = _timed(lambda: storage.save_extraction(SNAPSHOT_DATE, SITE, analysis, uploads_dir), args.runs)
+        # La versione dice se lo snapshot è in MongoDB o è ricaduto sul file system
+        version = storage.get_extraction_version(SNAPSHOT_DATE, SITE, uploads_dir) or ''
+        results['cases']['snapshot_save'] = {
+            **stats, 'saved': filename is not None, 'backend': version.split(':', 1)[0] or None
+        }
+
+        key = (SNAPSHOT_DATE, SITE)
+        stats, snapshot = _timed(lambda: storage.load_extraction(SNAPSHOT_DATE, SITE, uploads_dir), args.runs,
+                                 setup=lambda: storage.extraction_cache.invalidate(key))
+        results['cases']['snapshot_load_cold'] = {**stats, 'loaded': snapshot is not None}
+        stats, snapshot = _timed(lambda: storage.load_extraction(SNAPSHOT_DATE, SITE, uploads_dir), args.runs)
+        results['cases']['snapshot_load_cached'] = {**stats, 'loaded': snapshot is not None}
+        results['storage_fallbacks'] = _fallbacks()
+        # Con MongoDB (mongomock/mongod) un fallback silenzioso misurerebbe il file system: risultati non validi
+        if args.mongo != 'files' and (results['storage_fallbacks']
+                                      or results['cases']['snapshot_save']['backend'] != 'mongo'):
+            raise SystemExit(
+                f"Misure non valide con --mongo {args.mongo}: {results['storage_fallbacks']} operazioni "
+                f"ricadute sul file system, snapshot su {results['cases']['snapshot_save']['backend']}"
+            )
+    finally:
+        os.chdir(ROOT_DIR)
+        if args.mongo == 'mongod' and storage._mongo_client is not None:
+            storage._mongo_client.drop_database(db_name)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if baseline is not None:
+        results['baseline'] = compare(results, baseline)
+
+    output = json.dumps(results, indent=2)
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
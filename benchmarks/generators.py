@@ -0,0 +1,182 @@
+"""
+Generatori di dati sintetici con seme fisso per i benchmark: stessi parametri -> stessi dati.
+- record DMX come li restituisce l'API OData (giri, prefissi CAI IG/AR/FG/SO, ubicazioni
+  ADD normali, LX per gli accessori e "1" per il crossdock, check InvRem)
+- tabella Loadings (LoadingId -> LoadingName) e unione con i record DMX come in estrai_e_analizza
+- anagrafica articoli in CSV (colonne C ITM_0 e D COD_0, come /upload_anagrafica)
+- CSV da trasformare in YDMXEL (colonna ARTICLE con codici so_/id_/ig_/ar_/fg_)
+
+Uso (scrive i file in una cartella, per riprodurre un caso fuori dai benchmark):
+    python benchmarks/generators.py --output-dir dati_bench [--records 20000] [--routes 60] [--seed 42]
+"""
+import io
+import os
+import csv
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+_LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_WORDS = ['PNEUMATICO', 'CERCHIO', 'VALVOLA', 'ESTIVO', 'INVERNALE', 'RINFORZATO', 'KIT', 'BULLONE',
+          '205/55', 'R16', '225/45', 'R17', 'PILOT', 'ALPIN', 'AGILIS', 'CROSSCLIMATE']
+_CITIES = ['TORINO', 'MILANO', 'GENOVA', 'BOLOGNA', 'FIRENZE', 'ROMA', 'NAPOLI', 'BARI', 'PALERMO', 'CATANIA']
+# Prefissi CAI con il peso relativo (i codici senza prefisso sono MICHELIN)
+_CAI_PREFIXES = (('', 70), ('IG', 8), ('AR', 6), ('FG', 6), ('SO', 10))
+# Prefissi della colonna ARTICLE del CSV da trasformare (solo so_ passa dall'anagrafica)
+_ARTICLE_PREFIXES = (('so_', 70), ('id_', 8), ('ig_', 8), ('ar_', 6), ('fg_', 4), ('', 4))
+
+YDMXEL_HEADER = ['ORDER', 'LINE', 'SITE', 'CUSTOMER', 'SHIPTO', 'ROUTE', 'DLVDAT', 'ARTICLE',
+                 'DESCRIPTION', 'QTY', 'WEIGHT', 'REF']
+ANAGRAFICA_HEADER = ['TCLCOD_0', 'DES_0', 'ITM_0', 'COD_0']
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _route_names(rng, routes):
+    return [f"{rng.choice(_LETTERS)}{rng.choice(_LETTERS)}{i:02d}" for i in range(routes)]
+
+
+def _location(rng, accessori_ratio, crossdock_ratio):
+    """Ubicazione ADD: LX.. per gli accessori, "1" per il crossdock, altrimenti corsia-posto"""
+    draw = rng.random()
+    if draw < accessori_ratio:
+        return f"LX{rng.randint(1, 20):02d}-{rng.randint(1, 9)}"
+    if draw < accessori_ratio + crossdock_ratio:
+        return '1'
+    return f"{rng.choice(_LETTERS)}{rng.randint(1, 40):02d}-{rng.randint(1, 9)}"
+
+
+def generate_dmx_records(records, routes, seed, date_str='2024-01-15', checked_ratio=0.6,
+                         accessori_ratio=0.05, crossdock_ratio=0.03):
+    """Record DMX sintetici con la struttura della risposta OData (campo value)"""
+    rng = random.Random(seed)
+    route_names = _route_names(rng, routes)
+    customers = [f"CLIENTE {i:04d} SRL" for i in range(max(1, routes * 8))]
+    cai_codes = [f"{_weighted(rng, _CAI_PREFIXES)}{rng.randint(100000, 999999)}" for _ in range(max(1, records // 5))]
+    descriptions = {code: ' '.join(rng.sample(_WORDS, 3)) for code in cai_codes}
+    launch = datetime.strptime(date_str, '%Y-%m-%d')
+
+    result = []
+    for index in range(records):
+        route_index = rng.randrange(routes)
+        code = rng.choice(cai_codes)
+        customer_index = rng.randrange(len(customers))
+        result.append({
+            'Id': index + 1,
+            'Route': route_names[route_index],
+            'ShipTo': f"ST{customer_index:05d}",
+            'CustomerName': customers[customer_index],
+            'CustomerCity': rng.choice(_CITIES),
+            'CAI': code,
+            'ItemDescription': descriptions[code],
+            'SiteName': 'TST - EDC Torino',
+            'LaunchDate': (launch + timedelta(minutes=rng.randint(0, 16 * 60))).strftime('%Y-%m-%dT%H:%M:%S'),
+            'InvRem': f"INV{rng.randint(1000, 9999)}" if rng.random() < checked_ratio else '',
+            'PalletId': f"PAL{rng.randint(100000, 999999)}",
+            'LoadingId': f"L{route_index:04d}" if rng.random() < 0.95 else '',
+            'ADD': _location(rng, accessori_ratio, crossdock_ratio),
+            'Quantity': rng.randint(1, 4),
+            'Weight': round(rng.uniform(5, 40), 2)
+        })
+    return result
+
+
+def generate_loadings(routes, seed):
+    """Tabella Loadings sintetica: una tournée per giro (LoadingId -> LoadingName)"""
+    rng = random.Random(seed + 1)
+    return [{
+        'LoadingId': f"L{index:04d}",
+        'LoadingName': f"{rng.choice(_CITIES)} {rng.choice(['NORD', 'SUD', 'CENTRO', 'EST', 'OVEST'])}",
+        'LoadingDate': '2024-01-15T05:00:00',
+        'Carrier': f"VETTORE {rng.randint(1, 12)}"
+    } for index in range(routes)]
+
+
+def attach_loading_names(records, loadings):
+    """Aggiunge LoadingName ai record DMX tramite LoadingId (come estrai_e_analizza)"""
+    names = {str(loading['LoadingId']): str(loading['LoadingName']).strip() for loading in loadings}
+    for record in records:
+        loading_id = str(record.get('LoadingId') or '').strip()
+        record['LoadingName'] = names.get(loading_id, '') if loading_id else ''
+    return records
+
+
+def anagrafica_codes(items, seed):
+    """Codici ITM_0 (CSO_...) dell'anagrafica, condivisi dal CSV da trasformare"""
+    rng = random.Random(seed + 2)
+    return [f"CSO_{code}" for code in rng.sample(range(100000, 999999), items)]
+
+
+def generate_anagrafica_csv(items, seed):
+    """CSV anagrafica (separatore ;) con ITM_0 e COD_0 nelle colonne C e D"""
+    rng = random.Random(seed + 3)
+    lines = [';'.join(ANAGRAFICA_HEADER)]
+    for code in anagrafica_codes(items, seed):
+        lines.append(';'.join([
+            rng.choice(['PNE', 'ACC', 'CER']),
+            ' '.join(rng.sample(_WORDS, 2)),
+            code,
+            f"{rng.randint(1000000, 9999999)}"
+        ]))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def generate_ydmxel_csv(rows, anagrafica_items, seed, missing_ratio=0.02):
+    """CSV da trasformare: la colonna ARTICLE usa codici dell'anagrafica (una parte mancante)"""
+    rng = random.Random(seed + 4)
+    codes = anagrafica_codes(anagrafica_items, seed)
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+    writer.writerow(YDMXEL_HEADER)
+    for index in range(rows):
+        prefix = _weighted(rng, _ARTICLE_PREFIXES)
+        if prefix == 'so_':
+            number = rng.randint(1000000, 1999999) if rng.random() < missing_ratio else rng.choice(codes)[4:]
+            article = f"so_{number}"
+        else:
+            article = f"{prefix}{rng.randint(100000, 999999)}"
+        writer.writerow([
+            f"ORD{index // 20:07d}", index % 20 + 1, 'TST', f"CLIENTE {rng.randint(0, 999):04d} SRL",
+            f"ST{rng.randint(0, 99999):05d}", f"{rng.choice(_LETTERS)}{rng.choice(_LETTERS)}", '20240115',
+            article, ' '.join(rng.sample(_WORDS, 3)), rng.randint(1, 4), round(rng.uniform(5, 40), 2),
+            f"REF{rng.randint(0, 99999)}"
+        ])
+    return output.getvalue().encode('utf-8')
+
+
+def split_chunks(data, chunk_size):
+    """Divide un file in chunk come l'upload a chunk della pagina principale"""
+    return [data[start:start + chunk_size] for start in range(0, len(data), chunk_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera i dati sintetici dei benchmark')
+    parser.add_argument('--output-dir', required=True, help='cartella in cui scrivere i file')
+    parser.add_argument('--records', type=int, default=20000, help='record DMX')
+    parser.add_argument('--routes', type=int, default=60, help='giri')
+    parser.add_argument('--anagrafica', type=int, default=50000, help='articoli in anagrafica')
+    parser.add_argument('--csv-rows', type=int, default=100000, help='righe del CSV da trasformare')
+    parser.add_argument('--seed', type=int, default=42, help='seme del generatore')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    records = generate_dmx_records(args.records, args.routes, args.seed)
+    loadings = generate_loadings(args.routes, args.seed)
+    files = {
+        'dmx.json': json.dumps({'value': records}, ensure_ascii=False).encode('utf-8'),
+        'loadings.json': json.dumps({'value': loadings}, ensure_ascii=False).encode('utf-8'),
+        'anagrafica.csv': generate_anagrafica_csv(args.anagrafica, args.seed),
+        'ydmxel_input.csv': generate_ydmxel_csv(args.csv_rows, args.anagrafica, args.seed),
+    }
+    for name, data in files.items():
+        with open(os.path.join(args.output_dir, name), 'wb') as f:
+            f.write(data)
+        print(f"✅ {name}: {len(data) / 1024 / 1024:.2f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark della serializzazione JSON: json della libreria standard (come il provider di default
+di Flask: chiavi ordinate, ensure_ascii) contro json_provider (orjson se installato) su un
+risultato di analyze_odata_data generato con seme fisso, con dimensioni simili a quelle reali
+(giri, righe di dettaglio, indice prodotti). Misura risposta compatta, file indentato e lettura.
+
+Uso:
+    python benchmarks/json_serialization.py [--routes 120] [--rows 40000] [--seed 42] [--runs 5] [--output risultati.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import json_provider  # noqa: E402
+import product_index  # noqa: E402
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MB = 1024 * 1024
+_LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_WORDS = ['PNEUMATICO', 'CERCHIO', 'VALVOLA', 'ESTIVO', 'INVERNALE', 'RINFORZATO', 'KIT', 'BULLONE', '205/55', 'R16']
+
+
+def _count(value):
+    """Contatori come escono da pandas (numpy.int64) se numpy è disponibile"""
+    return numpy.int64(value) if numpy is not None else value
+
+
+def generate_payload(routes, rows, seed):
+    """Risultato di analisi sintetico con la struttura di analyze_odata_data"""
+    rng = random.Random(seed)
+    route_names = [f"{rng.choice(_LETTERS)}{rng.choice(_LETTERS)}{i}" for i in range(routes)]
+    clients = [f"CLIENTE {i:04d} SRL" for i in range(max(1, routes * 8))]
+    codes = [f"{rng.randint(100000, 999999)}-{rng.choice(_LETTERS)}" for _ in range(max(1, rows // 4))]
+    descriptions = {code: ' '.join(rng.sample(_WORDS, 3)) for code in codes}
+
+    analysis, details, accessori, crossdock, clienti_per_giro, per_giro = {}, {}, {}, {}, {}, []
+    product_search = {}
+    per_route = max(1, rows // max(1, routes))
+    for route in route_names:
+        rows_detail = []
+        for _ in range(per_route):
+            code = rng.choice(codes)
+            row = {
+                'codice_prodotto': code,
+                'cliente': rng.choice(clients),
+                'descrizione': descriptions[code],
+                'ubicazione': f"{rng.choice(_LETTERS)}{rng.randint(1, 40):02d}-{rng.randint(1, 9)}",
+                'cc': rng.choice(['MICHELIN', 'BRIDGESTONE', 'PIRELLI'])
+            }
+            rows_detail.append(row)
+            product_search.setdefault(code, {}).setdefault(route, 0)
+            product_search[code][route] += 1
+        checkati = rng.randint(0, per_route)
+        details[route] = rows_detail[:per_route - checkati]
+        accessori[route] = rows_detail[:rng.randint(0, 5)]
+        crossdock[route] = rows_detail[:rng.randint(0, 5)]
+        clienti_per_giro[route] = sorted({row['cliente'] for row in rows_detail})
+        analysis[route] = {
+            'totale_pezzi': _count(per_route),
+            'pezzi_checkati': _count(checkati),
+            'pezzi_da_checkare': _count(per_route - checkati),
+            'pezzi_accessori': _count(len(accessori[route])),
+            'pezzi_crossdock': _count(len(crossdock[route])),
+            'destinazione': f"DEPOSITO {route}"
+        }
+        per_giro.append({
+            'route': route,
+            'destinazione': f"DEPOSITO {route}",
+            'cc': ['MICHELIN'],
+            'totale': analysis[route]['totale_pezzi'],
+            'checkati': analysis[route]['pezzi_checkati'],
+            'da_checkare': analysis[route]['pezzi_da_checkare'],
+            'pezzi_accessori': analysis[route]['pezzi_accessori'],
+            'pezzi_crossdock': analysis[route]['pezzi_crossdock'],
+            'clienti': len(clienti_per_giro[route]),
+            'percentuale': round(checkati / per_route * 100, 2)
+        })
+
+    return {
+        'success': True,
+        'analysis': analysis,
+        'details': details,
+        'accessori_details': accessori,
+        'crossdock_details': crossdock,
+        'clienti_per_giro': clienti_per_giro,
+        'product_index': product_index.build_snapshot_index(product_search, descriptions),
+        'dates': ['2024-01-15'],
+        'statistics': {'totali': {'totale_giri': routes}, 'per_giro': per_giro, 'per_cc': []}
+    }
+
+
+def _timed(func, runs):
+    """Mediana (millisecondi) di `runs` esecuzioni e risultato dell'ultima"""
+    samples = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2), result
+
+
+def _stdlib_response(payload):
+    # Provider di default di Flask (senza numpy il `default` non sarebbe necessario)
+    return json.dumps(payload, default=json_provider.to_builtin, sort_keys=True,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def _stdlib_file(payload):
+    return json.dumps(payload, default=json_provider.to_builtin, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark serializzazione JSON (stdlib vs json_provider)')
+    parser.add_argument('--routes', type=int, default=120, help='giri nel risultato di analisi')
+    parser.add_argument('--rows', type=int, default=40000, help='righe di dettaglio totali')
+    parser.add_argument('--seed', type=int, default=42, help='seme del generatore')
+    parser.add_argument('--runs', type=int, default=5, help='ripetizioni per misura')
+    parser.add_argument('--output', help='file JSON dei risultati (default: stdout)')
+    args = parser.parse_args()
+
+    payload = generate_payload(args.routes, args.rows, args.seed)
+    results = {
+        'backend': 'orjson' if json_provider.ORJSON_AVAILABLE else 'stdlib',
+        'numpy_scalars': numpy is not None,
+        'routes': args.routes,
+        'rows': args.rows,
+        'seed': args.seed,
+        'runs': args.runs,
+        'cases': {}
+    }
+
+    cases = {
+        'response': (lambda: _stdlib_response(payload), lambda: json_provider.dumps(payload)),
+        'file_indent': (lambda: _stdlib_file(payload), lambda: json_provider.dumps(payload, indent=True)),
+    }
+    for name, (baseline, provider) in cases.items():
+        baseline_ms, baseline_bytes = _timed(baseline, args.runs)
+        provider_ms, provider_bytes = _timed(provider, args.runs)
+        results['cases'][name] = {
+            'size_mb': round(len(provider_bytes) / MB, 2),
+            'stdlib_ms': baseline_ms,
+            'provider_ms': provider_ms,
+            'speedup': round(baseline_ms / provider_ms, 2) if provider_ms > 0 else None,
+            'equivalent': json.loads(baseline_bytes) == json.loads(provider_bytes)
+        }
+
+    encoded = json_provider.dumps(payload, indent=True)
+    baseline_ms, _ = _timed(lambda: json.loads(encoded.decode('utf-8')), args.runs)
+    provider_ms, _ = _timed(lambda: json_provider.loads(encoded), args.runs)
+    results['cases']['load_file'] = {
+        'size_mb': round(len(encoded) / MB, 2),
+        'stdlib_ms': baseline_ms,
+        'provider_ms': provider_ms,
+        'speedup': round(baseline_ms / provider_ms, 2) if provider_ms > 0 else None
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark dei trasferimenti S3: PUT/GET singolo contro il motore a parti parallele di s3_storage
+(upload multipart in un pool di thread e GET a intervalli concorrenti), per varie combinazioni
+di dimensione delle parti e concorrenza.
+
+Pensato per uno stand-in S3 locale, ad esempio:
+    moto_server -p 5000            (pip install "moto[server]")
+    minio server /tmp/minio
+con S3_ENDPOINT_URL, S3_ACCESS_KEY_ID, S3_SECRET_ACCESS_KEY e S3_BUCKET_NAME impostate
+(il bucket viene creato se manca).
+
+Uso:
+    python benchmarks/s3_transfer.py [--size-mb 64] [--part-mb 8 16] [--concurrency 1 4 8] [--runs 3] [--output risultati.json]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import statistics
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import s3_storage  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def _timed(func, runs):
+    """Mediana (secondi) di `runs` esecuzioni"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _throughput(size, seconds):
+    return round(size / MB / seconds, 1) if seconds > 0 else None
+
+
+def ensure_bucket(client):
+    try:
+        client.head_bucket(Bucket=s3_storage.S3_BUCKET_NAME)
+    except Exception:
+        client.create_bucket(Bucket=s3_storage.S3_BUCKET_NAME)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark trasferimenti S3 (singolo vs parallelo)')
+    parser.add_argument('--size-mb', type=int, default=64, help='dimensione del file di prova')
+    parser.add_argument('--part-mb', type=int, nargs='+', default=[8, 16], help='dimensioni delle parti')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8], help='richieste in parallelo')
+    parser.add_argument('--runs', type=int, default=3, help='ripetizioni per misura')
+    parser.add_argument('--output', help='file JSON dei risultati (default: stdout)')
+    args = parser.parse_args()
+
+    if not s3_storage.USE_S3 or not s3_storage._import_boto3():
+        sys.exit('S3 non configurato: imposta S3_ENDPOINT_URL, S3_ACCESS_KEY_ID, S3_SECRET_ACCESS_KEY e S3_BUCKET_NAME')
+    client = s3_storage.boto3.client(
+        's3',
+        aws_access_key_id=s3_storage.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=s3_storage.AWS_SECRET_ACCESS_KEY,
+        region_name=s3_storage.AWS_REGION,
+        endpoint_url=s3_storage.S3_ENDPOINT_URL
+    )
+    ensure_bucket(client)
+    if s3_storage.get_s3_client() is None:
+        sys.exit('Connessione S3 non riuscita')
+
+    size = args.size_mb * MB
+    payload = os.urandom(size)
+    file_id = f"benchmark_{uuid.uuid4().hex[:8]}"
+    key = f"csv_uploads/{file_id}/baseline.bin"
+
+    results = {
+        'endpoint': s3_storage.S3_ENDPOINT_URL or 'aws',
+        'size_mb': args.size_mb,
+        'runs': args.runs,
+        'baseline': {},
+        'parallel': []
+    }
+
+    put_seconds = _timed(lambda: client.put_object(Bucket=s3_storage.S3_BUCKET_NAME, Key=key, Body=payload), args.runs)
+    get_seconds = _timed(lambda: client.get_object(Bucket=s3_storage.S3_BUCKET_NAME, Key=key)['Body'].read(), args.runs)
+    results['baseline'] = {
+        'put_object_mb_s': _throughput(size, put_seconds),
+        'get_object_mb_s': _throughput(size, get_seconds)
+    }
+
+    try:
+        for part_mb in args.part_mb:
+            for concurrency in args.concurrency:
+                name = f"parallel_{part_mb}_{concurrency}.bin"
+                upload_seconds = _timed(
+                    lambda: s3_storage.upload_to_s3(payload, file_id, name, part_mb * MB, concurrency), args.runs
+                )
+                downloaded = []
+                download_seconds = _timed(
+                    lambda: downloaded.append(sum(len(chunk) for chunk in s3_storage.iter_file_from_s3_parallel(
+                        file_id, name, part_mb * MB, concurrency))),
+                    args.runs
+                )
+                results['parallel'].append({
+                    'part_mb': part_mb,
+                    'concurrency': concurrency,
+                    'upload_mb_s': _throughput(size, upload_seconds),
+                    'download_mb_s': _throughput(size, download_seconds),
+                    'download_ok': all(length == size for length in downloaded)
+                })
+                client.delete_object(Bucket=s3_storage.S3_BUCKET_NAME, Key=f"csv_uploads/{file_id}/{name}")
+    finally:
+        client.delete_object(Bucket=s3_storage.S3_BUCKET_NAME, Key=key)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
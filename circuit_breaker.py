@@ -0,0 +1,105 @@
+"""
+Circuit breaker per le dipendenze di rete (MongoDB).
+Dopo N errori consecutivi il circuito si apre e le chiamate falliscono subito
+(fallback su file system) invece di attendere ogni volta il timeout di connessione;
+trascorso il tempo di reset, una sola richiesta di prova (half-open) verifica il ripristino.
+"""
+import time
+import threading
+from typing import Dict, Any, Optional
+
+import app_logging
+
+log = app_logging.get_logger('breaker')
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Circuit breaker thread-safe: closed -> open -> half_open -> closed/open"""
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._last_error: Optional[str] = None
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        """True se la chiamata può procedere. Con il circuito aperto costa solo un confronto."""
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Tempo di reset trascorso: lascia passare una sola richiesta di prova
+                self._state = STATE_HALF_OPEN
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def is_probing(self) -> bool:
+        """True se il circuito è in half-open (la chiamata corrente è la prova)"""
+        with self._lock:
+            return self._state == STATE_HALF_OPEN
+
+    def record_success(self) -> None:
+        # Caso comune (circuito chiuso, nessun errore): niente lock
+        if self._state == STATE_CLOSED and self._failures == 0:
+            return
+        with self._lock:
+            if self._state != STATE_CLOSED:
+                log.info("Circuit breaker %s: chiuso (servizio ripristinato)", self.name)
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if error is not None:
+                self._last_error = f"{type(error).__name__}: {error}"[:300]
+            self._failures += 1
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != STATE_OPEN:
+                    log.warning("Circuit breaker %s: aperto per %.0fs dopo %s errori", self.name, self.reset_timeout, self._failures)
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def reset(self) -> None:
+        """Chiude il circuito manualmente (es. dopo un cambio di configurazione)"""
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Stato del circuito (per /api/test_mongodb)"""
+        with self._lock:
+            retry_in = None
+            if self._state == STATE_OPEN and self._opened_at is not None:
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 1)
+            return {
+                'name': self.name,
+                'state': self._state,
+                'failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout_seconds': self.reset_timeout,
+                'retry_in_seconds': retry_in,
+                'short_circuited_calls': self.short_circuited,
+                'last_error': self._last_error
+            }
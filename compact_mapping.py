@@ -0,0 +1,184 @@
+"""
+Rappresentazione compatta e immutabile dell'anagrafica (ITM_0 -> COD_0).
+Invece di un dict con un oggetto str per ogni chiave e valore, tutti i dati stanno in un
+unico buffer: chiavi ordinate e valori deduplicati concatenati in UTF-8, offset in array
+uint32 e una tabella hash (crc32, indirizzamento aperto) per le ricerche in O(1).
+Il buffer può essere salvato su file e aperto con mmap: i worker gunicorn sulla stessa
+macchina condividono le stesse pagine di memoria invece di tenere una copia ciascuno.
+"""
+import os
+import mmap
+import struct
+import zlib
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional
+
+_MAGIC = b'EZANAG01'
+# Header: magic, marcatore di byte order, n. chiavi, n. valori distinti, slot tabella hash, lunghezza tag
+_HEADER = struct.Struct('=8sIIIII')
+_BYTE_ORDER_MARK = 0x01020304
+
+
+class CompactMapping(Mapping):
+    """Mapping di sola lettura str -> str su un buffer compatto (bytes o mmap)"""
+
+    def __init__(self, buffer, tag: str = ''):
+        view = memoryview(buffer)
+        magic, order_mark, key_count, value_count, table_size, tag_length = _HEADER.unpack_from(view, 0)
+        if magic != _MAGIC:
+            raise ValueError("Formato anagrafica compatta non riconosciuto")
+        if order_mark != _BYTE_ORDER_MARK:
+            raise ValueError("Anagrafica compatta salvata con un byte order diverso")
+
+        offset = _HEADER.size
+        self.tag = bytes(view[offset:offset + tag_length]).decode('utf-8')
+        offset += tag_length
+        offset += -offset % 4  # allineamento degli array uint32
+
+        def take(count: int) -> memoryview:
+            nonlocal offset
+            section = view[offset:offset + count * 4].cast('I')
+            offset += count * 4
+            return section
+
+        self._buffer = buffer
+        self._len = key_count
+        self._key_offsets = take(key_count + 1)
+        self._value_ids = take(key_count)
+        self._value_offsets = take(value_count + 1)
+        self._table = take(table_size)
+        self._mask = table_size - 1
+        self._keys = view[offset:offset + self._key_offsets[key_count]]
+        offset += self._key_offsets[key_count]
+        self._values = view[offset:offset + self._value_offsets[value_count]]
+
+    # ---------- costruzione / persistenza ----------
+
+    @classmethod
+    def from_dict(cls, mapping: Dict[str, str], tag: str = '') -> 'CompactMapping':
+        return cls(cls.pack(mapping, tag), tag)
+
+    @staticmethod
+    def pack(mapping: Dict[str, str], tag: str = '') -> bytes:
+        """Serializza un mapping nel formato binario compatto"""
+        from array import array
+
+        encoded = sorted((str(key).encode('utf-8'), str(value)) for key, value in mapping.items())
+        key_count = len(encoded)
+        table_size = 8
+        while table_size < key_count * 2:
+            table_size *= 2
+        mask = table_size - 1
+
+        key_offsets = array('I', [0])
+        value_ids = array('I')
+        value_offsets = array('I', [0])
+        table = array('I', bytes(table_size * 4))
+        value_index: Dict[str, int] = {}
+        key_blob = bytearray()
+        value_blob = bytearray()
+
+        for position, (key, value) in enumerate(encoded):
+            key_blob += key
+            key_offsets.append(len(key_blob))
+            value_id = value_index.get(value)
+            if value_id is None:
+                value_id = value_index[value] = len(value_index)
+                value_blob += value.encode('utf-8')
+                value_offsets.append(len(value_blob))
+            value_ids.append(value_id)
+
+            slot = zlib.crc32(key) & mask
+            while table[slot]:
+                slot = (slot + 1) & mask
+            table[slot] = position + 1
+
+        tag_bytes = tag.encode('utf-8')
+        header = _HEADER.pack(_MAGIC, _BYTE_ORDER_MARK, key_count, len(value_index), table_size, len(tag_bytes))
+        head = header + tag_bytes
+        head += bytes(-len(head) % 4)
+        return b''.join((head, key_offsets.tobytes(), value_ids.tobytes(), value_offsets.tobytes(),
+                         table.tobytes(), bytes(key_blob), bytes(value_blob)))
+
+    def save(self, path: str) -> None:
+        """Salva il buffer su file (scrittura atomica: chi ha già il file in mmap non viene toccato)"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self._buffer)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, use_mmap: bool = True) -> 'CompactMapping':
+        """Apre un file salvato con save(); con mmap le pagine sono condivise tra i processi"""
+        with open(path, 'rb') as f:
+            if use_mmap:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+        return cls(buffer)
+
+    @staticmethod
+    def read_tag(path: str) -> Optional[str]:
+        """Tag (versione) di un file salvato, senza caricarlo"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(_HEADER.size)
+                magic, order_mark, _, _, _, tag_length = _HEADER.unpack(header)
+                if magic != _MAGIC or order_mark != _BYTE_ORDER_MARK:
+                    return None
+                return f.read(tag_length).decode('utf-8')
+        except (OSError, struct.error, UnicodeDecodeError):
+            return None
+
+    # ---------- interfaccia Mapping ----------
+
+    def _find(self, key) -> int:
+        if not isinstance(key, str):
+            return -1
+        encoded = key.encode('utf-8')
+        slot = zlib.crc32(encoded) & self._mask
+        table = self._table
+        key_offsets = self._key_offsets
+        while True:
+            position = table[slot]
+            if not position:
+                return -1
+            position -= 1
+            if self._keys[key_offsets[position]:key_offsets[position + 1]] == encoded:
+                return position
+            slot = (slot + 1) & self._mask
+
+    def _value_at(self, position: int) -> str:
+        value_id = self._value_ids[position]
+        return str(self._values[self._value_offsets[value_id]:self._value_offsets[value_id + 1]], 'utf-8')
+
+    def __getitem__(self, key) -> str:
+        position = self._find(key)
+        if position < 0:
+            raise KeyError(key)
+        return self._value_at(position)
+
+    def __contains__(self, key) -> bool:
+        return self._find(key) >= 0
+
+    def get(self, key, default=None):
+        position = self._find(key)
+        return default if position < 0 else self._value_at(position)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[str]:
+        # Chiavi già ordinate (ordine dei byte UTF-8 = ordine dei code point)
+        key_offsets = self._key_offsets
+        keys = self._keys
+        for position in range(self._len):
+            yield str(keys[key_offsets[position]:key_offsets[position + 1]], 'utf-8')
+
+    @property
+    def nbytes(self) -> int:
+        """Dimensione del buffer (memoria occupata, condivisa se in mmap)"""
+        return len(self._buffer)
+
+    def __repr__(self) -> str:
+        return f"<CompactMapping {self._len} articoli, {self.nbytes} byte>"
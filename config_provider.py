@@ -0,0 +1,126 @@
+"""
+Provider unico della configurazione OData.
+Tiene in memoria la configurazione già unita (default + file locale + MongoDB) e la
+riconvalida al massimo ogni ODATA_CONFIG_TTL secondi controllando l'mtime del file e
+il numero di versione salvato in MongoDB: le richieste "calde" non fanno I/O.
+"""
+import os
+import json
+import time
+import threading
+from typing import Optional, Dict, Any
+
+import app_logging
+
+log = app_logging.get_logger('config')
+
+# Intervallo minimo (secondi) tra due verifiche di modifica della configurazione
+ODATA_CONFIG_TTL = float(os.environ.get('ODATA_CONFIG_TTL', '30'))
+
+DEFAULT_ODATA_CONFIG = {
+    'odata_url': 'https://voiapp.fr',
+    'odata_endpoint': 'michelinpal/odata/DMX',  # Endpoint trovato nel VBA
+    'requires_auth': True,  # Abilitato di default
+    'auth_type': 'basic',  # Basic Auth di default
+    'auth_username': 'API',  # Nome utente API (impostato di default)
+    'auth_password': 'IPA',  # Password API (impostato di default)
+    'auth_token': '',  # Per altri tipi di auth
+    'date_field': 'LaunchDate',
+    'site_field': 'SiteName'  # Cambiato da 'Site' a 'SiteName' come nel VBA
+}
+
+
+class ODataConfigProvider:
+    """Configurazione OData in memoria con riconvalida periodica (mtime file / versione MongoDB)"""
+
+    def __init__(self, local_file: str, storage_module=None, ttl: float = ODATA_CONFIG_TTL):
+        self.local_file = local_file
+        self.storage = storage_module
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._config: Optional[Dict[str, Any]] = None
+        self._file_config: Dict[str, Any] = {}
+        self._mongo_config: Dict[str, Any] = {}
+        self._file_mtime: Optional[float] = None
+        self._mongo_version = None
+        self._checked_at = 0.0
+
+    def get(self) -> Dict[str, Any]:
+        """Configurazione corrente (copia). Fa I/O solo se è scaduto il TTL."""
+        config = self._config
+        if config is None or time.monotonic() - self._checked_at >= self.ttl:
+            with self._lock:
+                if self._config is None or time.monotonic() - self._checked_at >= self.ttl:
+                    self._revalidate()
+                config = self._config
+        return dict(config)
+
+    def publish(self, config: Dict[str, Any]) -> None:
+        """Aggiorna subito la configurazione in memoria dopo un salvataggio.
+        La configurazione va nella sorgente in cui è stata davvero salvata: MongoDB solo se
+        il documento letto corrisponde, altrimenti il file locale (modalità solo file o fallback)."""
+        with self._lock:
+            mongo_config, version = self._load_mongo_config()
+            if version and mongo_config == config:
+                self._mongo_config = dict(config)
+                self._mongo_version = version
+            else:
+                self._file_config = dict(config)
+                self._file_mtime = self._read_file_mtime()
+            self._merge()
+            self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Forza la riconvalida alla prossima richiesta"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def _read_file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.local_file).st_mtime
+        except OSError:
+            return None
+
+    def _load_mongo_config(self):
+        """(config, versione) salvati in MongoDB; (None, None) senza storage o con MongoDB non raggiungibile"""
+        if self.storage is None:
+            return None, None
+        return self.storage.load_odata_config_from_mongo()
+
+    def _revalidate(self) -> None:
+        """Ricarica solo le sorgenti cambiate (file per mtime, MongoDB per versione)"""
+        mtime = self._read_file_mtime()
+        if mtime != self._file_mtime or self._config is None:
+            self._file_config = self._load_file() if mtime is not None else {}
+            self._file_mtime = mtime
+
+        if self.storage is not None:
+            version = self.storage.get_odata_config_version()
+            # None = MongoDB non raggiungibile: si mantiene l'ultima configurazione nota
+            if version is not None and version != self._mongo_version:
+                if version == 0:
+                    self._mongo_config = {}
+                    self._mongo_version = version
+                else:
+                    mongo_config, loaded_version = self.storage.load_odata_config_from_mongo()
+                    if loaded_version is not None:
+                        self._mongo_config = mongo_config or {}
+                        self._mongo_version = loaded_version
+
+        self._merge()
+        self._checked_at = time.monotonic()
+
+    def _load_file(self) -> Dict[str, Any]:
+        try:
+            with open(self.local_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            log.error("Errore nel caricamento config OData: %s", e)
+            return {}
+
+    def _merge(self) -> None:
+        # Default < file locale < MongoDB (l'ultima configurazione salvata dall'interfaccia)
+        config = dict(DEFAULT_ODATA_CONFIG)
+        config.update(self._file_config)
+        config.update(self._mongo_config)
+        self._config = config
@@ -0,0 +1,113 @@
+"""
+Serializzazione JSON delle risposte Flask e degli snapshot salvati su file.
+Con orjson (se installato) le risposte grandi di /estrai_e_analizza e /risultati vengono
+codificate direttamente in bytes, senza passare da una str intermedia; senza orjson si usa
+il modulo json della libreria standard con lo stesso comportamento.
+Gli scalari numpy/pandas (int64, float64, bool_, Timestamp, ...) sono serializzati
+nativamente: analyze_odata_data non deve convertire i risultati di pandas con int()/float().
+"""
+import os
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+import app_logging
+
+log = app_logging.get_logger('json')
+
+# Backend JSON: 'auto' (orjson se installato), 'orjson' oppure 'stdlib'
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto').lower()
+
+orjson = None
+if JSON_BACKEND != 'stdlib':
+    try:
+        import orjson
+    except ImportError:
+        if JSON_BACKEND == 'orjson':
+            log.warning("JSON_BACKEND=orjson ma orjson non è installato, uso json della libreria standard")
+
+ORJSON_AVAILABLE = orjson is not None
+
+if ORJSON_AVAILABLE:
+    # Chiavi non stringa convertite come fa json (es. int -> "1"), array e scalari numpy nativi
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    _ORJSON_INDENT_OPTIONS = _ORJSON_OPTIONS | orjson.OPT_INDENT_2
+
+
+def to_builtin(obj: Any) -> Any:
+    """
+    Converte un valore non serializzabile nel tipo Python equivalente.
+    Usato come `default` del JSON e come fallback encoder BSON (storage.py).
+    numpy/pandas non vengono importati: si riconoscono dal modulo del tipo.
+    """
+    module = type(obj).__module__
+    if module == 'numpy' or module.startswith(('numpy.', 'pandas.')):
+        if hasattr(obj, 'isoformat'):
+            # pandas.Timestamp è una sottoclasse di datetime; NaT non ha una data
+            return None if obj != obj else obj.isoformat()
+        if hasattr(obj, 'tolist'):
+            # Scalari numpy (item) e array (liste annidate)
+            value = obj.tolist()
+            if isinstance(value, float) and math.isnan(value):
+                return None
+            return value
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Oggetto di tipo {type(obj).__name__} non serializzabile in JSON")
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serializza in bytes UTF-8 (indent=True: indentazione di 2 spazi, per i file leggibili)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=to_builtin,
+                            option=_ORJSON_INDENT_OPTIONS if indent else _ORJSON_OPTIONS)
+    if indent:
+        text = json.dumps(obj, default=to_builtin, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(obj, default=to_builtin, ensure_ascii=False, separators=(',', ':'))
+    return text.encode('utf-8')
+
+
+def loads(data: Any) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return json.loads(data)
+
+
+def dump_file(obj: Any, filepath: str, indent: bool = True) -> None:
+    """Scrive un file JSON (bytes già codificati, nessuna str intermedia)"""
+    with open(filepath, 'wb') as f:
+        f.write(dumps(obj, indent=indent))
+
+
+def load_file(filepath: str) -> Any:
+    with open(filepath, 'rb') as f:
+        return loads(f.read())
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSONProvider di Flask basato su dumps()/loads(): jsonify e il filtro tojson dei template
+    lo usano al posto del modulo json. Le chiavi mantengono l'ordine di inserimento (nessun
+    sort_keys): l'ordine è già quello costruito dall'analisi e non va ricalcolato a ogni risposta.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj, indent=bool(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
@@ -0,0 +1,47 @@
+"""
+Import differito dei moduli pesanti (pandas, requests, ...).
+Su Vercel ogni cold start importa app.py: caricare pandas/numpy solo quando una route
+li usa davvero evita di pagarne il costo anche per /static, /favicon.ico o /manifest.json.
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    """Proxy di un modulo importato al primo accesso a un attributo"""
+
+    def __init__(self, name: str):
+        self.__dict__['_lazy_name'] = name
+        self.__dict__['_lazy_lock'] = threading.Lock()
+        self.__dict__['_lazy_module'] = None
+
+    def _lazy_load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_lazy_name'])
+                    # Copia gli attributi nel proxy: gli accessi successivi non passano da __getattr__
+                    for attr, value in vars(module).items():
+                        self.__dict__.setdefault(attr, value)
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._lazy_load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._lazy_load(), attr, value)
+        self.__dict__[attr] = value
+
+    def __repr__(self):
+        state = 'caricato' if self.__dict__['_lazy_module'] is not None else 'non caricato'
+        return f"<LazyModule {self.__dict__['_lazy_name']} ({state})>"
+
+
+def is_loaded(module) -> bool:
+    """True se il modulo (o il proxy) è già stato importato"""
+    if isinstance(module, LazyModule):
+        return module.__dict__['_lazy_module'] is not None
+    return True
@@ -0,0 +1,230 @@
+"""
+Metriche di prestazione in memoria, esposte in formato testo Prometheus su /metrics.
+- histogram: durata delle richieste per route e delle fasi (span) di un'operazione
+  (fetch OData, analisi, salvataggio snapshot, serializzazione, MongoDB, S3)
+- counter: eventi (fallback su file system, sorgente dei dati, ...)
+- collector: funzioni chiamate solo durante lo scrape (cache, circuit breaker, compressione),
+  così le statistiche già mantenute dagli altri moduli non costano nulla per richiesta.
+Ogni worker (o istanza serverless) ha i propri valori, come per le altre statistiche in memoria.
+"""
+import os
+import hmac
+import time
+import bisect
+import threading
+import functools
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# '0' disattiva la raccolta delle metriche (span e counter diventano no-op)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+PREFIX = 'easy_'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+# Un collector restituisce famiglie: (nome, tipo, descrizione, [(etichette, valore), ...])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+
+_lock = threading.Lock()
+_counters: Dict[str, Tuple[str, Dict[LabelKey, float]]] = {}
+_histograms: Dict[str, 'Histogram'] = {}
+_collectors: List[Callable[[], Iterable[Family]]] = []
+
+
+class Histogram:
+    """Istogramma cumulativo per combinazione di etichette (bucket fissi)"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, labels: LabelKey) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Conteggi per bucket (+Inf in fondo), somma, numero di osservazioni
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def series(self) -> Dict[LabelKey, List[float]]:
+        with _lock:
+            return {labels: list(values) for labels, values in self._series.items()}
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def histogram(name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Restituisce (creandolo al primo uso) l'istogramma con questo nome"""
+    with _lock:
+        existing = _histograms.get(name)
+        if existing is None:
+            existing = _histograms[name] = Histogram(name, help_text, buckets)
+        return existing
+
+
+REQUEST_DURATION = histogram('http_request_duration_seconds', 'Durata delle richieste HTTP per route')
+STAGE_DURATION = histogram('stage_duration_seconds', 'Durata delle fasi delle operazioni (span)')
+
+
+def observe(hist: Histogram, seconds: float, **labels: Any) -> None:
+    if METRICS_ENABLED:
+        hist.observe(seconds, _label_key(labels))
+
+
+def inc(name: str, help_text: str = '', amount: float = 1, **labels: Any) -> None:
+    """Incrementa un counter (creato al primo uso)"""
+    if not METRICS_ENABLED:
+        return
+    key = _label_key(labels)
+    with _lock:
+        entry = _counters.get(name)
+        if entry is None:
+            entry = _counters[name] = (help_text, {})
+        entry[1][key] = entry[1].get(key, 0) + amount
+
+
+class span:
+    """Misura la durata di una fase: `with metrics.span('analyze'): ...` (anche in caso di errore)"""
+
+    __slots__ = ('stage', '_start')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._start = 0.0
+
+    def __enter__(self) -> 'span':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if METRICS_ENABLED:
+            STAGE_DURATION.observe(time.perf_counter() - self._start, (('stage', self.stage),))
+
+
+def timed(stage: str) -> Callable:
+    """Decoratore: registra la durata di ogni chiamata della funzione come span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_collector(collector: Callable[[], Iterable[Family]]) -> None:
+    """Aggiunge una funzione letta solo durante lo scrape di /metrics"""
+    with _lock:
+        _collectors.append(collector)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Iterable[Tuple[str, Any]]) -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render() -> str:
+    """Tutte le metriche in formato testo Prometheus (versione 0.0.4)"""
+    lines: List[str] = []
+
+    for hist in list(_histograms.values()):
+        name = PREFIX + hist.name
+        lines.append(f"# HELP {name} {hist.help}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, values in sorted(hist.series().items()):
+            cumulative = 0
+            for bound, count in zip(hist.buckets + (float('inf'),), values):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+
+    with _lock:
+        counters = {name: (help_text, dict(series)) for name, (help_text, series) in _counters.items()}
+        collectors = list(_collectors)
+    for name, (help_text, series) in sorted(counters.items()):
+        name = PREFIX + name
+        lines.append(f"# HELP {name} {help_text or name}")
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in sorted(series.items()):
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for collector in collectors:
+        try:
+            families = list(collector())
+        except Exception as e:
+            # Un collector guasto non deve rendere illeggibili le altre metriche
+            lines.append(f"# collector {getattr(collector, '__name__', collector)} non disponibile: {_escape(e)}")
+            continue
+        for name, kind, help_text, samples in families:
+            name = PREFIX + name
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot_cache_collector(cache, name: str) -> Callable[[], List[Family]]:
+    """Collector delle statistiche di una SnapshotCache"""
+    def collect() -> List[Family]:
+        stats = cache.stats()
+        labels = {'cache': name}
+        return [
+            ('cache_hits_total', 'counter', 'Letture trovate in cache', [(labels, stats['hits'])]),
+            ('cache_misses_total', 'counter', 'Letture non trovate in cache', [(labels, stats['misses'])]),
+            ('cache_evictions_total', 'counter', 'Voci eliminate dalla cache (LRU)', [(labels, stats['evictions'])]),
+            ('cache_entries', 'gauge', 'Voci in cache', [(labels, stats['entries'])]),
+            ('cache_bytes', 'gauge', 'Memoria stimata della cache in bytes', [(labels, stats['bytes'])]),
+        ]
+    collect.__name__ = f"cache_{name}"
+    return collect
+
+
+def breaker_collector(breaker) -> Callable[[], List[Family]]:
+    """Collector dello stato di un CircuitBreaker (0 = closed, 1 = half_open, 2 = open)"""
+    states = {'closed': 0, 'half_open': 1, 'open': 2}
+
+    def collect() -> List[Family]:
+        state = breaker.snapshot()
+        labels = {'breaker': state['name']}
+        return [
+            ('circuit_breaker_state', 'gauge', 'Stato del circuit breaker (0 closed, 1 half_open, 2 open)',
+             [(labels, states.get(state['state'], -1))]),
+            ('circuit_breaker_failures', 'gauge', 'Errori consecutivi registrati', [(labels, state['failures'])]),
+            ('circuit_breaker_short_circuited_total', 'counter', 'Chiamate saltate a circuito aperto',
+             [(labels, state['short_circuited_calls'])]),
+        ]
+    collect.__name__ = f"breaker_{getattr(breaker, 'name', 'breaker')}"
+    return collect
+
+
+def check_token(provided: Optional[str]) -> bool:
+    """True se /metrics è accessibile: METRICS_TOKEN non impostato o token corretto"""
+    expected = os.environ.get('METRICS_TOKEN')
+    if not expected:
+        return True
+    return provided is not None and hmac.compare_digest(provided, expected)
@@ -0,0 +1,136 @@
+"""
+Indice di ricerca dei prodotti da checkare di un'estrazione (/api/product_search).
+analyze_odata_data salva nello snapshot le colonne ordinate per codice trasformato
+(codice, descrizione, giri con il numero di pezzi) invece della mappa completa inviata
+al browser; alla prima ricerca su uno snapshot si costruisce in memoria un indice a
+trigrammi su codice e descrizione. Le ricerche per prefisso usano la bisezione sui codici
+ordinati, quelle per sottostringa esaminano solo i candidati del trigramma più raro.
+"""
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+PREFIX = 'prefix'
+SUBSTRING = 'substring'
+
+# Indici di snapshot tenuti in memoria (chiave: data, sito, versione dello snapshot)
+_INDEX_CACHE_SIZE = 8
+_indexes: 'OrderedDict[Tuple[str, str, str], ProductIndex]' = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _trigrams(text: str) -> Iterable[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def build_snapshot_index(product_search: Mapping[str, Mapping[str, int]],
+                         product_descriptions: Mapping[str, str]) -> Dict[str, List[Any]]:
+    """Colonne da salvare nello snapshot (chiave product_index), ordinate per codice"""
+    codes = sorted(product_search, key=str.upper)
+    return {
+        'codes': codes,
+        'descriptions': [product_descriptions.get(code, '') for code in codes],
+        'routes': [sorted([route, int(count)] for route, count in product_search[code].items()) for code in codes]
+    }
+
+
+class ProductIndex:
+    """Codici ordinati (ricerca per prefisso) + trigrammi su codice e descrizione (sottostringa)"""
+
+    def __init__(self, snapshot_index: Mapping[str, List[Any]]):
+        self._codes: List[str] = list(snapshot_index.get('codes') or [])
+        self._descriptions: List[str] = list(snapshot_index.get('descriptions') or [''] * len(self._codes))
+        self._routes: List[List[Any]] = list(snapshot_index.get('routes') or [[] for _ in self._codes])
+        self._keys = [code.upper() for code in self._codes]
+        self._normalized_descriptions = [description.upper() for description in self._descriptions]
+        self._postings: Dict[str, array] = {}
+        for entry_id, (key, description) in enumerate(zip(self._keys, self._normalized_descriptions)):
+            for gram in _trigrams(key) | _trigrams(description):
+                postings = self._postings.get(gram)
+                if postings is None:
+                    postings = self._postings[gram] = array('I')
+                postings.append(entry_id)
+
+    @classmethod
+    def from_snapshot(cls, data: Mapping[str, Any]) -> 'ProductIndex':
+        """Indice di uno snapshot; quelli salvati prima di product_index hanno product_search"""
+        snapshot_index = data.get('product_index')
+        if snapshot_index is None:
+            snapshot_index = build_snapshot_index(data.get('product_search') or {},
+                                                  data.get('product_descriptions') or {})
+        return cls(snapshot_index)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def search(self, query: str, mode: str = SUBSTRING) -> List[int]:
+        """Posizioni dei prodotti trovati: prima i codici che iniziano con la query, poi quelli
+        che la contengono, poi quelli trovati solo nella descrizione (in ordine di codice)"""
+        query = query.strip().upper()
+        if not query:
+            return []
+
+        # Prefisso: intervallo contiguo dei codici ordinati
+        start = bisect.bisect_left(self._keys, query)
+        stop = bisect.bisect_left(self._keys, query + '\uffff', start)
+        prefix_matches = list(range(start, stop))
+        if mode == PREFIX:
+            return prefix_matches
+
+        if len(query) < 3:
+            # Query troppo corta per i trigrammi: scansione dei valori già normalizzati
+            candidates: Iterable[int] = range(len(self._keys))
+        else:
+            postings = []
+            for gram in _trigrams(query):
+                gram_postings = self._postings.get(gram)
+                if gram_postings is None:
+                    return prefix_matches
+                postings.append(gram_postings)
+            candidates = sorted(set(min(postings, key=len)))
+
+        in_code = []
+        in_description = []
+        for entry_id in candidates:
+            if start <= entry_id < stop:
+                continue
+            if query in self._keys[entry_id]:
+                in_code.append(entry_id)
+            elif query in self._normalized_descriptions[entry_id]:
+                in_description.append(entry_id)
+        return prefix_matches + in_code + in_description
+
+    def hits(self, entry_ids: List[int], limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Una riga per giro dei prodotti trovati (al massimo `limit`) e numero totale di righe"""
+        total = sum(len(self._routes[entry_id]) for entry_id in entry_ids)
+        items = []
+        for entry_id in entry_ids:
+            for route, count in self._routes[entry_id]:
+                if len(items) >= limit:
+                    return items, total
+                items.append({
+                    'codice': self._codes[entry_id],
+                    'route': route,
+                    'count': count,
+                    'descrizione': self._descriptions[entry_id]
+                })
+        return items, total
+
+
+def remember(key: Tuple[str, str, str], index: ProductIndex) -> None:
+    """Tiene in memoria l'indice di uno snapshot (la versione fa parte della chiave)"""
+    with _indexes_lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > _INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+
+
+def recall(key: Tuple[str, str, str]) -> Optional[ProductIndex]:
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+        return index
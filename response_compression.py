@@ -0,0 +1,283 @@
+"""
+Compressione delle risposte HTML/JSON/CSV (after_request di app.py).
+La codifica è scelta da Accept-Encoding: brotli se installato e preferito dal client,
+altrimenti gzip. Le risposte sotto RESPONSE_COMPRESS_MIN_BYTES restano invariate, quelle
+grandi o già in streaming vengono compresse a blocchi senza una seconda copia in memoria.
+Per i file in static/ si usano le varianti precompresse (file.br / file.gz) create con:
+
+    python response_compression.py static public
+
+Per ogni route si conservano i bytes prima e dopo la compressione (/api/compression_stats).
+"""
+import os
+import sys
+import gzip
+import zlib
+import threading
+import importlib
+import importlib.util
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+GZIP = 'gzip'
+BROTLI = 'br'
+
+# '0' disattiva la compressione delle risposte
+RESPONSE_COMPRESSION = os.environ.get('RESPONSE_COMPRESSION', '1') != '0'
+# Sotto questa dimensione (bytes) la risposta non viene compressa
+RESPONSE_COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+# Oltre questa dimensione una risposta già in memoria viene compressa in streaming
+RESPONSE_COMPRESS_STREAM_BYTES = int(os.environ.get('RESPONSE_COMPRESS_STREAM_BYTES', str(1024 * 1024)))
+# Livello gzip (1-9) e qualità brotli (0-11) per la compressione al volo
+RESPONSE_COMPRESS_LEVEL = int(os.environ.get('RESPONSE_COMPRESS_LEVEL', '6'))
+RESPONSE_BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', '5'))
+
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript',
+    'application/json', 'application/javascript', 'application/manifest+json',
+    'application/xml', 'image/svg+xml'
+}
+# Estensioni per cui ha senso creare varianti precompresse (le immagini sono già compresse)
+PRECOMPRESS_EXTENSIONS = ('.js', '.css', '.json', '.html', '.svg', '.txt', '.map', '.webmanifest')
+_VARIANT_SUFFIXES = ((BROTLI, '.br'), (GZIP, '.gz'))
+
+# brotli è opzionale e viene importato solo se installato
+BROTLI_AVAILABLE = importlib.util.find_spec('brotli') is not None
+_brotli = None
+
+_stats: Dict[str, Dict[str, Any]] = {}
+_stats_lock = threading.Lock()
+
+
+def _import_brotli():
+    global _brotli
+    if _brotli is None:
+        _brotli = importlib.import_module('brotli')
+    return _brotli
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Codifica da usare secondo Accept-Encoding (werkzeug MIMEAccept/Accept), None se nessuna"""
+    gzip_quality = accept_encodings.quality(GZIP)
+    if BROTLI_AVAILABLE:
+        brotli_quality = accept_encodings.quality(BROTLI)
+        if brotli_quality > 0 and brotli_quality >= gzip_quality:
+            return BROTLI
+    return GZIP if gzip_quality > 0 else None
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == BROTLI:
+        return _import_brotli().compress(data, quality=RESPONSE_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=RESPONSE_COMPRESS_LEVEL, mtime=0)
+
+
+class _StreamCompressor:
+    """Interfaccia comune (compress/flush) per zlib in formato gzip e brotli"""
+
+    def __init__(self, encoding: str):
+        if encoding == BROTLI:
+            compressor = _import_brotli().Compressor(quality=RESPONSE_BROTLI_QUALITY)
+            self.compress = compressor.process
+            self.flush = compressor.finish
+        else:
+            compressor = zlib.compressobj(RESPONSE_COMPRESS_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+            self.compress = compressor.compress
+            self.flush = compressor.flush
+
+
+def _record(route: str, encoding: Optional[str], bytes_in: int, bytes_out: int) -> None:
+    with _stats_lock:
+        stats = _stats.get(route)
+        if stats is None:
+            stats = _stats[route] = {'responses': 0, 'compressed': 0, 'bytes_in': 0, 'bytes_out': 0, 'encodings': {}}
+        stats['responses'] += 1
+        stats['bytes_in'] += bytes_in
+        stats['bytes_out'] += bytes_out
+        if encoding is not None:
+            stats['compressed'] += 1
+            stats['encodings'][encoding] = stats['encodings'].get(encoding, 0) + 1
+
+
+def _iter_compressed(chunks: Iterable[Any], encoding: str, route: str) -> Iterator[bytes]:
+    """Comprime un body a blocchi; le statistiche sono registrate a fine invio"""
+    compressor = _StreamCompressor(encoding)
+    bytes_in = bytes_out = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if not chunk:
+                continue
+            bytes_in += len(chunk)
+            data = compressor.compress(chunk)
+            if data:
+                bytes_out += len(data)
+                yield data
+        tail = compressor.flush()
+        if tail:
+            bytes_out += len(tail)
+            yield tail
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+        _record(route, encoding, bytes_in, bytes_out)
+
+
+def _slices(data: bytes) -> Iterator[memoryview]:
+    view = memoryview(data)
+    for start in range(0, len(view), _STREAM_CHUNK_SIZE):
+        yield view[start:start + _STREAM_CHUNK_SIZE]
+
+
+def _set_encoded(response, encoding: str) -> None:
+    response.headers['Content-Encoding'] = encoding
+    # Il contenuto cambia con la codifica: l'ETag forte diventa debole (confronto If-None-Match debole)
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    # Gli intervalli si riferirebbero al contenuto non compresso
+    response.headers.pop('Accept-Ranges', None)
+
+
+def compress_response(response, accept_encodings, route: str):
+    """Comprime la risposta se il client lo accetta e il contenuto è testuale e abbastanza grande"""
+    if (not RESPONSE_COMPRESSION or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers or 'Content-Range' in response.headers
+            or 'no-transform' in response.headers.get('Cache-Control', '')):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+
+    if response.is_streamed:
+        if encoding is None:
+            return response
+        response.response = _iter_compressed(response.response, encoding, route)
+        response.headers.pop('Content-Length', None)
+        _set_encoded(response, encoding)
+        return response
+
+    data = response.get_data()
+    if encoding is None or len(data) < RESPONSE_COMPRESS_MIN_BYTES:
+        _record(route, None, len(data), len(data))
+        return response
+
+    if len(data) >= RESPONSE_COMPRESS_STREAM_BYTES:
+        # Body grande: i primi blocchi compressi partono subito, nessuna copia compressa completa
+        response.response = _iter_compressed(_slices(data), encoding, route)
+        response.headers.pop('Content-Length', None)
+        _set_encoded(response, encoding)
+        return response
+
+    compressed = _compress(data, encoding)
+    if len(compressed) >= len(data):
+        _record(route, None, len(data), len(data))
+        return response
+    response.set_data(compressed)
+    _set_encoded(response, encoding)
+    _record(route, encoding, len(data), len(compressed))
+    return response
+
+
+def find_static_variants(filepath: str) -> Dict[str, str]:
+    """Varianti precompresse (codifica -> percorso) di un file statico ancora valide"""
+    variants = {}
+    try:
+        source_mtime = os.stat(filepath).st_mtime
+    except OSError:
+        return variants
+    for encoding, suffix in _VARIANT_SUFFIXES:
+        try:
+            # Una variante più vecchia del file originale non è più valida
+            if os.stat(filepath + suffix).st_mtime >= source_mtime:
+                variants[encoding] = filepath + suffix
+        except OSError:
+            pass
+    return variants
+
+
+def pick_encoding(encodings: Iterable[str], accept_encodings) -> Optional[str]:
+    """Tra le codifiche disponibili per un file, quella preferita dal client (None = originale)"""
+    best = None
+    best_quality = 0
+    for encoding, _ in _VARIANT_SUFFIXES:
+        if encoding in encodings:
+            quality = accept_encodings.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+    return best
+
+
+def record_static(route: str, encoding: Optional[str], bytes_in: int, bytes_out: int) -> None:
+    """Registra un file statico servito (eventualmente da una variante precompressa)"""
+    _record(route, encoding, bytes_in, bytes_out)
+
+
+def get_stats() -> Dict[str, Any]:
+    """Bytes prima/dopo la compressione per route e totali"""
+    with _stats_lock:
+        routes = {route: {**stats, 'encodings': dict(stats['encodings'])} for route, stats in _stats.items()}
+    for stats in routes.values():
+        stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else None
+    bytes_in = sum(stats['bytes_in'] for stats in routes.values())
+    bytes_out = sum(stats['bytes_out'] for stats in routes.values())
+    return {
+        'enabled': RESPONSE_COMPRESSION,
+        'brotli': BROTLI_AVAILABLE,
+        'min_bytes': RESPONSE_COMPRESS_MIN_BYTES,
+        'totals': {'bytes_in': bytes_in, 'bytes_out': bytes_out, 'bytes_saved': bytes_in - bytes_out},
+        'routes': routes
+    }
+
+
+def metrics_families():
+    """Bytes prima e dopo la compressione per route, nel formato dei collector di metrics.py"""
+    stats = get_stats()['routes']
+    bytes_in = [({'route': route}, route_stats['bytes_in']) for route, route_stats in sorted(stats.items())]
+    bytes_out = [({'route': route}, route_stats['bytes_out']) for route, route_stats in sorted(stats.items())]
+    compressed = [({'route': route, 'encoding': encoding}, count)
+                  for route, route_stats in sorted(stats.items())
+                  for encoding, count in sorted(route_stats['encodings'].items())]
+    return [
+        ('response_bytes_uncompressed_total', 'counter', 'Bytes delle risposte prima della compressione', bytes_in),
+        ('response_bytes_sent_total', 'counter', 'Bytes delle risposte inviati (dopo la compressione)', bytes_out),
+        ('responses_compressed_total', 'counter', 'Risposte compresse per codifica', compressed),
+    ]
+
+
+def precompress_static(folder: str) -> Dict[str, Dict[str, int]]:
+    """Crea file.gz (e file.br se brotli è installato) per i file testuali di una cartella"""
+    created = {}
+    for directory, _, filenames in os.walk(folder):
+        for filename in filenames:
+            if not filename.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            filepath = os.path.join(directory, filename)
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            if len(data) < RESPONSE_COMPRESS_MIN_BYTES:
+                continue
+            variants = {GZIP: gzip.compress(data, compresslevel=9, mtime=0)}
+            if BROTLI_AVAILABLE:
+                variants[BROTLI] = _import_brotli().compress(data, quality=11)
+            sizes = {}
+            for encoding, suffix in _VARIANT_SUFFIXES:
+                compressed = variants.get(encoding)
+                if compressed is not None and len(compressed) < len(data):
+                    with open(filepath + suffix, 'wb') as f:
+                        f.write(compressed)
+                    sizes[encoding] = len(compressed)
+            if sizes:
+                created[filepath] = {'size': len(data), **sizes}
+    return created
+
+
+if __name__ == '__main__':
+    for folder in sys.argv[1:] or ['static']:
+        for path, sizes in precompress_static(folder).items():
+            print(f"✅ {path}: {sizes}")
@@ -4,33 +4,62 @@ Usato per file > 4.5MB che superano il limite di Vercel.
 """
 import os
 import json
+import importlib.util
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, List
 import io
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 
-# Prova a importare boto3 (opzionale)
-try:
-    import boto3
-    from botocore.exceptions import ClientError, NoCredentialsError
-    BOTO3_AVAILABLE = True
-except ImportError:
-    BOTO3_AVAILABLE = False
-    boto3 = None
-    print("⚠️ boto3 non disponibile, upload S3 disabilitato")
+import metrics
+import app_logging
+
+log = app_logging.get_logger('s3')
+
+# boto3 è opzionale e viene importato solo alla creazione del client (riduce il cold start su Vercel)
+BOTO3_AVAILABLE = importlib.util.find_spec('boto3') is not None
+if not BOTO3_AVAILABLE:
+    log.warning("boto3 non disponibile, upload S3 disabilitato")
+boto3 = None
+ClientError = None
+NoCredentialsError = None
 
 # Configurazione AWS da variabili d'ambiente
 AWS_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
 AWS_REGION = os.environ.get('AWS_REGION', 'eu-west-1')
 S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME', 'chatpdfgpt')
+# Endpoint alternativo compatibile S3 (MinIO, moto server) per sviluppo e test
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None
 
 # Flag per usare S3 (solo se credenziali sono configurate)
 USE_S3 = bool(AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY and S3_BUCKET_NAME) and BOTO3_AVAILABLE
 
-# Client S3 (singleton)
+# Dimensione dei blocchi letti dal body S3 durante i download in streaming
+S3_STREAM_CHUNK_SIZE = int(os.environ.get('S3_STREAM_CHUNK_SIZE', str(256 * 1024)))
+
+# Client S3 (singleton, riutilizzato finché il container resta "caldo")
 _s3_client = None
 
 
+def _import_boto3() -> bool:
+    """Importa boto3 al primo utilizzo. Restituisce False se non è installato."""
+    global boto3, ClientError, NoCredentialsError
+    
+    if boto3 is not None:
+        return True
+    try:
+        import boto3 as _boto3
+        from botocore.exceptions import ClientError as _ClientError, NoCredentialsError as _NoCredentialsError
+    except ImportError:
+        return False
+    ClientError = _ClientError
+    NoCredentialsError = _NoCredentialsError
+    boto3 = _boto3
+    return True
+
+
 def get_s3_client():
     """Ottiene il client S3 (singleton)"""
     global _s3_client
@@ -39,30 +68,45 @@ def get_s3_client():
         return None
     
     if _s3_client is None:
+        if not _import_boto3():
+            return None
         try:
-            _s3_client = boto3.client(
+            from botocore.config import Config
+            # Connessioni sufficienti per i trasferimenti paralleli (più trasferimenti contemporanei)
+            config_options = {
+                'max_pool_connections': max(16, S3_TRANSFER_CONCURRENCY * 4),
+                'retries': {'max_attempts': 3, 'mode': 'standard'}
+            }
+            if S3_ENDPOINT_URL:
+                # MinIO/moto: indirizzamento path-style (http://host/bucket/key)
+                config_options['s3'] = {'addressing_style': 'path'}
+            client = boto3.client(
                 's3',
                 aws_access_key_id=AWS_ACCESS_KEY_ID,
                 aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                region_name=AWS_REGION
+                region_name=AWS_REGION,
+                endpoint_url=S3_ENDPOINT_URL,
+                config=Config(**config_options)
             )
             # Testa la connessione
-            _s3_client.head_bucket(Bucket=S3_BUCKET_NAME)
-            print(f"✅ Connesso a S3 bucket: {S3_BUCKET_NAME}")
+            client.head_bucket(Bucket=S3_BUCKET_NAME)
+            _s3_client = client
+            log.info("Connesso a S3 bucket: %s", S3_BUCKET_NAME)
         except NoCredentialsError:
-            print("❌ Credenziali AWS non valide")
+            log.error("Credenziali AWS non valide")
             return None
         except ClientError as e:
-            print(f"❌ Errore connessione S3: {e}")
+            log.error("Errore connessione S3: %s", e)
             return None
         except Exception as e:
-            print(f"❌ Errore imprevisto S3: {e}")
+            log.error("Errore imprevisto S3: %s", e)
             return None
     
     return _s3_client
 
 
-def upload_file_to_s3(file_bytes: bytes, file_id: str, filename: str) -> bool:
+# Non temporizzata: il trasferimento è già misurato da upload_to_s3 (stage s3_upload)
+def upload_file_to_s3(file_bytes: bytes, file_id: str, filename: str, content_encoding: Optional[str] = None) -> bool:
     """
     Carica un file su S3
     
@@ -70,6 +114,7 @@ def upload_file_to_s3(file_bytes: bytes, file_id: str, filename: str) -> bool:
         file_bytes: Contenuto del file in bytes
         file_id: ID univoco del file
         filename: Nome originale del file
+        content_encoding: es. 'gzip' se file_bytes è compresso (S3 lo restituisce come Content-Encoding)
     
     Returns:
         True se l'upload è riuscito, False altrimenti
@@ -81,25 +126,18 @@ def upload_file_to_s3(file_bytes: bytes, file_id: str, filename: str) -> bool:
     if s3_client is None:
         return False
     
-    try:
-        # Crea la chiave S3 (path nel bucket)
-        s3_key = f"csv_uploads/{file_id}/{filename}"
-        
-        # Carica il file
-        s3_client.put_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=s3_key,
-            Body=file_bytes,
-            ContentType='text/csv'
-        )
-        
-        print(f"✅ File caricato su S3: {s3_key}")
-        return True
-    except Exception as e:
-        print(f"❌ Errore upload S3: {e}")
+    # Crea la chiave S3 (path nel bucket)
+    s3_key = f"csv_uploads/{file_id}/{filename}"
+    
+    # Carica il file (un solo PUT se piccolo, altrimenti parti in parallelo)
+    if upload_to_s3(file_bytes, file_id, filename, content_encoding=content_encoding) is None:
         return False
+    
+    log.info("File caricato su S3: %s", s3_key)
+    return True
 
 
+@metrics.timed('s3_get')
 def download_file_from_s3(file_id: str, filename: str) -> Optional[bytes]:
     """
     Scarica un file da S3
@@ -121,25 +159,96 @@ def download_file_from_s3(file_id: str, filename: str) -> Optional[bytes]:
     try:
         s3_key = f"csv_uploads/{file_id}/{filename}"
         
-        response = s3_client.get_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=s3_key
-        )
-        
-        file_bytes = response['Body'].read()
-        print(f"✅ File scaricato da S3: {s3_key}")
+        # GET a intervalli in parallelo, parti ricomposte in ordine
+        chunks = iter_file_from_s3_parallel(file_id, filename)
+        if chunks is None:
+            log.error("File non trovato su S3: %s", s3_key)
+            return None
+        file_bytes = b''.join(chunks)
+        log.info("File scaricato da S3: %s", s3_key)
         return file_bytes
     except ClientError as e:
         if e.response['Error']['Code'] == 'NoSuchKey':
-            print(f"❌ File non trovato su S3: {s3_key}")
+            log.error("File non trovato su S3: %s", s3_key)
         else:
-            print(f"❌ Errore download S3: {e}")
+            log.error("Errore download S3: %s", e)
+        return None
+    except Exception as e:
+        log.error("Errore imprevisto download S3: %s", e)
+        return None
+
+
+@metrics.timed('s3_head')
+def get_file_size_from_s3(file_id: str, filename: str) -> Optional[int]:
+    """
+    Dimensione di un file su S3 (HEAD, senza scaricarlo)
+    
+    Args:
+        file_id: ID univoco del file
+        filename: Nome originale del file
+    
+    Returns:
+        Dimensione in bytes, None se il file non esiste o errore
+    """
+    if not USE_S3:
+        return None
+    
+    s3_client = get_s3_client()
+    if s3_client is None:
         return None
+    
+    try:
+        s3_key = f"csv_uploads/{file_id}/{filename}"
+        response = s3_client.head_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
+        return response['ContentLength']
     except Exception as e:
-        print(f"❌ Errore imprevisto download S3: {e}")
+        log.error("Errore lettura dimensione S3: %s", e)
         return None
 
 
+def iter_file_from_s3(file_id: str, filename: str, start: Optional[int] = None, end: Optional[int] = None,
+                      chunk_size: int = S3_STREAM_CHUNK_SIZE) -> Optional[Iterator[bytes]]:
+    """
+    Scarica un file da S3 in streaming, a blocchi (memoria O(chunk) invece dell'intero file)
+    
+    Args:
+        file_id: ID univoco del file
+        filename: Nome originale del file
+        start: primo byte richiesto (Range HTTP), None per l'intero file
+        end: ultimo byte richiesto, incluso
+        chunk_size: dimensione dei blocchi restituiti
+    
+    Returns:
+        Iteratore di blocchi di bytes, None se errore
+    """
+    if not USE_S3:
+        return None
+    
+    s3_client = get_s3_client()
+    if s3_client is None:
+        return None
+    
+    try:
+        s3_key = f"csv_uploads/{file_id}/{filename}"
+        params = {'Bucket': S3_BUCKET_NAME, 'Key': s3_key}
+        if start is not None:
+            params['Range'] = f"bytes={start}-{'' if end is None else end}"
+        body = s3_client.get_object(**params)['Body']
+    except Exception as e:
+        log.error("Errore download S3: %s", e)
+        return None
+    
+    def generate():
+        try:
+            for chunk in body.iter_chunks(chunk_size):
+                yield chunk
+        finally:
+            body.close()
+    
+    return generate()
+
+
+@metrics.timed('s3_delete')
 def delete_file_from_s3(file_id: str, filename: str) -> bool:
     """
     Elimina un file da S3
@@ -166,14 +275,15 @@ def delete_file_from_s3(file_id: str, filename: str) -> bool:
             Key=s3_key
         )
         
-        print(f"✅ File eliminato da S3: {s3_key}")
+        log.info("File eliminato da S3: %s", s3_key)
         return True
     except Exception as e:
-        print(f"❌ Errore eliminazione S3: {e}")
+        log.error("Errore eliminazione S3: %s", e)
         return False
 
 
-def generate_presigned_url(file_id: str, filename: str, expiration: int = 3600) -> Optional[str]:
+def generate_presigned_url(file_id: str, filename: str, expiration: int = 3600,
+                           download_name: Optional[str] = None) -> Optional[str]:
     """
     Genera un URL presigned per il download diretto del file
     
@@ -181,6 +291,7 @@ def generate_presigned_url(file_id: str, filename: str, expiration: int = 3600)
         file_id: ID univoco del file
         filename: Nome originale del file
         expiration: Tempo di scadenza in secondi (default: 1 ora)
+        download_name: se indicato, S3 risponde con Content-Disposition: attachment con questo nome
     
     Returns:
         URL presigned, None se errore
@@ -194,18 +305,376 @@ def generate_presigned_url(file_id: str, filename: str, expiration: int = 3600)
     
     try:
         s3_key = f"csv_uploads/{file_id}/{filename}"
+        params = {
+            'Bucket': S3_BUCKET_NAME,
+            'Key': s3_key
+        }
+        if download_name:
+            params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
+            params['ResponseContentType'] = 'text/csv'
         
         url = s3_client.generate_presigned_url(
             'get_object',
-            Params={
-                'Bucket': S3_BUCKET_NAME,
-                'Key': s3_key
-            },
+            Params=params,
             ExpiresIn=expiration
         )
         
         return url
     except Exception as e:
-        print(f"❌ Errore generazione URL presigned: {e}")
+        log.error("Errore generazione URL presigned: %s", e)
         return None
 
+
+# ==================== UPLOAD MULTIPART DIRETTO DAL BROWSER ====================
+
+# Dimensione minima delle parti imposta da S3 (tranne l'ultima) e numero massimo di parti
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_MAX_PARTS = 10000
+# Dimensione delle parti caricate dal browser
+S3_UPLOAD_PART_SIZE = max(int(os.environ.get('S3_UPLOAD_PART_SIZE', str(8 * 1024 * 1024))), S3_MIN_PART_SIZE)
+
+
+def multipart_part_size(file_size: int) -> int:
+    """Dimensione delle parti per un file (S3_UPLOAD_PART_SIZE, aumentata oltre 10000 parti)"""
+    part_size = S3_UPLOAD_PART_SIZE
+    while file_size > part_size * S3_MAX_PARTS:
+        part_size *= 2
+    return part_size
+
+
+def create_presigned_multipart_upload(file_id: str, filename: str, file_size: int,
+                                      expiration: int = 3600) -> Optional[Dict[str, Any]]:
+    """
+    Avvia un upload multipart e firma un URL PUT per ogni parte: il browser carica le parti
+    direttamente nel bucket, senza passare dalla funzione serverless
+    
+    Args:
+        file_id: ID univoco del file
+        filename: Nome originale del file
+        file_size: Dimensione del file in bytes
+        expiration: Validità degli URL in secondi
+    
+    Returns:
+        {'upload_id', 'part_size', 'urls'}, None se errore
+    """
+    if not USE_S3:
+        return None
+    
+    s3_client = get_s3_client()
+    if s3_client is None:
+        return None
+    
+    s3_key = f"csv_uploads/{file_id}/{filename}"
+    part_size = multipart_part_size(file_size)
+    part_count = max(1, -(-file_size // part_size))
+    try:
+        upload_id = s3_client.create_multipart_upload(
+            Bucket=S3_BUCKET_NAME,
+            Key=s3_key,
+            ContentType='text/csv'
+        )['UploadId']
+        urls = [
+            s3_client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': S3_BUCKET_NAME,
+                    'Key': s3_key,
+                    'UploadId': upload_id,
+                    'PartNumber': part_number
+                },
+                ExpiresIn=expiration
+            )
+            for part_number in range(1, part_count + 1)
+        ]
+        log.info("Upload multipart avviato su S3: %s (%s parti)", s3_key, part_count)
+        return {'upload_id': upload_id, 'part_size': part_size, 'urls': urls}
+    except Exception as e:
+        log.error("Errore avvio upload multipart S3: %s", e)
+        return None
+
+
+def complete_multipart_upload(file_id: str, filename: str, upload_id: str, parts: List[Dict[str, Any]]) -> bool:
+    """
+    Conclude un upload multipart
+    
+    Args:
+        parts: [{'PartNumber': n, 'ETag': '...'}] come restituiti dagli upload delle parti
+    """
+    s3_client = get_s3_client()
+    if s3_client is None:
+        return False
+    
+    try:
+        s3_key = f"csv_uploads/{file_id}/{filename}"
+        s3_client.complete_multipart_upload(
+            Bucket=S3_BUCKET_NAME,
+            Key=s3_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': sorted(
+                ({'PartNumber': int(part['PartNumber']), 'ETag': part['ETag']} for part in parts),
+                key=lambda part: part['PartNumber']
+            )}
+        )
+        log.info("Upload multipart completato su S3: %s", s3_key)
+        return True
+    except Exception as e:
+        log.error("Errore completamento upload multipart S3: %s", e)
+        return False
+
+
+def abort_multipart_upload(file_id: str, filename: str, upload_id: str) -> bool:
+    """Annulla un upload multipart (le parti già caricate vengono eliminate da S3)"""
+    s3_client = get_s3_client()
+    if s3_client is None:
+        return False
+    
+    try:
+        s3_key = f"csv_uploads/{file_id}/{filename}"
+        s3_client.abort_multipart_upload(Bucket=S3_BUCKET_NAME, Key=s3_key, UploadId=upload_id)
+        return True
+    except Exception as e:
+        log.error("Errore annullamento upload multipart S3: %s", e)
+        return False
+
+
+# ==================== TRASFERIMENTI PARALLELI ====================
+
+# Parti dei trasferimenti lato server (upload multipart e GET a intervalli) e richieste in parallelo
+S3_TRANSFER_PART_SIZE = max(int(os.environ.get('S3_TRANSFER_PART_SIZE', str(8 * 1024 * 1024))), S3_MIN_PART_SIZE)
+S3_TRANSFER_CONCURRENCY = max(int(os.environ.get('S3_TRANSFER_CONCURRENCY', '4')), 1)
+
+
+def _iter_source(source, chunk_size: int) -> Iterator[bytes]:
+    """Blocchi di bytes da bytes, file-like (read) o iteratore di blocchi"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for offset in range(0, len(view), chunk_size):
+            yield view[offset:offset + chunk_size]
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+    else:
+        for chunk in source:
+            yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """
+    File-like in scrittura che carica su S3 a parti man mano che i dati arrivano: fino a
+    `concurrency` parti vengono caricate in parallelo da un pool di thread, in memoria restano
+    al massimo concurrency + 1 parti. Se i dati stanno in una sola parte si usa un semplice
+    put_object. close() conclude l'upload, abort() lo annulla.
+    """
+    
+    def __init__(self, s3_client, file_id: str, filename: str, part_size: int = S3_TRANSFER_PART_SIZE,
+                 concurrency: int = S3_TRANSFER_CONCURRENCY, content_type: str = 'text/csv',
+                 content_encoding: Optional[str] = None):
+        self._client = s3_client
+        self.key = f"csv_uploads/{file_id}/{filename}"
+        self.part_size = max(part_size, S3_MIN_PART_SIZE)
+        self.concurrency = max(concurrency, 1)
+        self.content_type = content_type
+        self.content_encoding = content_encoding
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._part_count = 0
+        self._pending: 'deque[Future]' = deque()
+        self._parts: List[Dict[str, Any]] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+    
+    def _submit_part(self, body: bytes) -> None:
+        if self._upload_id is None:
+            self._upload_id = self._client.create_multipart_upload(
+                Bucket=S3_BUCKET_NAME, Key=self.key, **self._object_headers()
+            )['UploadId']
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='s3-upload')
+        # Backpressure: si attende la parte più vecchia prima di accodarne altre
+        while len(self._pending) >= self.concurrency:
+            self._parts.append(self._pending.popleft().result())
+        self._part_count += 1
+        self._pending.append(self._executor.submit(self._upload_part, self._part_count, body))
+    
+    def _object_headers(self) -> Dict[str, str]:
+        headers = {'ContentType': self.content_type}
+        if self.content_encoding:
+            headers['ContentEncoding'] = self.content_encoding
+        return headers
+    
+    def _upload_part(self, part_number: int, body: bytes) -> Dict[str, Any]:
+        response = self._client.upload_part(
+            Bucket=S3_BUCKET_NAME, Key=self.key, UploadId=self._upload_id, PartNumber=part_number, Body=body
+        )
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+    
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                # Tutto in una parte: un solo PUT
+                self._client.put_object(
+                    Bucket=S3_BUCKET_NAME, Key=self.key, Body=bytes(self._buffer), **self._object_headers()
+                )
+            else:
+                # L'ultima parte può essere più piccola del minimo
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+                while self._pending:
+                    self._parts.append(self._pending.popleft().result())
+                self._client.complete_multipart_upload(
+                    Bucket=S3_BUCKET_NAME, Key=self.key, UploadId=self._upload_id,
+                    MultipartUpload={'Parts': sorted(self._parts, key=lambda part: part['PartNumber'])}
+                )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._shutdown()
+            super().close()
+    
+    def abort(self) -> None:
+        if self.closed:
+            return
+        try:
+            for future in self._pending:
+                future.cancel()
+            self._shutdown()
+            if self._upload_id is not None:
+                self._client.abort_multipart_upload(Bucket=S3_BUCKET_NAME, Key=self.key, UploadId=self._upload_id)
+        finally:
+            self._buffer = bytearray()
+            self._pending.clear()
+            super().close()
+    
+    def _shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def open_s3_writer(file_id: str, filename: str, part_size: int = S3_TRANSFER_PART_SIZE,
+                   concurrency: int = S3_TRANSFER_CONCURRENCY,
+                   content_encoding: Optional[str] = None) -> Optional[S3MultipartWriter]:
+    """Apre un file S3 in scrittura (upload multipart parallelo in streaming)"""
+    if not USE_S3:
+        return None
+    
+    s3_client = get_s3_client()
+    if s3_client is None:
+        return None
+    
+    return S3MultipartWriter(s3_client, file_id, filename, part_size, concurrency, content_encoding=content_encoding)
+
+
+@metrics.timed('s3_upload')
+def upload_to_s3(source, file_id: str, filename: str, part_size: int = S3_TRANSFER_PART_SIZE,
+                 concurrency: int = S3_TRANSFER_CONCURRENCY, content_encoding: Optional[str] = None) -> Optional[int]:
+    """
+    Carica su S3 bytes, un file-like o un iteratore di blocchi, a parti in parallelo
+    
+    Returns:
+        Bytes caricati, None se errore
+    """
+    writer = open_s3_writer(file_id, filename, part_size, concurrency, content_encoding)
+    if writer is None:
+        return None
+    try:
+        for chunk in _iter_source(source, writer.part_size):
+            writer.write(chunk)
+        writer.close()
+        return writer.bytes_written
+    except Exception as e:
+        writer.abort()
+        log.error("Errore upload S3: %s", e)
+        return None
+
+
+def iter_file_from_s3_parallel(file_id: str, filename: str, part_size: int = S3_TRANSFER_PART_SIZE,
+                               concurrency: int = S3_TRANSFER_CONCURRENCY) -> Optional[Iterator[bytes]]:
+    """
+    Scarica un file da S3 con GET a intervalli concorrenti, restituendo le parti in ordine
+    (in memoria al massimo `concurrency` parti)
+    
+    Returns:
+        Iteratore di parti, None se il file non esiste o errore
+    """
+    s3_client = get_s3_client()
+    if s3_client is None:
+        return None
+    
+    total_size = get_file_size_from_s3(file_id, filename)
+    if total_size is None:
+        return None
+    s3_key = f"csv_uploads/{file_id}/{filename}"
+    
+    def fetch(start: int) -> bytes:
+        end = min(start + part_size, total_size) - 1
+        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=s3_key, Range=f'bytes={start}-{end}')
+        return response['Body'].read()
+    
+    def generate():
+        if total_size == 0:
+            return
+        offsets = iter(range(0, total_size, part_size))
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix='s3-download') as executor:
+            pending = deque(executor.submit(fetch, offset) for offset in itertools.islice(offsets, concurrency))
+            try:
+                while pending:
+                    chunk = pending.popleft().result()
+                    next_offset = next(offsets, None)
+                    if next_offset is not None:
+                        pending.append(executor.submit(fetch, next_offset))
+                    yield chunk
+            finally:
+                for future in pending:
+                    future.cancel()
+    
+    return generate()
+
+
+class _ChunkReader(io.RawIOBase):
+    """File-like in sola lettura sopra un iteratore di blocchi di bytes"""
+    
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        # Blocco corrente come memoryview + posizione: niente copie del resto della parte a ogni lettura
+        self._pending = memoryview(b'')
+        self._offset = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while self._offset >= len(self._pending):
+            chunk = next(self._chunks, b'')
+            if not chunk:
+                return 0
+            self._pending = memoryview(chunk)
+            self._offset = 0
+        size = min(len(buffer), len(self._pending) - self._offset)
+        buffer[:size] = self._pending[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+
+def open_s3_reader(file_id: str, filename: str) -> Optional[io.BufferedReader]:
+    """Apre un file S3 come stream binario in lettura (parti scaricate in parallelo man mano che viene letto)"""
+    chunks = iter_file_from_s3_parallel(file_id, filename)
+    if chunks is None:
+        return None
+    return io.BufferedReader(_ChunkReader(chunks), buffer_size=S3_STREAM_CHUNK_SIZE)
@@ -0,0 +1,98 @@
+"""
+Cache LRU in memoria per gli snapshot delle estrazioni già decodificati.
+Evita di rileggere e deserializzare l'intero documento da MongoDB (o dal file JSON)
+ad ogni richiesta: la validità di una voce è legata alla versione dell'estrazione
+(_id del documento MongoDB o nome file + mtime sul file system).
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+# Budget di memoria della cache (MB, misurato sulla dimensione serializzata degli snapshot)
+EXTRACTION_CACHE_MAX_MB = float(os.environ.get('EXTRACTION_CACHE_MAX_MB', '64'))
+# Numero massimo di snapshot in cache
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get('EXTRACTION_CACHE_MAX_ENTRIES', '64'))
+
+
+class SnapshotCache:
+    """Cache LRU thread-safe con budget in bytes e statistiche hit/miss/eviction"""
+
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[str, Dict[str, Any], int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, str], version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Restituisce lo snapshot in cache. Se version è indicata, deve coincidere con quella salvata."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (version is not None and entry[0] != version):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # Copia superficiale: i chiamanti aggiungono chiavi (from_json, message...) al risultato
+            return dict(entry[1])
+
+    def peek_version(self, key: Tuple[str, str]) -> Optional[str]:
+        """Versione dello snapshot in cache senza toccare statistiche e ordine LRU"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+    def put(self, key: Tuple[str, str], version: str, data: Dict[str, Any], size: int) -> None:
+        """Inserisce (o sostituisce) uno snapshot ed elimina i meno usati oltre il budget"""
+        if size > self.max_bytes:
+            # Troppo grande per la cache: non la svuotiamo per un solo snapshot
+            self.invalidate(key)
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._current_bytes -= old[2]
+            self._entries[key] = (version, data, size)
+            self._current_bytes += size
+            while self._entries and (self._current_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key: Tuple[str, str]) -> None:
+        """Rimuove uno snapshot dalla cache"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._current_bytes -= old[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiche della cache (per /api/extraction_cache_stats)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Istanza condivisa dal modulo storage
+extraction_cache = SnapshotCache(
+    max_bytes=int(EXTRACTION_CACHE_MAX_MB * 1024 * 1024),
+    max_entries=EXTRACTION_CACHE_MAX_ENTRIES
+)
@@ -1,61 +1,185 @@
 // Service Worker per Easyloading PWA
-const CACHE_NAME = 'easyloading-v1';
-const urlsToCache = [
-  '/',
-  '/static/logo.png',
-  '/static/icon-192.png',
-  '/static/icon-512.png',
-  '/static/manifest.json',
-  'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
-  'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/bootstrap-icons.css'
+// Strategie per tipo di richiesta:
+//  - file statici con hash nel nome e CDN versionati: cache-first (il contenuto non cambia mai)
+//  - elenco estrazioni e pagine principali: stale-while-revalidate
+//  - dati e pagine di uno snapshot (risultati, ricerca prodotti): rete, con la cache solo offline
+//    (i dati devono venire dallo stesso snapshot delle statistiche appena aggiornate)
+//  - upload, download, trasformazioni e tutte le richieste non GET: solo rete
+// Ogni cache ha un numero massimo di voci, con eliminazione delle meno usate (LRU).
+const CACHE_VERSION = 'v3';
+const CACHES = {
+  assets: { name: `easyloading-assets-${CACHE_VERSION}`, maxEntries: 60 },
+  data: { name: `easyloading-data-${CACHE_VERSION}`, maxEntries: 40 },
+  pages: { name: `easyloading-pages-${CACHE_VERSION}`, maxEntries: 20 }
+};
+const PRECACHE_PAGES = ['/'];
+
+// /static/logo.<hash>.png (static_assets.py)
+const FINGERPRINTED_ASSET = /^\/static\/.+\.[0-9a-f]{10}\.[a-z0-9]+$/;
+const VERSIONED_CDN = /^https:\/\/cdn\.jsdelivr\.net\/npm\/[^/]+@\d/;
+const NETWORK_ONLY = [
+  /^\/upload/,
+  /^\/api\/upload/,
+  /^\/api\/merge_chunks/,
+  /^\/api\/s3\//,
+  /^\/api\/download/,
+  /^\/download/,
+  /^\/api\/anagrafica\//,
+  /^\/api\/test_mongodb/,
+  /_stats$/
+];
+const STALE_WHILE_REVALIDATE_DATA = [
+  /^\/api\/list_extractions$/
 ];
+// Rispondono con ETag e no-cache: la rivalidazione costa un 304
+const NETWORK_FIRST_DATA = [
+  /^\/api\/risultati\//,
+  /^\/api\/product_search$/
+];
+const STALE_WHILE_REVALIDATE_PAGES = ['/', '/estrazioni', '/calendario_estrazione', '/estrazione_dati'];
 
-// Installazione del Service Worker
+// Installazione: precache della pagina principale, attivazione immediata
 self.addEventListener('install', (event) => {
   event.waitUntil(
-    caches.open(CACHE_NAME)
-      .then((cache) => {
-        console.log('Cache aperta');
-        return cache.addAll(urlsToCache);
-      })
+    caches.open(CACHES.pages.name)
+      .then((cache) => cache.addAll(PRECACHE_PAGES))
+      .catch(() => undefined)
+      .then(() => self.skipWaiting())
   );
 });
 
-// Attivazione del Service Worker
+// Attivazione: rimuove le cache delle versioni precedenti
 self.addEventListener('activate', (event) => {
+  const current = new Set(Object.values(CACHES).map((cache) => cache.name));
   event.waitUntil(
-    caches.keys().then((cacheNames) => {
-      return Promise.all(
-        cacheNames.map((cacheName) => {
-          if (cacheName !== CACHE_NAME) {
-            console.log('Rimozione vecchia cache:', cacheName);
-            return caches.delete(cacheName);
-          }
-        })
-      );
-    })
+    caches.keys()
+      .then((cacheNames) => Promise.all(
+        cacheNames
+          .filter((cacheName) => !current.has(cacheName))
+          .map((cacheName) => caches.delete(cacheName))
+      ))
+      .then(() => self.clients.claim())
   );
 });
 
-// Fetch event - Strategia: Network First, fallback su Cache
+function isCacheable(request, response) {
+  if (response && response.type === 'opaque') {
+    // CSS dei CDN caricati senza CORS: lo stato non è leggibile, ma l'URL versionato non cambia
+    return VERSIONED_CDN.test(request.url);
+  }
+  // Solo risposte complete (niente 206 o errori)
+  return response && response.status === 200 && (response.type === 'basic' || response.type === 'cors');
+}
+
+// Elimina le voci più vecchie oltre il limite (keys() è in ordine di inserimento)
+async function trimCache(cache, maxEntries) {
+  const keys = await cache.keys();
+  for (let i = 0; i < keys.length - maxEntries; i++) {
+    await cache.delete(keys[i]);
+  }
+}
+
+// Salva una risposta come voce più recente della cache
+async function store(config, request, response) {
+  const cache = await caches.open(config.name);
+  await cache.delete(request);
+  await cache.put(request, response);
+  await trimCache(cache, config.maxEntries);
+}
+
+async function cacheFirst(event, config) {
+  const cache = await caches.open(config.name);
+  const cached = await cache.match(event.request);
+  if (cached) {
+    // Voce usata: torna in fondo all'ordine LRU
+    event.waitUntil(store(config, event.request, cached.clone()));
+    return cached;
+  }
+  const response = await fetch(event.request);
+  if (isCacheable(event.request, response)) {
+    event.waitUntil(store(config, event.request, response.clone()));
+  }
+  return response;
+}
+
+async function staleWhileRevalidate(event, config) {
+  const cache = await caches.open(config.name);
+  const cached = await cache.match(event.request);
+  const network = fetch(event.request).then((response) => {
+    if (isCacheable(event.request, response)) {
+      return store(config, event.request, response.clone()).then(() => response);
+    }
+    return response;
+  });
+  if (cached) {
+    // Risposta immediata dalla cache, aggiornamento in background per la prossima volta
+    event.waitUntil(network.catch(() => undefined));
+    return cached;
+  }
+  return network;
+}
+
+async function networkFirst(event, config) {
+  try {
+    const response = await fetch(event.request);
+    if (isCacheable(event.request, response)) {
+      event.waitUntil(store(config, event.request, response.clone()));
+    }
+    return response;
+  } catch (error) {
+    const cached = await caches.match(event.request, { cacheName: config.name });
+    if (cached) {
+      return cached;
+    }
+    throw error;
+  }
+}
+
 self.addEventListener('fetch', (event) => {
-  event.respondWith(
-    fetch(event.request)
-      .then((response) => {
-        // Clona la risposta
-        const responseToCache = response.clone();
-        
-        caches.open(CACHE_NAME)
-          .then((cache) => {
-            cache.put(event.request, responseToCache);
-          });
-        
-        return response;
-      })
-      .catch(() => {
-        // Se la rete fallisce, prova dalla cache
-        return caches.match(event.request);
-      })
-  );
-});
+  const request = event.request;
+  if (request.method !== 'GET') {
+    return;
+  }
+  const url = new URL(request.url);
+
+  if (url.origin !== self.location.origin) {
+    if (VERSIONED_CDN.test(request.url)) {
+      event.respondWith(cacheFirst(event, CACHES.assets));
+    }
+    return;
+  }
 
+  const path = url.pathname;
+  if (NETWORK_ONLY.some((pattern) => pattern.test(path))) {
+    return;
+  }
+  if (FINGERPRINTED_ASSET.test(path)) {
+    event.respondWith(cacheFirst(event, CACHES.assets));
+    return;
+  }
+  if (STALE_WHILE_REVALIDATE_DATA.some((pattern) => pattern.test(path))) {
+    // fetch(url, { cache: 'no-cache' }) chiede dati aggiornati: rete, con la cache come riserva
+    const fresh = request.cache === 'no-cache' || request.cache === 'reload';
+    event.respondWith(fresh ? networkFirst(event, CACHES.data) : staleWhileRevalidate(event, CACHES.data));
+    return;
+  }
+  if (NETWORK_FIRST_DATA.some((pattern) => pattern.test(path))) {
+    event.respondWith(networkFirst(event, CACHES.data));
+    return;
+  }
+  if (request.mode === 'navigate') {
+    // Pagine dei risultati (anche /risultati/<data>?from_db=true) dalla rete: niente snapshot vecchi
+    // Ricarica forzata (request.cache === 'reload'): sempre dalla rete
+    if (request.cache !== 'reload' && STALE_WHILE_REVALIDATE_PAGES.includes(path)) {
+      event.respondWith(staleWhileRevalidate(event, CACHES.pages));
+    } else {
+      event.respondWith(networkFirst(event, CACHES.pages));
+    }
+    return;
+  }
+  if (path.startsWith('/static/') || path === '/manifest.json' || path === '/favicon.ico') {
+    // File statici senza hash: rivalidati in background
+    event.respondWith(staleWhileRevalidate(event, CACHES.assets));
+  }
+  // Tutto il resto (altre API) va in rete senza passare dalla cache
+});
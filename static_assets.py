@@ -0,0 +1,119 @@
+"""
+File statici con URL versionato (hash del contenuto nel nome).
+Alla prima richiesta la cartella static/ viene letta una sola volta: per ogni file si calcola
+l'hash del contenuto e url_for('static', filename='logo.png') diventa /static/logo.<hash>.png.
+Solo gli URL con hash ricevono Cache-Control immutable (a quell'URL corrisponde sempre lo
+stesso contenuto); gli URL senza hash (service worker, manifest, favicon) vengono rivalidati
+con ETag/If-None-Match. Le richieste non fanno stat né log: tutto è nel manifest in memoria.
+"""
+import os
+import hashlib
+import mimetypes
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import response_compression
+
+# Serviti sempre con il loro nome: l'URL del service worker deve restare stabile
+UNVERSIONED = frozenset({'sw.js'})
+
+_HASH_LENGTH = 10
+_VARIANT_EXTENSIONS = ('.gz', '.br')
+_MIMETYPES = {
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.webp': 'image/webp',
+    '.webmanifest': 'application/manifest+json'
+}
+
+
+class Asset(NamedTuple):
+    filename: str
+    path: str
+    url_name: str
+    digest: str
+    mimetype: str
+    size: int
+    # Varianti precompresse: codifica -> (percorso, dimensione)
+    variants: Dict[str, Tuple[str, int]]
+
+
+def _versioned_name(filename: str, digest: str) -> str:
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+class StaticAssets:
+    """Manifest dei file statici: nome originale <-> nome con hash"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._by_filename: Optional[Dict[str, Asset]] = None
+        self._by_url_name: Dict[str, Asset] = {}
+        self._fingerprint = ''
+        self._lock = threading.Lock()
+
+    def _scan(self) -> Dict[str, Asset]:
+        by_filename = {}
+        for directory, _, filenames in os.walk(self.folder):
+            for name in filenames:
+                if name.endswith(_VARIANT_EXTENSIONS):
+                    continue
+                path = os.path.join(directory, name)
+                filename = os.path.relpath(path, self.folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:_HASH_LENGTH]
+                ext = os.path.splitext(name)[1].lower()
+                variants = {
+                    encoding: (variant_path, os.path.getsize(variant_path))
+                    for encoding, variant_path in response_compression.find_static_variants(path).items()
+                }
+                by_filename[filename] = Asset(
+                    filename=filename,
+                    path=path,
+                    url_name=filename if filename in UNVERSIONED else _versioned_name(filename, digest),
+                    digest=digest,
+                    mimetype=_MIMETYPES.get(ext) or mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                    size=len(data),
+                    variants=variants
+                )
+        return by_filename
+
+    def _assets(self) -> Dict[str, Asset]:
+        by_filename = self._by_filename
+        if by_filename is None:
+            with self._lock:
+                by_filename = self._by_filename
+                if by_filename is None:
+                    by_filename = self._scan() if self.folder and os.path.isdir(self.folder) else {}
+                    self._by_url_name = {asset.url_name: asset for asset in by_filename.values()}
+                    self._fingerprint = hashlib.sha256(
+                        '|'.join(sorted(asset.url_name for asset in by_filename.values())).encode('utf-8')
+                    ).hexdigest()[:12]
+                    self._by_filename = by_filename
+        return by_filename
+
+    def url_name(self, filename: str) -> str:
+        """Nome da usare nell'URL (con hash); i file sconosciuti restano invariati"""
+        asset = self._assets().get(filename)
+        return asset.url_name if asset is not None else filename
+
+    def fingerprint(self) -> str:
+        """Hash del manifest (nomi con hash): cambia quando cambia il contenuto di un file statico"""
+        self._assets()
+        return self._fingerprint
+
+    def resolve(self, requested: str) -> Optional[Tuple[Asset, bool]]:
+        """(file, URL versionato) per un nome richiesto con o senza hash, None se sconosciuto"""
+        by_filename = self._assets()
+        asset = self._by_url_name.get(requested)
+        if asset is not None:
+            return asset, asset.url_name != asset.filename
+        asset = by_filename.get(requested)
+        if asset is not None:
+            return asset, False
+        return None
+
+    def all(self) -> List[Asset]:
+        return list(self._assets().values())
@@ -5,17 +5,71 @@ Su Render usa MongoDB, in locale usa file system.
 import os
 import json
 import base64
-from datetime import datetime
-from typing import Optional, Dict, List, Any
-
-# Prova a importare pymongo (opzionale)
-try:
-    from pymongo import MongoClient
-    from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
-    PYMONGO_AVAILABLE = True
-except ImportError:
-    PYMONGO_AVAILABLE = False
-    MongoClient = None
+import zlib
+import importlib.util
+import time
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from typing import Optional, Dict, List, Any, Tuple, Mapping
+
+from snapshot_cache import extraction_cache
+from compact_mapping import CompactMapping
+from circuit_breaker import CircuitBreaker
+import transform_compression
+import json_provider
+import metrics
+import app_logging
+
+log = app_logging.get_logger('storage')
+
+# pymongo è opzionale e viene importato solo alla prima connessione (riduce il cold start su Vercel)
+PYMONGO_AVAILABLE = importlib.util.find_spec('pymongo') is not None
+MongoClient = None
+ConnectionFailure = None
+mongo_timeout = None
+bson_decode = None
+CodecOptions = None
+RawBSONDocument = None
+TypeRegistry = None
+UpdateOne = None
+_pymongo_loaded = False
+
+
+def _import_pymongo() -> bool:
+    """Importa pymongo/bson al primo utilizzo. Restituisce False se non è installato."""
+    global PYMONGO_AVAILABLE, MongoClient, ConnectionFailure, mongo_timeout
+    global bson_decode, CodecOptions, RawBSONDocument, TypeRegistry, UpdateOne, _pymongo_loaded
+    
+    if _pymongo_loaded:
+        return True
+    try:
+        from pymongo import MongoClient as _MongoClient, UpdateOne as _UpdateOne
+        from pymongo.errors import ConnectionFailure as _ConnectionFailure
+        from bson import decode as _bson_decode
+        from bson.codec_options import CodecOptions as _CodecOptions, TypeRegistry as _TypeRegistry
+        from bson.raw_bson import RawBSONDocument as _RawBSONDocument
+    except ImportError:
+        PYMONGO_AVAILABLE = False
+        return False
+    try:
+        from pymongo import timeout as _mongo_timeout
+    except ImportError:
+        # pymongo < 4.2: restano validi solo i timeout del client
+        _mongo_timeout = None
+    
+    MongoClient = _MongoClient
+    ConnectionFailure = _ConnectionFailure
+    mongo_timeout = _mongo_timeout
+    bson_decode = _bson_decode
+    CodecOptions = _CodecOptions
+    RawBSONDocument = _RawBSONDocument
+    TypeRegistry = _TypeRegistry
+    UpdateOne = _UpdateOne
+    _pymongo_loaded = True
+    return True
+
 
 # Configurazione MongoDB da variabili d'ambiente
 MONGODB_URI = os.environ.get('MONGODB_URI')
@@ -23,129 +77,481 @@ MONGODB_DB_NAME = os.environ.get('MONGODB_DB_NAME', 'easyloading')
 
 # Flag per usare MongoDB (solo se URI è configurato)
 USE_MONGODB = bool(MONGODB_URI) and PYMONGO_AVAILABLE
+if not USE_MONGODB:
+    # Una sola volta all'avvio: ogni operazione di storage passa da get_mongo_client
+    log.warning("MongoDB disattivato, uso il file system locale. MONGODB_URI=%s, PYMONGO_AVAILABLE=%s",
+                bool(MONGODB_URI), PYMONGO_AVAILABLE)
+
+# Timeout del client: brevi, per ricadere velocemente sul file system se MongoDB non risponde
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '2500'))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGODB_CONNECT_TIMEOUT_MS', '2500'))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGODB_SOCKET_TIMEOUT_MS', '10000'))
+
+# Timeout per tipo di operazione (secondi)
+MONGODB_OPERATION_TIMEOUTS = {
+    'ping': float(os.environ.get('MONGODB_PING_TIMEOUT', '2.5')),
+    'read': float(os.environ.get('MONGODB_READ_TIMEOUT', '5')),
+    'write': float(os.environ.get('MONGODB_WRITE_TIMEOUT', '10')),
+    'bulk': float(os.environ.get('MONGODB_BULK_TIMEOUT', '25')),
+}
+
+# Circuit breaker: dopo N errori di connessione consecutivi MongoDB viene saltato per M secondi
+mongo_breaker = CircuitBreaker(
+    'mongodb',
+    failure_threshold=int(os.environ.get('MONGODB_BREAKER_FAILURES', '3')),
+    reset_timeout=float(os.environ.get('MONGODB_BREAKER_RESET_SECONDS', '30'))
+)
+_mongo_connect_lock = threading.Lock()
+
+# Stato del circuit breaker e della cache degli snapshot su /metrics (letti solo durante lo scrape)
+metrics.register_collector(metrics.breaker_collector(mongo_breaker))
+metrics.register_collector(metrics.snapshot_cache_collector(extraction_cache, 'extractions'))
+
+# Le estrazioni più vecchie di N giorni non vengono più aggiornate dall'API OData (immutabili)
+IMMUTABLE_AFTER_DAYS = 7
 
 # Client MongoDB (singleton)
 _mongo_client = None
 _mongo_db = None
 
+# Executor per le scritture "best effort" (backup locali, pulizia storico) fuori dalla richiesta.
+# Su Vercel i thread vengono congelati a risposta inviata: di default le scritture restano inline.
+_IS_SERVERLESS = bool(os.environ.get('VERCEL') or os.environ.get('VERCEL_ENV'))
+STORAGE_BACKGROUND_WORKERS = int(os.environ.get('STORAGE_BACKGROUND_WORKERS', '0' if _IS_SERVERLESS else '2'))
+# Numero massimo di operazioni in coda: oltre questo limite il chiamante esegue inline (backpressure)
+STORAGE_BACKGROUND_QUEUE = int(os.environ.get('STORAGE_BACKGROUND_QUEUE', '32'))
+
+_background_executor = None
+_background_slots = threading.BoundedSemaphore(max(STORAGE_BACKGROUND_QUEUE, 1))
+
+
+@contextlib.contextmanager
+def _operation_timeout(kind: str):
+    """Timeout per tipo di operazione (pymongo >= 4.2: pymongo.timeout), valido per tutto il blocco.
+    La durata del blocco è registrata come span mongo_<kind> su /metrics.
+    Un blocco completato senza errori azzera gli errori consecutivi del circuit breaker."""
+    with metrics.span(f"mongo_{kind}"):
+        if mongo_timeout is None:
+            yield
+        else:
+            with mongo_timeout(MONGODB_OPERATION_TIMEOUTS.get(kind, MONGODB_OPERATION_TIMEOUTS['read'])):
+                yield
+    mongo_breaker.record_success()
+
+
+def _is_connection_error(error: BaseException) -> bool:
+    """True per errori di rete/timeout (contano per il circuit breaker), False per errori applicativi"""
+    if ConnectionFailure is None:
+        return False
+    return isinstance(error, ConnectionFailure) or bool(getattr(error, 'timeout', False))
+
+
+def _record_mongo_error(error: BaseException) -> None:
+    """Registra un errore di un'operazione MongoDB nel circuit breaker"""
+    # Ogni errore registrato qui porta al fallback su file system
+    metrics.inc('storage_fallbacks_total', 'Operazioni MongoDB fallite con fallback su file system',
+                error=type(error).__name__)
+    if _is_connection_error(error):
+        mongo_breaker.record_failure(error)
+
+
+def _reset_mongo_client() -> None:
+    """Chiude il client (e i thread di monitoraggio) dopo una connessione fallita"""
+    global _mongo_client, _mongo_db
+    
+    if _mongo_client is not None:
+        try:
+            _mongo_client.close()
+        except Exception:
+            pass
+    _mongo_client = None
+    _mongo_db = None
+
 
 def get_mongo_client():
-    """Ottiene il client MongoDB (singleton)"""
+    """Ottiene il client MongoDB (singleton) protetto dal circuit breaker.
+    Con il circuito aperto restituisce subito (None, None) e i chiamanti usano il file system."""
     global _mongo_client, _mongo_db
     
     if not USE_MONGODB:
-        print(f"⚠️ USE_MONGODB è False. MONGODB_URI={bool(MONGODB_URI)}, PYMONGO_AVAILABLE={PYMONGO_AVAILABLE}")
+        log.debug("USE_MONGODB è False. MONGODB_URI=%s, PYMONGO_AVAILABLE=%s", bool(MONGODB_URI), PYMONGO_AVAILABLE)
         return None, None
     
-    if _mongo_client is None:
+    if not _import_pymongo():
+        return None, None
+    
+    if not mongo_breaker.allow_request():
+        return None, None
+    
+    # Client già connesso e circuito chiuso: nessun costo aggiuntivo
+    if _mongo_client is not None and not mongo_breaker.is_probing():
+        return _mongo_client, _mongo_db
+    
+    with _mongo_connect_lock:
+        # Un altro thread potrebbe aver appena completato la connessione
+        if _mongo_client is not None and not mongo_breaker.is_probing():
+            return _mongo_client, _mongo_db
         try:
-            print(f"🔄 Tentativo connessione MongoDB... URI length: {len(MONGODB_URI) if MONGODB_URI else 0}")
-            # Aumenta il timeout per dare più tempo alla connessione
-            _mongo_client = MongoClient(
-                MONGODB_URI, 
-                serverSelectionTimeoutMS=10000,  # 10 secondi invece di 5
-                connectTimeoutMS=10000,
-                socketTimeoutMS=10000
-            )
-            # Testa la connessione
-            print("🔄 Testing ping...")
-            _mongo_client.admin.command('ping')
-            print("✅ Ping riuscito!")
+            if _mongo_client is None:
+                log.info("Tentativo connessione MongoDB... URI length: %s", len(MONGODB_URI) if MONGODB_URI else 0)
+                _mongo_client = MongoClient(
+                    MONGODB_URI,
+                    serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                    connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+                    socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS
+                )
+            # Testa la connessione (anche come prova half-open del circuit breaker)
+            with _operation_timeout('ping'):
+                _mongo_client.admin.command('ping')
             _mongo_db = _mongo_client[MONGODB_DB_NAME]
-            print(f"✅ Connesso a MongoDB: {MONGODB_DB_NAME}")
+            mongo_breaker.record_success()
+            log.info("Connesso a MongoDB: %s", MONGODB_DB_NAME)
             return _mongo_client, _mongo_db
         except ConnectionFailure as e:
-            error_msg = f"⚠️ ConnectionFailure: {str(e)}"
-            print(error_msg)
-            _mongo_client = None
-            _mongo_db = None
-            return None, None
-        except ServerSelectionTimeoutError as e:
-            error_msg = f"⚠️ ServerSelectionTimeoutError: {str(e)}"
-            print(error_msg)
-            _mongo_client = None
-            _mongo_db = None
-            return None, None
+            # Include ServerSelectionTimeoutError
+            log.warning("%s: %s", type(e).__name__, str(e))
+            mongo_breaker.record_failure(e)
         except Exception as e:
             # Non stampare il traceback completo per errori di autenticazione comuni
             error_str = str(e)
             if 'authentication failed' in error_str.lower() or 'bad auth' in error_str.lower():
-                print(f"⚠️ Errore autenticazione MongoDB: credenziali non valide")
+                log.warning("Errore autenticazione MongoDB: credenziali non valide")
             else:
-                error_msg = f"⚠️ Errore MongoDB generico: {type(e).__name__}: {error_str}"
-                print(error_msg)
-            _mongo_client = None
-            _mongo_db = None
-            return None, None
+                log.warning("Errore MongoDB generico: %s: %s", type(e).__name__, error_str)
+            mongo_breaker.record_failure(e)
+        _reset_mongo_client()
+        return None, None
+
+
+def get_mongo_breaker_state() -> Dict[str, Any]:
+    """Stato del circuit breaker MongoDB (per /api/test_mongodb)"""
+    return mongo_breaker.snapshot()
+
+
+# ==================== OPERAZIONI IN BACKGROUND ====================
+
+def _get_background_executor() -> Optional[ThreadPoolExecutor]:
+    """Ottiene l'executor per le operazioni in background (singleton, None se disabilitato)"""
+    global _background_executor
+    
+    if STORAGE_BACKGROUND_WORKERS <= 0:
+        return None
     
-    return _mongo_client, _mongo_db
+    if _background_executor is None:
+        _background_executor = ThreadPoolExecutor(
+            max_workers=STORAGE_BACKGROUND_WORKERS,
+            thread_name_prefix='storage-bg'
+        )
+    return _background_executor
+
+
+def _run_best_effort(func, *args, **kwargs) -> None:
+    """Esegue un'operazione ignorando gli errori (sono scritture non critiche)"""
+    try:
+        func(*args, **kwargs)
+    except Exception as e:
+        log.warning("Operazione in background %s fallita: %s", getattr(func, '__name__', func), e)
+
+
+def run_in_background(func, *args, **kwargs) -> bool:
+    """Esegue un'operazione non critica fuori dal percorso della richiesta.
+    Se l'executor è disabilitato o la coda è piena, la esegue inline (backpressure).
+    Restituisce True se l'operazione è stata accodata."""
+    executor = _get_background_executor()
+    
+    if executor is not None and _background_slots.acquire(blocking=False):
+        def task():
+            try:
+                _run_best_effort(func, *args, **kwargs)
+            finally:
+                _background_slots.release()
+        try:
+            executor.submit(task)
+            return True
+        except RuntimeError:
+            # Executor chiuso (shutdown dell'interprete)
+            _background_slots.release()
+    
+    _run_best_effort(func, *args, **kwargs)
+    return False
+
+
+def _write_json_file(filepath: str, data: Any) -> None:
+    """Scrive un file JSON (crea la directory se necessario)"""
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    json_provider.dump_file(data, filepath)
 
 
 # ==================== ANAGRAFICA ====================
 
-def save_anagrafica(data: Dict[str, str], local_file: str = 'anagrafica.json') -> bool:
-    """Salva l'anagrafica in MongoDB o file system locale"""
+# Un documento per articolo ({itm, cod, v}) con indice univoco su itm: i merge scrivono solo le righe cambiate
+ANAGRAFICA_ITEMS_COLLECTION = 'anagrafica_items'
+# I salvataggi completi scrivono qui e poi rinominano: i lettori non vedono mai una collezione a metà
+ANAGRAFICA_STAGING_COLLECTION = 'anagrafica_items_staging'
+# Operazioni per singola bulk_write (limita la memoria delle richieste con anagrafiche grandi)
+ANAGRAFICA_BATCH_SIZE = int(os.environ.get('ANAGRAFICA_BATCH_SIZE', '5000'))
+_anagrafica_index_ready = False
+
+
+def _anagrafica_binary_file(local_file: str) -> str:
+    """File locale in formato compatto (anagrafica.json -> anagrafica.bin)"""
+    return os.path.splitext(local_file)[0] + '.bin'
+
+
+def _write_anagrafica_file(local_file: str, data: Mapping[str, str]) -> None:
+    """Salva l'anagrafica su file nel formato binario compatto invece del JSON indentato"""
+    CompactMapping.from_dict(data).save(_anagrafica_binary_file(local_file))
+
+
+def _ensure_anagrafica_index(collection) -> None:
+    """Crea (una volta per processo) l'indice univoco sul codice ITM"""
+    global _anagrafica_index_ready
+    if not _anagrafica_index_ready:
+        collection.create_index('itm', unique=True)
+        _anagrafica_index_ready = True
+
+
+def _bulk_upsert_anagrafica(collection, items: Dict[str, str], version: int) -> None:
+    """Upsert a blocchi di ANAGRAFICA_BATCH_SIZE articoli, marcati con la versione del salvataggio"""
+    operations = []
+    for itm_code, cod_code in items.items():
+        operations.append(UpdateOne({'itm': itm_code}, {'$set': {'cod': cod_code, 'v': version}}, upsert=True))
+        if len(operations) >= ANAGRAFICA_BATCH_SIZE:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def save_anagrafica(data: Dict[str, str], local_file: str = 'anagrafica.json',
+                    changed: Optional[Dict[str, str]] = None) -> bool:
+    """Salva l'anagrafica in MongoDB o file system locale
+    
+    Args:
+        data: anagrafica completa (ITM_0 -> COD_0)
+        local_file: file JSON di backup/fallback
+        changed: solo le righe nuove o modificate (merge); se None l'anagrafica viene sostituita
+    """
     client, db = get_mongo_client()
     
     if client is not None and db is not None:
         try:
-            # Salva in MongoDB
-            collection = db['anagrafica']
-            # Sostituisci tutto il documento
-            collection.delete_many({})
-            if data:
-                collection.insert_one({'data': data, 'type': 'anagrafica'})
-            print(f"✅ Anagrafica salvata in MongoDB")
+            with _operation_timeout('bulk'):
+                collection = db[ANAGRAFICA_ITEMS_COLLECTION]
+                meta = db['anagrafica']
+                _ensure_anagrafica_index(collection)
+                version = time.time_ns()
+                
+                # Senza documento di versione la collezione per articolo non è ancora popolata
+                # (prima esecuzione o dati nel vecchio documento unico): serve un salvataggio completo
+                full_save = changed is None or meta.find_one({'type': 'anagrafica_version'}, {'_id': 1}) is None
+                if full_save:
+                    # Collezione di appoggio (eventuali resti di un salvataggio interrotto vengono scartati),
+                    # poi sostituzione atomica di quella letta da load_anagrafica
+                    staging = db[ANAGRAFICA_STAGING_COLLECTION]
+                    staging.drop()
+                    staging.create_index('itm', unique=True)
+                    _bulk_upsert_anagrafica(staging, data, version)
+                    staging.rename(ANAGRAFICA_ITEMS_COLLECTION, dropTarget=True)
+                    # Vecchio documento unico
+                    meta.delete_many({'type': 'anagrafica'})
+                else:
+                    _bulk_upsert_anagrafica(collection, changed, version)
+                
+                # Contatore di versione scritto per ultimo: gli altri worker rilevano l'aggiornamento
+                # con una sola lettura e solo a dati completi
+                meta.update_one(
+                    {'type': 'anagrafica_version'},
+                    {'$set': {'version': version, 'count': len(data), 'updated_at': datetime.now()}},
+                    upsert=True
+                )
+                written = len(data) if full_save else len(changed)
+                log.info("Anagrafica salvata in MongoDB (%s articoli scritti su %s)", written, len(data))
             
-            # Salva anche in locale come backup
-            try:
-                with open(local_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-            except:
-                pass  # Ignora errori di scrittura locale su Render
+            # Salva anche in locale come backup (fuori dalla richiesta, errori ignorati)
+            run_in_background(_write_anagrafica_file, local_file, data)
             
             return True
         except Exception as e:
-            print(f"⚠️ Errore salvataggio MongoDB: {e}. Provo file system locale.")
+            _record_mongo_error(e)
+            log.warning("Errore salvataggio MongoDB: %s. Provo file system locale.", e)
     
     # Fallback: file system locale
     try:
-        with open(local_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        _write_anagrafica_file(local_file, data)
         return True
     except Exception as e:
-        print(f"❌ Errore salvataggio anagrafica: {e}")
+        log.error("Errore salvataggio anagrafica: %s", e)
         return False
 
 
-def load_anagrafica(local_file: str = 'anagrafica.json') -> Optional[Dict[str, str]]:
+def get_anagrafica_version() -> Optional[int]:
+    """Versione dell'anagrafica in MongoDB (0 = nessuna, None = MongoDB non disponibile)"""
+    client, db = get_mongo_client()
+    if client is None or db is None:
+        return None
+    try:
+        with _operation_timeout('read'):
+            doc = db['anagrafica'].find_one({'type': 'anagrafica_version'}, {'version': 1})
+            if doc is not None:
+                return doc.get('version', 1)
+            # Vecchio documento unico senza contatore
+            return 1 if db['anagrafica'].find_one({'type': 'anagrafica'}, {'_id': 1}) else 0
+    except Exception as e:
+        _record_mongo_error(e)
+        log.warning("Errore lettura versione anagrafica: %s", e)
+        return None
+
+
+def load_anagrafica(local_file: str = 'anagrafica.json') -> Optional[Mapping[str, str]]:
     """Carica l'anagrafica da MongoDB o file system locale"""
     client, db = get_mongo_client()
     
     if client is not None and db is not None:
         try:
-            # Carica da MongoDB
-            collection = db['anagrafica']
-            doc = collection.find_one({'type': 'anagrafica'})
-            if doc and 'data' in doc:
-                print(f"✅ Anagrafica caricata da MongoDB ({len(doc['data'])} articoli)")
-                return doc['data']
+            with _operation_timeout('bulk'):
+                if db['anagrafica'].find_one({'type': 'anagrafica_version'}, {'_id': 1}) is not None:
+                    cursor = db[ANAGRAFICA_ITEMS_COLLECTION].find(
+                        {}, {'_id': 0, 'itm': 1, 'cod': 1}, batch_size=ANAGRAFICA_BATCH_SIZE
+                    )
+                    data = {doc['itm']: doc['cod'] for doc in cursor}
+                    if data:
+                        log.info("Anagrafica caricata da MongoDB (%s articoli)", len(data))
+                        return data
+                
+                # Compatibilità: vecchio formato a documento unico
+                doc = db['anagrafica'].find_one({'type': 'anagrafica'})
+                if doc and 'data' in doc:
+                    log.info("Anagrafica caricata da MongoDB (%s articoli, formato precedente)", len(doc['data']))
+                    return doc['data']
         except Exception as e:
-            print(f"⚠️ Errore caricamento MongoDB: {e}. Provo file system locale.")
+            _record_mongo_error(e)
+            log.warning("Errore caricamento MongoDB: %s. Provo file system locale.", e)
     
-    # Fallback: file system locale
+    # Fallback: file system locale (formato compatto, poi vecchio JSON)
+    binary_file = _anagrafica_binary_file(local_file)
+    if os.path.exists(binary_file):
+        try:
+            data = CompactMapping.load(binary_file, use_mmap=False)
+            log.info("Anagrafica caricata da file locale (%s articoli)", len(data))
+            return data
+        except Exception as e:
+            log.error("Errore caricamento anagrafica compatta: %s", e)
     if os.path.exists(local_file):
         try:
             with open(local_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                print(f"✅ Anagrafica caricata da file locale ({len(data)} articoli)")
+                log.info("Anagrafica caricata da file locale (%s articoli)", len(data))
                 return data
         except Exception as e:
-            print(f"❌ Errore caricamento anagrafica: {e}")
+            log.error("Errore caricamento anagrafica: %s", e)
     
     return None
 
 
+def get_anagrafica_file_version(local_file: str = 'anagrafica.json') -> Optional[int]:
+    """mtime (ns) del file locale dell'anagrafica (None se non esiste)"""
+    for path in (_anagrafica_binary_file(local_file), local_file):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+    return None
+
+
+# ==================== CHANGE SET ANAGRAFICA ====================
+
+# Numero di change set conservati (i più vecchi vengono eliminati)
+ANAGRAFICA_CHANGES_KEEP = int(os.environ.get('ANAGRAFICA_CHANGES_KEEP', '20'))
+
+
+def _changes_dir(uploads_dir: str) -> str:
+    return os.path.join(uploads_dir, 'anagrafica_changes')
+
+
+def _prune_anagrafica_changes_mongo(db) -> None:
+    collection = db['anagrafica_changes']
+    old_ids = [doc['_id'] for doc in collection.find({}, {'_id': 1}).sort('created_at', -1).skip(ANAGRAFICA_CHANGES_KEEP)]
+    if old_ids:
+        collection.delete_many({'_id': {'$in': old_ids}})
+
+
+def _prune_anagrafica_changes_files(directory: str) -> None:
+    filenames = sorted(name for name in os.listdir(directory) if name.endswith('.json.z'))
+    for filename in filenames[:-ANAGRAFICA_CHANGES_KEEP]:
+        os.remove(os.path.join(directory, filename))
+
+
+def save_anagrafica_changes(change_id: str, blob: bytes, summary: Dict[str, Any], uploads_dir: str) -> bool:
+    """Salva un change set compresso (anagrafica_diff.ChangeSet.to_bytes) in MongoDB o file system locale"""
+    client, db = get_mongo_client()
+    
+    if client is not None and db is not None:
+        try:
+            with _operation_timeout('write'):
+                db['anagrafica_changes'].insert_one({
+                    '_id': change_id,
+                    'created_at': datetime.now(),
+                    'summary': summary,
+                    'data': blob
+                })
+            run_in_background(_prune_anagrafica_changes_mongo, db)
+            return True
+        except Exception as e:
+            _record_mongo_error(e)
+            log.warning("Errore salvataggio change set in MongoDB: %s. Provo file system locale.", e)
+    
+    # Fallback: file system locale
+    try:
+        directory = _changes_dir(uploads_dir)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'{change_id}.json.z'), 'wb') as f:
+            f.write(blob)
+        run_in_background(_prune_anagrafica_changes_files, directory)
+        return True
+    except Exception as e:
+        log.error("Errore salvataggio change set: %s", e)
+        return False
+
+
+def load_anagrafica_changes(change_id: Optional[str], uploads_dir: str) -> Optional[bytes]:
+    """Carica un change set compresso (il più recente se change_id è None)"""
+    client, db = get_mongo_client()
+    
+    if client is not None and db is not None:
+        try:
+            with _operation_timeout('read'):
+                collection = db['anagrafica_changes']
+                if change_id:
+                    doc = collection.find_one({'_id': change_id}, {'data': 1})
+                else:
+                    doc = collection.find_one({}, {'data': 1}, sort=[('created_at', -1)])
+                if doc is not None:
+                    return bytes(doc['data'])
+        except Exception as e:
+            _record_mongo_error(e)
+            log.warning("Errore caricamento change set da MongoDB: %s. Provo file system locale.", e)
+    
+    # Fallback: file system locale (i nomi iniziano con data e ora: il più recente è l'ultimo)
+    directory = _changes_dir(uploads_dir)
+    if not os.path.isdir(directory):
+        return None
+    if change_id:
+        filename = f'{os.path.basename(change_id)}.json.z'
+    else:
+        filenames = sorted(name for name in os.listdir(directory) if name.endswith('.json.z'))
+        if not filenames:
+            return None
+        filename = filenames[-1]
+    try:
+        with open(os.path.join(directory, filename), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
 # ==================== CONFIG OData ====================
 
 def save_odata_config(config: Dict[str, Any], local_file: str = 'odata_config.json') -> bool:
@@ -154,23 +560,27 @@ def save_odata_config(config: Dict[str, Any], local_file: str = 'odata_config.js
     
     if client is not None and db is not None:
         try:
-            # Salva in MongoDB
-            collection = db['config']
-            # Sostituisci tutto il documento
-            collection.delete_many({'type': 'odata_config'})
-            collection.insert_one({'type': 'odata_config', 'config': config})
-            print(f"✅ Config OData salvata in MongoDB")
+            with _operation_timeout('write'):
+                # Salva in MongoDB (documento unico, con versione per gli altri worker)
+                collection = db['config']
+                collection.update_one(
+                    {'type': 'odata_config'},
+                    {'$set': {
+                        'config': config,
+                        'version': time.time_ns(),
+                        'updated_at': datetime.now().isoformat()
+                    }},
+                    upsert=True
+                )
+                log.info("Config OData salvata in MongoDB")
             
-            # Salva anche in locale come backup
-            try:
-                with open(local_file, 'w', encoding='utf-8') as f:
-                    json.dump(config, f, ensure_ascii=False, indent=2)
-            except:
-                pass
+                # Salva anche in locale come backup (fuori dalla richiesta, errori ignorati)
+                run_in_background(_write_json_file, local_file, config)
             
-            return True
+                return True
         except Exception as e:
-            print(f"⚠️ Errore salvataggio MongoDB: {e}. Provo file system locale.")
+            _record_mongo_error(e)
+            log.warning("Errore salvataggio MongoDB: %s. Provo file system locale.", e)
     
     # Fallback: file system locale
     try:
@@ -178,41 +588,55 @@ def save_odata_config(config: Dict[str, Any], local_file: str = 'odata_config.js
             json.dump(config, f, ensure_ascii=False, indent=2)
         return True
     except Exception as e:
-        print(f"❌ Errore salvataggio config OData: {e}")
+        log.error("Errore salvataggio config OData: %s", e)
         return False
 
 
-def load_odata_config(local_file: str = 'odata_config.json') -> Optional[Dict[str, Any]]:
-    """Carica la configurazione OData da file system locale o MongoDB"""
-    # Prova prima il file system locale (più veloce, non richiede connessione)
-    if os.path.exists(local_file):
+def get_odata_config_version() -> Optional[int]:
+    """Versione della configurazione OData in MongoDB senza caricarla.
+    None = MongoDB non disponibile, 0 = nessuna configurazione salvata."""
+    client, db = get_mongo_client()
+    
+    if client is not None and db is not None:
         try:
-            with open(local_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                print(f"✅ Config OData caricata da file locale")
-                return config
+            with _operation_timeout('read'):
+                doc = db['config'].find_one({'type': 'odata_config'}, projection={'version': 1})
+                if doc is None:
+                    return 0
+                # Documenti salvati prima del versionamento
+                return doc.get('version', 1)
         except Exception as e:
-            print(f"⚠️ Errore caricamento config OData da file: {e}. Provo MongoDB.")
+            _record_mongo_error(e)
+            log.warning("Errore lettura versione config OData: %s", e)
     
-    # Fallback: MongoDB (solo se il file locale non esiste)
+    return None
+
+
+def load_odata_config_from_mongo() -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+    """Carica la configurazione OData da MongoDB: (config, versione)"""
     client, db = get_mongo_client()
     
     if client is not None and db is not None:
         try:
-            # Carica da MongoDB
-            collection = db['config']
-            doc = collection.find_one({'type': 'odata_config'})
-            if doc and 'config' in doc:
-                print(f"✅ Config OData caricata da MongoDB")
-                return doc['config']
+            with _operation_timeout('read'):
+                doc = db['config'].find_one({'type': 'odata_config'})
+                if doc and 'config' in doc:
+                    return doc['config'], doc.get('version', 1)
+                return None, 0
         except Exception as e:
-            print(f"⚠️ Errore caricamento MongoDB: {e}")
+            _record_mongo_error(e)
+            log.warning("Errore caricamento config OData da MongoDB: %s", e)
     
-    return None
+    return None, None
 
 
 # ==================== ESTRAZIONI JSON ====================
 
+def _snapshot_codec_options():
+    """Codec BSON per la scrittura degli snapshot (int64/float64/bool_ di numpy -> tipi Python)"""
+    return CodecOptions(type_registry=TypeRegistry(fallback_encoder=json_provider.to_builtin))
+
+
 def save_extraction(date_str: str, site: str, data: Dict[str, Any], uploads_dir: str) -> Optional[str]:
     """Salva un'estrazione in MongoDB o file system locale"""
     client, db = get_mongo_client()
@@ -231,62 +655,54 @@ def save_extraction(date_str: str, site: str, data: Dict[str, Any], uploads_dir:
     
     if client is not None and db is not None:
         try:
-            # Salva in MongoDB
-            collection = db['extractions']
-            # Rimuovi estrazioni più vecchie per la stessa data (mantieni solo la più recente)
-            collection.delete_many({'date': date_str, 'site': site})
-            # Inserisci la nuova estrazione
-            extraction_data['_id'] = f"{date_str}_{site}_{timestamp}"
-            collection.insert_one(extraction_data)
-            print(f"✅ Estrazione {date_str} salvata in MongoDB")
+            with _operation_timeout('write'):
+                # Salva in MongoDB
+                # Gli scalari numpy/pandas dell'analisi sono convertiti dal fallback encoder BSON
+                collection = db.get_collection('extractions', codec_options=_snapshot_codec_options())
+                # Inserisci la nuova estrazione
+                extraction_id = f"{date_str}_{site}_{timestamp}"
+                extraction_data['_id'] = extraction_id
+                collection.replace_one({'_id': extraction_id}, extraction_data, upsert=True)
+                extraction_cache.invalidate((date_str, site))
+                log.info("Estrazione %s salvata in MongoDB", date_str)
             
-            # Salva anche in locale come backup (se possibile)
-            try:
-                os.makedirs(uploads_dir, exist_ok=True)
-                filepath = os.path.join(uploads_dir, filename)
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(extraction_data, f, ensure_ascii=False, indent=2)
-            except:
-                pass  # Ignora errori su Render
+                # Rimuovi estrazioni più vecchie per la stessa data (mantieni solo la più recente).
+                # Le letture prendono sempre la più recente, quindi la pulizia può avvenire dopo:
+                # solo documenti precedenti a questo, un salvataggio successivo non viene toccato.
+                run_in_background(
+                    collection.delete_many,
+                    {'date': date_str, 'site': site, 'extraction_date': {'$lt': extraction_data['extraction_date']}}
+                )
+                # Salva anche in locale come backup (se possibile, errori ignorati su Render)
+                run_in_background(_write_json_file, os.path.join(uploads_dir, filename), extraction_data)
             
-            return filename
+                return filename
         except Exception as e:
-            print(f"⚠️ Errore salvataggio MongoDB: {e}. Provo file system locale.")
+            _record_mongo_error(e)
+            log.warning("Errore salvataggio MongoDB: %s. Provo file system locale.", e)
     
     # Fallback: file system locale
     try:
         os.makedirs(uploads_dir, exist_ok=True)
-        filepath = os.path.join(uploads_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(extraction_data, f, ensure_ascii=False, indent=2)
+        json_provider.dump_file(extraction_data, os.path.join(uploads_dir, filename))
+        extraction_cache.invalidate((date_str, site))
         return filename
     except Exception as e:
-        print(f"❌ Errore salvataggio estrazione: {e}")
+        log.error("Errore salvataggio estrazione: %s", e)
         return None
 
 
-def load_extraction(date_str: str, site: str, uploads_dir: str) -> Optional[Dict[str, Any]]:
-    """Carica un'estrazione da MongoDB o file system locale"""
-    client, db = get_mongo_client()
-    
-    if client is not None and db is not None:
-        try:
-            # Carica da MongoDB
-            collection = db['extractions']
-            # Trova l'estrazione più recente per questa data e sito
-            doc = collection.find_one(
-                {'date': date_str, 'site': site},
-                sort=[('extraction_date', -1)]
-            )
-            if doc:
-                # Rimuovi _id prima di restituire
-                doc.pop('_id', None)
-                print(f"✅ Estrazione {date_str} caricata da MongoDB")
-                return doc
-        except Exception as e:
-            print(f"⚠️ Errore caricamento MongoDB: {e}. Provo file system locale.")
-    
-    # Fallback: file system locale
+def _is_historic_date(date_str: str) -> bool:
+    """True se l'estrazione è oltre IMMUTABLE_AFTER_DAYS giorni (dati non più modificabili)"""
+    try:
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return False
+    return (date.today() - target_date).days > IMMUTABLE_AFTER_DAYS
+
+
+def _find_latest_extraction_file(date_str: str, uploads_dir: str) -> Optional[Tuple[str, float, str]]:
+    """Trova il file JSON più recente per una data: (filepath, mtime, filename)"""
     date_pattern = date_str.replace('-', '')
     matching_files = []
     
@@ -300,20 +716,209 @@ def load_extraction(date_str: str, site: str, uploads_dir: str) -> Optional[Dict
                         matching_files.append((filepath, mtime, filename))
                     except:
                         continue
-        
-        if matching_files:
-            matching_files.sort(key=lambda x: x[1], reverse=True)
-            filepath, _, filename = matching_files[0]
+    
+    if not matching_files:
+        return None
+    matching_files.sort(key=lambda x: x[1], reverse=True)
+    return matching_files[0]
+
+
+def get_extraction_version(date_str: str, site: str, uploads_dir: str) -> Optional[str]:
+    """Versione dell'estrazione più recente per data e sito, senza caricarne il contenuto.
+    MongoDB: _id del documento (cambia ad ogni salvataggio); file system: nome file + mtime."""
+    client, db = get_mongo_client()
+    
+    if client is not None and db is not None:
+        try:
+            with _operation_timeout('read'):
+                doc = db['extractions'].find_one(
+                    {'date': date_str, 'site': site},
+                    projection={'_id': 1},
+                    sort=[('extraction_date', -1)]
+                )
+                if doc:
+                    return f"mongo:{doc['_id']}"
+        except Exception as e:
+            _record_mongo_error(e)
+            log.warning("Errore lettura versione estrazione MongoDB: %s", e)
+    
+    latest = _find_latest_extraction_file(date_str, uploads_dir)
+    if latest:
+        _, mtime, filename = latest
+        return f"file:{filename}:{mtime}"
+    
+    return None
+
+
+def _load_extraction_uncached(date_str: str, site: str, uploads_dir: str) -> Tuple[Optional[Dict[str, Any]], Optional[str], int]:
+    """Carica un'estrazione da MongoDB o file system: (dati, versione, dimensione in bytes)"""
+    client, db = get_mongo_client()
+    
+    if client is not None and db is not None:
+        try:
+            with _operation_timeout('read'):
+                # Carica da MongoDB come BSON grezzo: la dimensione serve al budget della cache
+                collection = db['extractions'].with_options(
+                    codec_options=CodecOptions(document_class=RawBSONDocument)
+                )
+                # Trova l'estrazione più recente per questa data e sito
+                raw_doc = collection.find_one(
+                    {'date': date_str, 'site': site},
+                    sort=[('extraction_date', -1)]
+                )
+                if raw_doc is not None:
+                    doc = bson_decode(raw_doc.raw)
+                    # Rimuovi _id prima di restituire
+                    version = f"mongo:{doc.pop('_id', None)}"
+                    log.info("Estrazione %s caricata da MongoDB", date_str)
+                    return doc, version, len(raw_doc.raw)
+        except Exception as e:
+            _record_mongo_error(e)
+            log.warning("Errore caricamento MongoDB: %s. Provo file system locale.", e)
+    
+    # Fallback: file system locale
+    latest = _find_latest_extraction_file(date_str, uploads_dir)
+    if latest:
+        filepath, mtime, filename = latest
+        try:
+            data = json_provider.load_file(filepath)
+            if 'data' in data or 'statistics' in data:
+                log.info("Estrazione %s caricata da file locale", date_str)
+                return data, f"file:{filename}:{mtime}", os.path.getsize(filepath)
+        except Exception as e:
+            log.error("Errore caricamento estrazione: %s", e)
+    
+    return None, None, 0
+
+
+def load_extraction(date_str: str, site: str, uploads_dir: str) -> Optional[Dict[str, Any]]:
+    """Carica un'estrazione da MongoDB o file system locale, passando dalla cache LRU.
+    Le date storiche (immutabili) sono servite dalla memoria senza I/O dopo la prima lettura;
+    le date recenti verificano solo la versione prima di usare la cache."""
+    key = (date_str, site)
+    
+    if _is_historic_date(date_str):
+        cached = extraction_cache.get(key)
+        if cached is not None:
+            return cached
+    else:
+        version = get_extraction_version(date_str, site, uploads_dir)
+        if version is None:
+            extraction_cache.invalidate(key)
+            return None
+        cached = extraction_cache.get(key, version)
+        if cached is not None:
+            return cached
+    
+    data, version, size = _load_extraction_uncached(date_str, site, uploads_dir)
+    if data is None:
+        return None
+    extraction_cache.put(key, version, data, size)
+    return dict(data)
+
+
+# Sezioni per giro dello snapshot (giro -> lista), servite a pagine invece che con la pagina risultati
+EXTRACTION_ROUTE_SECTIONS = ('details', 'accessori_details', 'crossdock_details', 'clienti_per_giro')
+
+
+def get_current_extraction_version(date_str: str, site: str, uploads_dir: str) -> Optional[str]:
+    """Versione corrente dello snapshot: per le date storiche basta la cache (nessun I/O)"""
+    if _is_historic_date(date_str):
+        version = extraction_cache.peek_version((date_str, site))
+        if version is not None:
+            return version
+    return get_extraction_version(date_str, site, uploads_dir)
+
+
+def _load_extraction_projection(date_str: str, site: str, uploads_dir: str, version: Optional[str],
+                                projection: Optional[Dict[str, int]]) -> Optional[Dict[str, Any]]:
+    """Snapshot (o solo i campi della proiezione MongoDB) senza decodificare l'intera estrazione:
+    dalla cache se presente, altrimenti con una proiezione su MongoDB; sul file system si passa
+    dallo snapshot completo in cache. None se l'estrazione non esiste."""
+    key = (date_str, site)
+    if version is None:
+        version = get_current_extraction_version(date_str, site, uploads_dir)
+    
+    cached = extraction_cache.get(key, version) if version is not None else None
+    if cached is not None:
+        return cached
+    
+    if projection is not None and version is not None and version.startswith('mongo:'):
+        client, db = get_mongo_client()
+        if client is not None and db is not None:
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if 'data' in data or 'statistics' in data:
-                        print(f"✅ Estrazione {date_str} caricata da file locale")
-                        return data
+                with _operation_timeout('read'):
+                    doc = db['extractions'].find_one({'_id': version[len('mongo:'):]}, projection=projection)
+                    if doc is not None:
+                        return doc
             except Exception as e:
-                print(f"❌ Errore caricamento estrazione: {e}")
+                _record_mongo_error(e)
+                log.warning("Errore lettura parziale estrazione MongoDB: %s", e)
     
-    return None
+    return load_extraction(date_str, site, uploads_dir)
+
+
+def load_extraction_route(date_str: str, site: str, route: str, section: str, uploads_dir: str,
+                          version: Optional[str] = None) -> Optional[List[Any]]:
+    """Sezione di un solo giro dello snapshot (es. details[route]): da MongoDB si legge solo
+    il campo <section>.<route>
+    
+    Returns:
+        Lista della sezione ([] se il giro non ha righe), None se l'estrazione non esiste
+    """
+    if section not in EXTRACTION_ROUTE_SECTIONS:
+        raise ValueError(f"Sezione non valida: {section}")
+    # I nomi dei campi MongoDB non possono contenere '.' o iniziare con '$'
+    projection = None if '.' in route or route.startswith('$') else {f'{section}.{route}': 1}
+    data = _load_extraction_projection(date_str, site, uploads_dir, version, projection)
+    if data is None:
+        return None
+    return (data.get(section) or {}).get(route, [])
+
+
+def load_extraction_fields(date_str: str, site: str, fields: List[str], uploads_dir: str,
+                           version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Solo alcuni campi di primo livello dello snapshot (es. product_index), None se l'estrazione non esiste"""
+    data = _load_extraction_projection(date_str, site, uploads_dir, version, {field: 1 for field in fields})
+    if data is None:
+        return None
+    return {field: data[field] for field in fields if field in data}
+
+
+def get_extraction_cache_stats() -> Dict[str, Any]:
+    """Statistiche della cache degli snapshot (hit, miss, eviction, memoria)"""
+    return extraction_cache.stats()
+
+
+def get_extractions_list_version(uploads_dir: str) -> str:
+    """Versione dell'elenco delle estrazioni (cambia ad ogni salvataggio o pulizia), senza leggerle.
+    MongoDB: _id più recente + numero di documenti; file system: nomi e mtime dei file."""
+    client, db = get_mongo_client()
+    
+    if client is not None and db is not None:
+        try:
+            with _operation_timeout('read'):
+                collection = db['extractions']
+                count = collection.estimated_document_count()
+                if count:
+                    latest = collection.find_one({}, projection={'_id': 1}, sort=[('extraction_date', -1)])
+                    return f"mongo:{latest['_id'] if latest else ''}:{count}"
+        except Exception as e:
+            _record_mongo_error(e)
+            log.warning("Errore lettura versione elenco estrazioni MongoDB: %s", e)
+    
+    # File system locale (anche quando MongoDB è vuoto: list_extractions ripiega sui file)
+    entries = []
+    if os.path.exists(uploads_dir):
+        with os.scandir(uploads_dir) as iterator:
+            for entry in iterator:
+                if entry.name.startswith('estrazione_') and entry.name.endswith('.json'):
+                    try:
+                        entries.append(f"{entry.name}:{entry.stat().st_mtime_ns}")
+                    except OSError:
+                        continue
+    entries.sort()
+    return f"file:{zlib.crc32(chr(0).join(entries).encode('utf-8'))}:{len(entries)}"
 
 
 def list_extractions(uploads_dir: str) -> List[Dict[str, Any]]:
@@ -323,32 +928,34 @@ def list_extractions(uploads_dir: str) -> List[Dict[str, Any]]:
     
     if client is not None and db is not None:
         try:
-            # Carica da MongoDB
-            collection = db['extractions']
-            # Raggruppa per data (prendi solo la più recente per ogni data)
-            pipeline = [
-                {'$sort': {'extraction_date': -1}},
-                {'$group': {
-                    '_id': {'date': '$date', 'site': '$site'},
-                    'latest': {'$first': '$$ROOT'}
-                }},
-                {'$replaceRoot': {'newRoot': '$latest'}},
-                {'$sort': {'extraction_date': -1}}
-            ]
+            with _operation_timeout('read'):
+                # Carica da MongoDB
+                collection = db['extractions']
+                # Raggruppa per data (prendi solo la più recente per ogni data)
+                pipeline = [
+                    {'$sort': {'extraction_date': -1}},
+                    {'$group': {
+                        '_id': {'date': '$date', 'site': '$site'},
+                        'latest': {'$first': '$$ROOT'}
+                    }},
+                    {'$replaceRoot': {'newRoot': '$latest'}},
+                    {'$sort': {'extraction_date': -1}}
+                ]
             
-            for doc in collection.aggregate(pipeline):
-                doc.pop('_id', None)
-                extractions.append({
-                    'filename': f"estrazione_{doc.get('date', 'N/A').replace('-', '')}_{doc.get('extraction_date', '').replace(':', '').replace('-', '').split('.')[0]}.json",
-                    'date': doc.get('date', 'N/A'),
-                    'site': doc.get('site', 'N/A'),
-                    'count': doc.get('count', 0),
-                    'extraction_date': doc.get('extraction_date', 'N/A')
-                })
+                for doc in collection.aggregate(pipeline):
+                    doc.pop('_id', None)
+                    extractions.append({
+                        'filename': f"estrazione_{doc.get('date', 'N/A').replace('-', '')}_{doc.get('extraction_date', '').replace(':', '').replace('-', '').split('.')[0]}.json",
+                        'date': doc.get('date', 'N/A'),
+                        'site': doc.get('site', 'N/A'),
+                        'count': doc.get('count', 0),
+                        'extraction_date': doc.get('extraction_date', 'N/A')
+                    })
             
-            print(f"✅ Trovate {len(extractions)} estrazioni in MongoDB")
+                log.info("Trovate %s estrazioni in MongoDB", len(extractions))
         except Exception as e:
-            print(f"⚠️ Errore caricamento MongoDB: {e}. Provo file system locale.")
+            _record_mongo_error(e)
+            log.warning("Errore caricamento MongoDB: %s. Provo file system locale.", e)
     
     # Fallback: file system locale
     if not extractions and os.path.exists(uploads_dir):
@@ -358,14 +965,13 @@ def list_extractions(uploads_dir: str) -> List[Dict[str, Any]]:
                 filepath = os.path.join(uploads_dir, filename)
                 try:
                     mtime = os.path.getmtime(filepath)
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        date_str = data.get('date', 'N/A')
-                        if date_str != 'N/A':
-                            if date_str not in date_files or mtime > date_files[date_str][1]:
-                                date_files[date_str] = (filename, mtime, data)
+                    data = json_provider.load_file(filepath)
+                    date_str = data.get('date', 'N/A')
+                    if date_str != 'N/A':
+                        if date_str not in date_files or mtime > date_files[date_str][1]:
+                            date_files[date_str] = (filename, mtime, data)
                 except Exception as e:
-                    print(f"⚠️ Errore lettura {filename}: {e}")
+                    log.warning("Errore lettura %s: %s", filename, e)
         
         for date_str, (filename, mtime, data) in date_files.items():
             extractions.append({
@@ -377,7 +983,7 @@ def list_extractions(uploads_dir: str) -> List[Dict[str, Any]]:
             })
         
         extractions.sort(key=lambda x: x.get('extraction_date', ''), reverse=True)
-        print(f"✅ Trovate {len(extractions)} estrazioni in file system locale")
+        log.info("Trovate %s estrazioni in file system locale", len(extractions))
     
     return extractions
 
@@ -390,22 +996,22 @@ def save_chunk(file_id: str, chunk_index: int, chunk_data: bytes) -> bool:
         client, db = get_mongo_client()
         
         if client is None or db is None:
-            print(f"⚠️ MongoDB client o db è None. USE_MONGODB={USE_MONGODB}, MONGODB_URI={bool(MONGODB_URI)}")
+            log.warning("MongoDB client o db è None. USE_MONGODB=%s, MONGODB_URI=%s", USE_MONGODB, bool(MONGODB_URI))
             return False
         
-        collection = db['csv_chunks']
-        result = collection.insert_one({
-            'file_id': file_id,
-            'chunk_index': chunk_index,
-            'chunk_data': base64.b64encode(chunk_data).decode('utf-8'),  # Salva come Base64 (più efficiente)
-            'created_at': datetime.now().isoformat()
-        })
-        print(f"✅ Chunk {chunk_index} salvato con _id: {result.inserted_id}")
+        with _operation_timeout('write'):
+            collection = db['csv_chunks']
+            result = collection.insert_one({
+                'file_id': file_id,
+                'chunk_index': chunk_index,
+                'chunk_data': base64.b64encode(chunk_data).decode('utf-8'),  # Salva come Base64 (più efficiente)
+                'created_at': datetime.now().isoformat()
+            })
+        log.debug("Chunk %s salvato con _id: %s", chunk_index, result.inserted_id)
         return True
     except Exception as e:
-        import traceback
-        print(f"⚠️ Errore salvataggio chunk MongoDB: {e}")
-        print(f"Traceback: {traceback.format_exc()}")
+        _record_mongo_error(e)
+        log.warning("Errore salvataggio chunk MongoDB: %s", e, exc_info=True)
         return False
 
 
@@ -415,78 +1021,173 @@ def merge_chunks(file_id: str, original_filename: str) -> Optional[str]:
     
     if client is not None and db is not None:
         try:
-            collection = db['csv_chunks']
-            # Recupera tutti i chunk per questo file_id, ordinati per indice
-            chunks = list(collection.find({'file_id': file_id}).sort('chunk_index', 1))
+            with _operation_timeout('bulk'):
+                collection = db['csv_chunks']
+                # Recupera tutti i chunk per questo file_id, ordinati per indice
+                chunks = list(collection.find({'file_id': file_id}).sort('chunk_index', 1))
             
-            if not chunks:
-                print(f"❌ Nessun chunk trovato per file_id: {file_id}")
-                return None
+                if not chunks:
+                    log.error("Nessun chunk trovato per file_id: %s", file_id)
+                    return None
             
-            # Ricomponi il file
-            file_data = b''
-            for chunk_doc in chunks:
-                chunk_bytes = base64.b64decode(chunk_doc['chunk_data'])  # Decodifica Base64
-                file_data += chunk_bytes
+                # Ricomponi il file
+                file_data = b''.join(base64.b64decode(chunk_doc['chunk_data']) for chunk_doc in chunks)
             
-            # Salva il file completo in una nuova collection
-            complete_collection = db['csv_transforms']
-            transform_doc = {
-                'file_id': file_id,
-                'original_filename': original_filename,
-                'file_data': base64.b64encode(file_data).decode('utf-8'),  # Base64 invece di hex
-                'created_at': datetime.now().isoformat(),
-                'status': 'merged'
-            }
-            complete_collection.insert_one(transform_doc)
+                # Salva il file completo in una nuova collection (BSON binary: niente Base64/hex)
+                complete_collection = db['csv_transforms']
+                transform_doc = {
+                    'file_id': file_id,
+                    'original_filename': original_filename,
+                    'file_data': file_data,
+                    'file_encoding': 'binary',
+                    'created_at': datetime.now().isoformat(),
+                    'status': 'merged'
+                }
+                complete_collection.insert_one(transform_doc)
             
-            # Cancella i chunk dopo il merge
-            collection.delete_many({'file_id': file_id})
+                # Cancella i chunk dopo il merge
+                collection.delete_many({'file_id': file_id})
             
-            print(f"✅ File {file_id} ricomposto da {len(chunks)} chunk")
-            return file_id
+                log.info("File %s ricomposto da %s chunk", file_id, len(chunks))
+                return file_id
         except Exception as e:
-            print(f"⚠️ Errore merge chunks: {e}")
+            _record_mongo_error(e)
+            log.warning("Errore merge chunks: %s", e)
             return None
     
     return None
 
 
-def get_transformed_file(file_id: str) -> Optional[Dict[str, Any]]:
-    """Recupera il file trasformato da MongoDB"""
+def _decode_file_data(doc: Dict[str, Any]) -> bytes:
+    """Contenuto del file di un documento csv_transforms, qualunque sia la codifica usata"""
+    file_data = doc.get('file_data')
+    if file_data is None:
+        return b''
+    if isinstance(file_data, (bytes, bytearray)):
+        return bytes(file_data)
+    encoding = doc.get('file_encoding')
+    # Documenti precedenti: il file elaborato era salvato in hex, quello ricomposto in Base64
+    if encoding == 'hex' or (encoding is None and doc.get('status') == 'processed'):
+        return bytes.fromhex(file_data)
+    return base64.b64decode(file_data)
+
+
+def get_transformed_file(file_id: str, include_data: bool = True, decompress: bool = True) -> Optional[Dict[str, Any]]:
+    """Recupera il file trasformato da MongoDB
+    
+    Args:
+        file_id: ID del file
+        include_data: False per leggere solo i metadati (es. file su S3, dimensione per il download)
+        decompress: False per ricevere file_data così come è salvato (compresso se content_encoding è valorizzato)
+    """
     client, db = get_mongo_client()
     
     if client is not None and db is not None:
         try:
-            collection = db['csv_transforms']
-            doc = collection.find_one({'file_id': file_id})
-            if doc:
-                return {
-                    'file_id': doc.get('file_id'),
-                    'original_filename': doc.get('original_filename'),
-                    'output_filename': doc.get('output_filename'),
-                    'file_data': base64.b64decode(doc.get('file_data', '')),  # Decodifica Base64
-                    'rows_processed': doc.get('rows_processed'),
-                    'rows_transformed': doc.get('rows_transformed'),
-                    'missing_codes': doc.get('missing_codes', [])
-                }
+            with _operation_timeout('read'):
+                collection = db['csv_transforms']
+                projection = None if include_data else {'file_data': 0}
+                doc = collection.find_one({'file_id': file_id}, projection)
+                if doc:
+                    storage_type = doc.get('storage_type', 'mongodb')
+                    result = {
+                        'file_id': doc.get('file_id'),
+                        'original_filename': doc.get('original_filename'),
+                        'output_filename': doc.get('output_filename'),
+                        'storage_type': storage_type,
+                        'file_size': doc.get('file_size'),
+                        'stored_size': doc.get('stored_size', doc.get('file_size')),
+                        'content_encoding': doc.get('content_encoding'),
+                        'rows_processed': doc.get('rows_processed'),
+                        'rows_transformed': doc.get('rows_transformed'),
+                        'missing_codes': doc.get('missing_codes', []),
+                        'delete_after': doc.get('delete_after')
+                    }
+                    if include_data and storage_type != 's3':
+                        file_data = _decode_file_data(doc)
+                        if decompress:
+                            file_data = transform_compression.decompress(file_data, doc.get('content_encoding'))
+                        result['file_data'] = file_data
+                    return result
         except Exception as e:
-            print(f"⚠️ Errore recupero file trasformato: {e}")
+            _record_mongo_error(e)
+            log.warning("Errore recupero file trasformato: %s", e)
     
     return None
 
 
+def save_transformed_metadata(file_id: str, fields: Dict[str, Any]) -> bool:
+    """Salva (upsert) i metadati di un file trasformato i cui dati stanno altrove (es. S3)"""
+    client, db = get_mongo_client()
+    
+    if client is not None and db is not None:
+        try:
+            with _operation_timeout('write'):
+                db['csv_transforms'].update_one(
+                    {'file_id': file_id},
+                    {'$set': dict(fields, file_id=file_id, updated_at=datetime.now().isoformat())},
+                    upsert=True
+                )
+                return True
+        except Exception as e:
+            _record_mongo_error(e)
+            log.warning("Errore salvataggio metadati file trasformato: %s", e)
+    
+    return False
+
+
+def mark_transformed_downloaded(file_id: str, delete_in: float) -> bool:
+    """Segna un file trasformato come scaricato (redirect presigned): dopo `delete_in` secondi
+    lo eliminano list_expired_transformed_files e delete_transformed_file"""
+    client, db = get_mongo_client()
+    
+    if client is not None and db is not None:
+        try:
+            with _operation_timeout('write'):
+                db['csv_transforms'].update_one(
+                    {'file_id': file_id, 'delete_after': {'$exists': False}},
+                    {'$set': {'delete_after': datetime.now() + timedelta(seconds=delete_in)}}
+                )
+                return True
+        except Exception as e:
+            _record_mongo_error(e)
+            log.warning("Errore aggiornamento file trasformato scaricato: %s", e)
+    
+    return False
+
+
+def list_expired_transformed_files(limit: int = 50) -> List[Dict[str, Any]]:
+    """File trasformati scaricati il cui tempo di eliminazione è trascorso (file_id, output_filename, storage_type)"""
+    client, db = get_mongo_client()
+    
+    if client is not None and db is not None:
+        try:
+            with _operation_timeout('read'):
+                cursor = db['csv_transforms'].find(
+                    {'delete_after': {'$lt': datetime.now()}},
+                    {'_id': 0, 'file_id': 1, 'output_filename': 1, 'storage_type': 1}
+                ).limit(limit)
+                return list(cursor)
+        except Exception as e:
+            _record_mongo_error(e)
+            log.warning("Errore lettura file trasformati scaduti: %s", e)
+    
+    return []
+
+
 def delete_transformed_file(file_id: str) -> bool:
     """Cancella il file trasformato da MongoDB"""
     client, db = get_mongo_client()
     
     if client is not None and db is not None:
         try:
-            collection = db['csv_transforms']
-            result = collection.delete_one({'file_id': file_id})
-            return result.deleted_count > 0
+            with _operation_timeout('write'):
+                collection = db['csv_transforms']
+                result = collection.delete_one({'file_id': file_id})
+                return result.deleted_count > 0
         except Exception as e:
-            print(f"⚠️ Errore cancellazione file trasformato: {e}")
+            _record_mongo_error(e)
+            log.warning("Errore cancellazione file trasformato: %s", e)
     
     return False
 
@@ -0,0 +1,74 @@
+"""
+Compressione dei file CSV trasformati (YDMXEL_*) salvati in MongoDB o su S3.
+I CSV trasformati sono testo molto ripetitivo: compressi con gzip occupano una frazione
+dello spazio, e la scelta MongoDB/S3 (soglia 4.5MB) viene fatta sulla dimensione compressa.
+gzip è decodificato nativamente dai browser: se il client lo accetta il file viene inviato
+così com'è (Content-Encoding: gzip), altrimenti viene decompresso in streaming.
+"""
+import os
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional, Tuple
+
+GZIP = 'gzip'
+
+# Compressione dei file trasformati: 'gzip' oppure 'none'
+TRANSFORM_COMPRESSION = os.environ.get('TRANSFORM_COMPRESSION', GZIP).lower()
+# Sotto questa dimensione (bytes) il file viene salvato non compresso
+TRANSFORM_COMPRESS_MIN_BYTES = int(os.environ.get('TRANSFORM_COMPRESS_MIN_BYTES', '16384'))
+# Livello gzip (1 = più veloce, 9 = più compatto)
+TRANSFORM_COMPRESS_LEVEL = int(os.environ.get('TRANSFORM_COMPRESS_LEVEL', '6'))
+
+
+def enabled() -> bool:
+    return TRANSFORM_COMPRESSION == GZIP
+
+
+def compress(data: bytes) -> Tuple[bytes, Optional[str]]:
+    """
+    Comprime un file trasformato se supera la soglia e se la compressione conviene
+
+    Returns:
+        (dati da salvare, content encoding: 'gzip' oppure None se non compressi)
+    """
+    if not enabled() or len(data) < TRANSFORM_COMPRESS_MIN_BYTES:
+        return data, None
+    # mtime=0: stesso contenuto, stessi bytes compressi
+    compressed = gzip.compress(data, compresslevel=TRANSFORM_COMPRESS_LEVEL, mtime=0)
+    if len(compressed) >= len(data):
+        return data, None
+    return compressed, GZIP
+
+
+def decompress(data: bytes, content_encoding: Optional[str]) -> bytes:
+    """Contenuto originale di un file salvato con compress()"""
+    if content_encoding is None:
+        return data
+    if content_encoding != GZIP:
+        raise ValueError(f"Content encoding non supportato: {content_encoding}")
+    return gzip.decompress(data)
+
+
+def iter_decompress(chunks: Iterable[bytes], content_encoding: Optional[str]) -> Iterator[bytes]:
+    """Decomprime in streaming i blocchi di un file compresso (memoria O(blocco))"""
+    if content_encoding is None:
+        return iter(chunks)
+    if content_encoding != GZIP:
+        raise ValueError(f"Content encoding non supportato: {content_encoding}")
+
+    def generate():
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        for chunk in chunks:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+    return generate()
+
+
+def open_writer(raw) -> gzip.GzipFile:
+    """File binario in scrittura che comprime verso `raw` (da chiudere a parte dopo il GzipFile)"""
+    return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=TRANSFORM_COMPRESS_LEVEL, mtime=0)